@@ -13,9 +13,17 @@ from PyQt6.QtCore import Qt, QTimer
 from PyQt6.QtGui import QColor
 from OpenGL.GL import *
 from standardize import standardize_model
-from TTS import TTSThread
-from STT import STTThread
-from LLM import LLMThread
+from TTS import TTSThread, AudioPlayer
+from tts_cache import TTSAudioCache
+from STT import STTThread, merge_utterances
+from stt_profiles import stt_profile, DEVICES, RECORDER_SETTINGS
+from echo_gate import EchoReference, EchoGate, EchoGatedMicrophone
+from LLM import LLMThread, make_summarizer
+from conversation import Conversation
+from llm_backends import LLMBackendRegistry
+from model_residency import ModelResidencyScheduler
+from latency_trace import TurnTrace, TraceLog
+from speculation import SpeculationStats, normalize_transcript
 import pyaudio as pa
 import ollama
 import random
@@ -139,14 +147,36 @@ QScrollBar::add-page:vertical, QScrollBar::sub-page:vertical {
 """
 
 class ControlPanel(QMainWindow):
+    NO_DRAFT_MODEL = "不使用"
+
     def __init__(self, live2d_window):
         super().__init__()
         self.live2d_window = live2d_window
         self.subtitle_window = SubtitleWindow()
         self.llm_thread = None
+        self.retired_llm_threads = []  # 已打断、仍在后台退出的LLM线程
         self.basettsurl = "http://127.0.0.1:6880"
         self.STT_thread = None
         self.test_tts = None
+        # 对话记录跨轮次保存，超出预算的部分折叠进摘要
+        self.chat_model = ""
+        self.conversation = Conversation(summarizer=make_summarizer(lambda: self.chat_model))
+        self.conversation_path = os.path.join("logs", "conversation.json")
+        try:
+            self.conversation.load(self.conversation_path)
+        except Exception as e:
+            print(f"加载对话记录失败: {e}")
+        # 后台预加载选中的模型，使用期间保持驻留，空闲后卸载
+        self.model_residency = ModelResidencyScheduler()
+        # 开场模型：按对话模型配置，由小模型先说出开场短句
+        self.draft_pairs = {}
+        self.draft_max_tokens = LLMThread.DRAFT_MAX_TOKENS
+        # 推测启动：识别中间结果稳定后提前请求LLM，最终结果一致时直接使用
+        self.speculative_thread = None
+        self.speculation_started = 0.0
+        self.speculation_stats = SpeculationStats()
+        # 回声屏蔽：语音合成播放期间屏蔽麦克风中自己的声音
+        self.echo_gate = None
         self.subtitle_visible = False
         self.tts_settings = {
             "text": "",
@@ -170,6 +200,8 @@ class ControlPanel(QMainWindow):
             "repetition_penalty": 1.35
         }
 
+        self.tts_cache_settings = {}
+
         self.last_voice_text = ""
         self.voice_input_enabled = False
         self.voice_synthesis_enabled = False
@@ -184,6 +216,8 @@ class ControlPanel(QMainWindow):
         
         # 在初始化完成后加载配置
         self.loadsettings()
+        self.model_residency.status_changed.connect(self.model_status_label.setText)
+        self.model_residency.start()
         
     def updateLLMModels(self):
         model_names = []
@@ -193,7 +227,13 @@ class ControlPanel(QMainWindow):
             model_names = [model['model'] for model in models['models']]
         except Exception as e:
             print(f"获取Ollama模型列表失败: {str(e)}")
-        model_names.insert(0, "deepseek-chat")
+        # 其他后端（如 DeepSeek）声明的模型
+        model_names = LLMBackendRegistry.shared().model_names() + model_names
+        # 先更新开场模型列表，切换对话模型时据此选中对应的开场模型
+        self.draft_model_combo.blockSignals(True)
+        self.draft_model_combo.clear()
+        self.draft_model_combo.addItems([self.NO_DRAFT_MODEL] + model_names)
+        self.draft_model_combo.blockSignals(False)
         self.chat_model_combo.clear()
         self.chat_model_combo.addItems(model_names)
             
@@ -384,6 +424,12 @@ class ControlPanel(QMainWindow):
         self.STT_model_combo.addItems(["tiny", "tiny.en", "base", "base.en", "small", "small.en", 
                                  "medium", "medium.en", "large-v1", "large-v2","large-v3","large-v3 turbo"])
         STT_group_layout.addWidget(self.STT_model_combo)
+
+        # 运行设备：auto 在没有 GPU 时使用 CPU 配置（int8 量化）
+        STT_group_layout.addWidget(QLabel("运行设备:"))
+        self.STT_device_combo = QComboBox()
+        self.STT_device_combo.addItems(DEVICES)
+        STT_group_layout.addWidget(self.STT_device_combo)
         
         # 唤醒词 可以自定义
         STT_group_layout.addWidget(QLabel("唤醒词(暂不可用X):"))
@@ -409,6 +455,30 @@ class ControlPanel(QMainWindow):
         self.test_STT_btn.setEnabled(False)
         STT_group_layout.addWidget(self.test_STT_btn)
 
+        # 推测启动：中间结果保持不变超过设定时间后提前请求LLM（加载模型前设置）
+        speculative_layout = QHBoxLayout()
+        self.speculative_checkbox = QCheckBox("推测启动")
+        speculative_layout.addWidget(self.speculative_checkbox)
+        speculative_layout.addWidget(QLabel("稳定时间(ms):"))
+        self.speculative_stable_spin = QSpinBox()
+        self.speculative_stable_spin.setRange(100, 2000)
+        self.speculative_stable_spin.setSingleStep(50)
+        self.speculative_stable_spin.setValue(300)
+        speculative_layout.addWidget(self.speculative_stable_spin)
+        STT_group_layout.addLayout(speculative_layout)
+
+        # 回声屏蔽：播放语音时屏蔽麦克风，响度超过插话阈值且不是回声时放行（加载模型前设置）
+        echo_gate_layout = QHBoxLayout()
+        self.echo_gate_checkbox = QCheckBox("回声屏蔽")
+        echo_gate_layout.addWidget(self.echo_gate_checkbox)
+        echo_gate_layout.addWidget(QLabel("插话响度:"))
+        self.barge_in_spin = QSpinBox()
+        self.barge_in_spin.setRange(500, 20000)
+        self.barge_in_spin.setSingleStep(250)
+        self.barge_in_spin.setValue(2500)
+        echo_gate_layout.addWidget(self.barge_in_spin)
+        STT_group_layout.addLayout(echo_gate_layout)
+
         # 识别结果
         STT_group_layout.addWidget(QLabel("测试识别结果:"))
         self.test_STT_result_label = QLabel()
@@ -778,7 +848,29 @@ class ControlPanel(QMainWindow):
         # 模型选择
         chat_group_layout.addWidget(QLabel("选择模型:"))
         self.chat_model_combo = QComboBox()
+        self.chat_model_combo.currentTextChanged.connect(self.warmUpLLM)
         chat_group_layout.addWidget(self.chat_model_combo)
+
+        # 开场模型：小模型先说出开场短句，对话模型接着续写（仅 Ollama 原生接口）
+        draft_layout = QHBoxLayout()
+        draft_layout.addWidget(QLabel("开场模型:"))
+        self.draft_model_combo = QComboBox()
+        self.draft_model_combo.addItem(self.NO_DRAFT_MODEL)
+        self.draft_model_combo.currentTextChanged.connect(self.onDraftModelChanged)
+        draft_layout.addWidget(self.draft_model_combo, 1)
+        chat_group_layout.addLayout(draft_layout)
+
+        # 模型驻留状态和空闲卸载时间
+        model_residency_layout = QHBoxLayout()
+        self.model_status_label = QLabel("模型未加载")
+        model_residency_layout.addWidget(self.model_status_label, 1)
+        model_residency_layout.addWidget(QLabel("空闲卸载(分钟):"))
+        self.idle_unload_spin = QSpinBox()
+        self.idle_unload_spin.setRange(1, 720)
+        self.idle_unload_spin.setValue(int(ModelResidencyScheduler.IDLE_UNLOAD // 60))
+        self.idle_unload_spin.valueChanged.connect(self.onIdleUnloadChanged)
+        model_residency_layout.addWidget(self.idle_unload_spin)
+        chat_group_layout.addLayout(model_residency_layout)
         
         # 提示词设置
         chat_group_layout.addWidget(QLabel("系统提示词:"))
@@ -819,6 +911,11 @@ AI感：偶尔说出奇怪的话，比如思考ai与人类的关系与未来，
         update_models_btn.clicked.connect(self.updateLLMModels)
         chat_group_layout.addWidget(update_models_btn)
 
+        # 清空对话记录按钮
+        clear_conversation_btn = QPushButton("清空对话记录")
+        clear_conversation_btn.clicked.connect(self.clearConversation)
+        chat_group_layout.addWidget(clear_conversation_btn)
+
         # 开启语音识别按钮
         self.voice_recognition_btn = QPushButton('开启语音识别', self)
         self.voice_recognition_btn.setCheckable(True)
@@ -841,6 +938,13 @@ AI感：偶尔说出奇怪的话，比如思考ai与人类的关系与未来，
         self.tts_mode_combo.currentTextChanged.connect(self.onTTSTypeChanged)
         tts_mode_layout.addWidget(tts_mode_label)
         tts_mode_layout.addWidget(self.tts_mode_combo)
+        # 预取句数：同时向TTS后端请求的句子数
+        tts_prefetch_label = QLabel("预取句数:")
+        self.tts_prefetch_spin = QSpinBox()
+        self.tts_prefetch_spin.setRange(1, 8)
+        self.tts_prefetch_spin.setValue(TTSThread.PREFETCH)
+        tts_mode_layout.addWidget(tts_prefetch_label)
+        tts_mode_layout.addWidget(self.tts_prefetch_spin)
         chat_group_layout.addLayout(tts_mode_layout)
 
         chat_group.setLayout(chat_group_layout)
@@ -1156,33 +1260,40 @@ AI感：偶尔说出奇怪的话，比如思考ai与人类的关系与未来，
                 'language': language,
                 'model': model,
                 'wake_words': wake_word if wake_word else None,
-                'device': "cuda",
-                "silero_sensitivity":0.2,
-                "webrtc_sensitivity":3,
-                "post_speech_silence_duration":0.4, 
-                "min_length_of_recording":0.3, 
-                "min_gap_between_recordings":1, 
-                "enable_realtime_transcription" : True,
-                "realtime_processing_pause" : 0.05, 
-                "realtime_model_type" : "tiny"
+                **RECORDER_SETTINGS,
             }
+            # 按运行设备选择识别参数，没有 GPU 时使用 CPU 配置
+            profile = stt_profile(self.STT_device_combo.currentText(), language, model)
+            config.update(profile)
+            print(f"语音识别运行设备: {profile['device']}")
             
             # 更新加载按钮状态
             self.load_STTmodel_btn.setText("加载中...")
             self.load_STTmodel_btn.setEnabled(False)
             
             # 创建语音识别线程
-            self.STT_thread = STTThread(config)
+            speculative_ms = self.speculative_stable_spin.value() if self.speculative_checkbox.isChecked() else None
+            # 回声屏蔽时由 EchoGatedMicrophone 读取麦克风，对照播放器送出的音频屏蔽回声
+            audio_source = None
+            if self.echo_gate_checkbox.isChecked():
+                reference = EchoReference()
+                AudioPlayer.echo_reference = reference
+                self.echo_gate = EchoGate(reference, barge_in_rms=self.barge_in_spin.value())
+                audio_source = EchoGatedMicrophone(device_id, self.echo_gate)
+            self.STT_thread = STTThread(config, speculative_ms=speculative_ms, audio_source=audio_source)
+            self.STT_thread.partial_stable_signal.connect(self.startSpeculation)
             self.STT_thread.text_signal.connect(self.handleSTTResult)
             self.STT_thread.test_signal.connect(self.handleSTTTestResult)
             self.STT_thread.STTmodel_ready_signal.connect(self.onSTTModelReady)
-            self.STT_thread.set_control_panel(self)
+            self.STT_thread.turn_ready_signal.connect(self.dispatchVoiceTurns)
             self.STT_thread.start()
             
             # 禁用设置控件
             self.STT_audio_devices.setEnabled(False)
             self.STT_language_combo.setEnabled(False)
             self.STT_model_combo.setEnabled(False)
+            self.STT_device_combo.setEnabled(False)
+            self.echo_gate_checkbox.setEnabled(False)
             self.STT_wake_word_edit.setEnabled(False)
 
             
@@ -1207,15 +1318,22 @@ AI感：偶尔说出奇怪的话，比如思考ai与人类的关系与未来，
 
     def unloadSTTModel(self):
         """卸载语音识别模型"""
+        self.cancelSpeculation()
         if self.STT_thread:
             self.STT_thread.recorder.shutdown()
             self.STT_thread.stop()
             self.STT_thread = None
+        if self.echo_gate:
+            print(self.echo_gate.summary())
+            AudioPlayer.echo_reference = None
+            self.echo_gate = None
         
         # 启用设置控件
         self.STT_audio_devices.setEnabled(True)
         self.STT_language_combo.setEnabled(True)
         self.STT_model_combo.setEnabled(True)
+        self.STT_device_combo.setEnabled(True)
+        self.echo_gate_checkbox.setEnabled(True)
         self.STT_wake_word_edit.setEnabled(True)
         self.load_STTmodel_btn.setText("加载模型")
         self.load_STTmodel_btn.setEnabled(True)
@@ -1251,7 +1369,29 @@ AI感：偶尔说出奇怪的话，比如思考ai与人类的关系与未来，
         """处理语音识别结果"""
         if not text:
             return
+        self.model_residency.touch()
         self.input_box.setPlainText(text)
+    def dispatchVoiceTurns(self):
+        """在界面线程中取出识别线程送来的语音输入；积压的多句合并为一轮发送"""
+        if self.STT_thread is None:
+            return
+        turns = self.STT_thread.turns.drain()
+        if not turns:
+            return
+        text = merge_utterances([turn.text for turn in turns])
+        if not self.voice_input_enabled or self.user_editing:
+            # 不自动发送（语音输入已关闭或用户正在编辑）：输入框中已是这句的中间结果，
+            # 替换为最终结果，由用户决定是否发送
+            self.input_box.setPlainText(text)
+            return
+        trace = turns[-1].trace
+        for turn in turns[:-1]:
+            # 合并的句子按最后一句计时
+            trace.absorb(turn.trace)
+        if len(turns) > 1:
+            print(f"合并了 {len(turns)} 句语音输入: {text}")
+        self.sendMessage(text, trace=trace)
+
     def handleSTTTestResult(self, text):
         """处理语音识别测试结果"""
         if not text:
@@ -1312,6 +1452,21 @@ AI感：偶尔说出奇怪的话，比如思考ai与人类的关系与未来，
         print("开始测试语音合成")
         self.test_tts.start()
 
+    def prewarmTTSCache(self):
+        """按当前TTS模式预热缓存中的常用短语"""
+        phrases = self.tts_cache_settings.get("prewarm_phrases", [])
+        if not phrases or not self.tts_cache_settings.get("enabled", True):
+            return
+        if self.tts_mode_combo.currentText() == "RealtimeTTS":
+            baseurl = f"http://{self.realtime_host_input.text()}:{self.realtime_port_input.text()}"
+            settings = {
+                "engine": self.realtime_engine_combo.currentText(),
+                "voice": self.realtime_voice_combo.currentText()
+            }
+            TTSThread.prewarm_cache(baseurl, settings, phrases, tts_mode="realtime")
+        else:
+            TTSThread.prewarm_cache(self.basettsurl, self.tts_settings, phrases, tts_mode="gsv")
+
     # 对话设置部分函数
     def toggleVoiceRecognition(self):
         if not self.STT_thread:
@@ -1324,6 +1479,8 @@ AI感：偶尔说出奇怪的话，比如思考ai与人类的关系与未来，
             self.voice_input_enabled = False
             self.STT_thread.pause()
             self.voice_recognition_btn.setText("开启语音识别")
+            if self.echo_gate:
+                print(self.echo_gate.summary())
             
     def toggleVoiceSynthesis(self):
         if self.voice_synthesis_btn.text() == "开启语音合成":
@@ -1356,7 +1513,10 @@ AI感：偶尔说出奇怪的话，比如思考ai与人类的关系与未来，
             self.realtime_engine_combo.setEnabled(False)
             self.realtime_voice_combo.setEnabled(False)
 
-    def sendMessage(self, message=None):
+    def sendMessage(self, message=None, trace=None):
+        """发送一条消息
+        :param trace: 语音输入时由识别线程创建的 TurnTrace（已记录说话结束时间）
+        """
         if self.STT_thread and self.STT_thread.is_testing:
             return
         
@@ -1365,10 +1525,10 @@ AI感：偶尔说出奇怪的话，比如思考ai与人类的关系与未来，
         if not message.strip():
             return
         
-        # 如果有正在运行的LLM线程，先打断它
+        # 如果有正在运行的LLM线程，先打断它；声音立即停止，线程在后台退出，不阻塞界面
         if self.llm_thread:
-            self.llm_thread.interrupt()
-            self.llm_thread.wait()  # 等待线程结束
+            self.retireLLMThread(self.llm_thread)
+            self.llm_thread = None
 
         # 显示用户消息
         cursor = self.chat_display.textCursor()
@@ -1383,11 +1543,31 @@ AI感：偶尔说出奇怪的话，比如思考ai与人类的关系与未来，
         cursor.insertText("\n艾芙: ")
         self.chat_display.setTextCursor(cursor)
         
+        trace = trace or TurnTrace(source="text")
+        # 最终识别结果与推测一致时直接使用已提前开始的回复
+        thread = self.takeSpeculation(message)
+        if thread is None:
+            thread = self.createLLMThread(message, trace)
+            trace.mark("turn_start")
+        self.llm_thread = thread
+        if self.lip_sync_btn.isChecked():
+            # 各轮对话共享同一个播放器
+            self.live2d_window.live2d_widget.lip_sync.set_tts_player(AudioPlayer.shared())
+        self.llm_thread.response_text_received.connect(self.handleResponse)
+        self.llm_thread.response_started.connect(self.handleResponseStarted)
+        self.llm_thread.response_finished.connect(self.saveConversation)
+        if thread.speculative:
+            thread.release(trace)
+            thread.trace.mark("turn_start")
+        else:
+            thread.start()
+
+    def createLLMThread(self, message, trace, speculative=False):
+        """按当前的模型、提示词和TTS设置创建LLM线程（未启动）"""
         # 获取当前选择的模型和提示词
         model = self.chat_model_combo.currentText()
         prompt = self.prompt_edit.toPlainText()
         
-        # 创建并启动LLM线程
         tts_settings = self.tts_settings if self.voice_synthesis_enabled else None
         tts_mode = ""
         if tts_settings:
@@ -1398,15 +1578,126 @@ AI感：偶尔说出奇怪的话，比如思考ai与人类的关系与未来，
                     "engine": self.realtime_engine_combo.currentText(),
                     "voice": self.realtime_voice_combo.currentText()
                 })
-        self.llm_thread = LLMThread(model, prompt, message, self.basettsurl, tts_settings, tts_mode)
-        if self.lip_sync_btn.isChecked():
-            self.live2d_window.live2d_widget.lip_sync.set_tts_player(self.llm_thread.tts_thread.audio_player)
-        self.llm_thread.response_text_received.connect(self.handleResponse)
-        self.llm_thread.response_started.connect(self.handleResponseStarted)
-        self.llm_thread.start()
+        self.chat_model = model
+        self.model_residency.touch()
+        return LLMThread(model, prompt, message, self.basettsurl, tts_settings, tts_mode,
+                         tts_prefetch=self.tts_prefetch_spin.value(),
+                         conversation=self.conversation, trace=trace,
+                         draft_model=self.draft_pairs.get(model),
+                         draft_max_tokens=self.draft_max_tokens,
+                         speculative=speculative)
+
+    def startSpeculation(self, text):
+        """识别中间结果已稳定：按该文本提前开始生成回复，输出保留到最终结果确认"""
+        if not self.voice_input_enabled or self.user_editing or not text.strip():
+            return
+        if self.STT_thread is None or self.STT_thread.is_testing:
+            return
+        # 之前的推测已过时（用户还在继续说）
+        self.cancelSpeculation()
+        self.speculative_thread = self.createLLMThread(text, TurnTrace(source="voice"), speculative=True)
+        self.speculation_started = time.perf_counter()
+        self.speculation_stats.record_start()
+        self.speculative_thread.start()
+
+    def takeSpeculation(self, message):
+        """最终结果与推测文本一致时返回推测启动的线程，否则取消推测并返回 None
+        调用前需先打断上一轮：其回复在打断时才写入对话记录
+        """
+        thread = self.speculative_thread
+        if thread is None:
+            return None
+        self.speculative_thread = None
+        if normalize_transcript(thread.message) != normalize_transcript(message):
+            reason = f"{thread.message!r} -> {message!r}"
+        elif thread.interrupted or thread.isFinished():
+            reason = "推测的回复已超时或出错"
+        elif thread.conversation_version is not None and thread.conversation_version != self.conversation.version:
+            reason = "推测启动后对话记录有变化"
+        else:
+            reason = None
+        if reason:
+            self.retireLLMThread(thread)
+            self.speculation_stats.record_miss()
+            print(f"推测未命中: {reason}; {self.speculation_stats.summary()}")
+            return None
+        # 省去的等待：现在才发送请求时首token要再等一个首token延迟；推测的首token已到达时
+        # 节省的就是这段延迟，尚未到达时节省的是推测提前启动的时间
+        now = time.perf_counter()
+        first_token = thread.trace.first("llm_first_token")
+        end = now if first_token is None else min(now, first_token)
+        saved_ms = (end - self.speculation_started) * 1000
+        self.speculation_stats.record_hit(saved_ms)
+        thread.trace.tag(speculation_saved_ms=round(saved_ms, 1))
+        print(f"推测命中，首token提前 {saved_ms:.0f}ms; {self.speculation_stats.summary()}")
+        return thread
+
+    def cancelSpeculation(self):
+        if self.speculative_thread is not None:
+            self.retireLLMThread(self.speculative_thread)
+            self.speculative_thread = None
+            self.speculation_stats.record_miss()
+
+    def saveConversation(self):
+        """每轮结束后保存对话记录"""
+        try:
+            self.conversation.save(self.conversation_path)
+        except Exception as e:
+            print(f"保存对话记录失败: {e}")
+
+    def clearConversation(self):
+        """清空对话记录和摘要"""
+        self.conversation.clear()
+        self.saveConversation()
+        print("对话记录已清空")
+
+    def retireLLMThread(self, thread):
+        """打断LLM线程并断开其信号，保留引用直到线程结束"""
+        thread.interrupt()
+        try:
+            thread.response_text_received.disconnect(self.handleResponse)
+            thread.response_started.disconnect(self.handleResponseStarted)
+        except TypeError:
+            pass
+        def forget():
+            if thread in self.retired_llm_threads:
+                self.retired_llm_threads.remove(thread)
+        # 先连接再检查，避免线程恰好在两者之间结束而一直留在列表中
+        self.retired_llm_threads.append(thread)
+        thread.finished.connect(forget)
+        if not thread.isRunning():
+            forget()
+
+    def warmUpLLM(self, model=None):
+        """选中模型时在后台加载；之后的调用只记录用户操作，空闲卸载后会重新加载"""
+        if model is not None:
+            # 显示该对话模型对应的开场模型
+            draft = self.draft_pairs.get(model, "")
+            self.draft_model_combo.blockSignals(True)
+            self.draft_model_combo.setCurrentText(draft or self.NO_DRAFT_MODEL)
+            self.draft_model_combo.blockSignals(False)
+            self.model_residency.select_model(model, draft)
+        else:
+            self.model_residency.touch()
+
+    def onDraftModelChanged(self, draft):
+        """为当前对话模型设置开场模型"""
+        model = self.chat_model_combo.currentText()
+        if not model:
+            return
+        if draft and draft != self.NO_DRAFT_MODEL:
+            self.draft_pairs[model] = draft
+        else:
+            self.draft_pairs.pop(model, None)
+        self.model_residency.select_model(model, self.draft_pairs.get(model))
+
+    def onIdleUnloadChanged(self, minutes):
+        self.model_residency.idle_unload = minutes * 60
 
     def onInputEditClicked(self):
         """输入框点击事件"""
+        # 用户开始输入时预热连接，发送时直接复用
+        self.warmUpLLM()
         if self.voice_input_enabled:
             # 暂停语音识别，但不发送消息
             self.STT_thread.pause()
@@ -1456,6 +1747,7 @@ AI感：偶尔说出奇怪的话，比如思考ai与人类的关系与未来，
             "stt_settings": {
                 "language": self.STT_language_combo.currentText(),
                 "model": self.STT_model_combo.currentText(),
+                "device": self.STT_device_combo.currentText(),
                 "wake_words": self.STT_wake_word_edit.toPlainText().strip(),
                 "device_index": self.STT_audio_devices.currentData()  # 保存设备索引
             },
@@ -1501,6 +1793,53 @@ AI感：偶尔说出奇怪的话，比如思考ai与人类的关系与未来，
                 "streaming_mode": self.stream_checkbox.isChecked()
             },
             
+            # TTS流水线设置
+            "tts_pipeline_settings": {
+                "prefetch": self.tts_prefetch_spin.value()
+            },
+            
+            # TTS缓存设置
+            "tts_cache_settings": self.tts_cache_settings,
+            
+            # LLM后端
+            "llm_backends": LLMBackendRegistry.shared().settings(),
+            
+            # 每轮耗时记录
+            "latency_trace_settings": {
+                "enabled": TraceLog.shared().enabled,
+                "path": TraceLog.shared().path
+            },
+            
+            # 推测启动
+            "speculative_settings": {
+                "enabled": self.speculative_checkbox.isChecked(),
+                "stable_ms": self.speculative_stable_spin.value()
+            },
+            
+            # 回声屏蔽
+            "echo_gate_settings": {
+                "enabled": self.echo_gate_checkbox.isChecked(),
+                "barge_in_rms": self.barge_in_spin.value()
+            },
+            
+            # 开场模型（对话模型 -> 开场模型）
+            "draft_opener_settings": {
+                "pairs": self.draft_pairs,
+                "max_tokens": self.draft_max_tokens
+            },
+            
+            # 模型驻留
+            "model_residency_settings": {
+                "idle_unload_minutes": self.idle_unload_spin.value(),
+                "renew_interval": self.model_residency.renew_interval
+            },
+            
+            # 对话记录预算
+            "conversation_settings": {
+                "max_context_tokens": self.conversation.max_context_tokens,
+                "summary_tokens": self.conversation.summary_tokens
+            },
+            
             # 对话设置
             "chat_settings": {
                 "model": self.chat_model_combo.currentText(),
@@ -1530,6 +1869,7 @@ AI感：偶尔说出奇怪的话，比如思考ai与人类的关系与未来，
                 try:
                     self.STT_language_combo.setCurrentText(stt_settings.get("language", "zh"))
                     self.STT_model_combo.setCurrentText(stt_settings.get("model", "large-v3"))
+                    self.STT_device_combo.setCurrentText(stt_settings.get("device", "auto"))
                     self.STT_wake_word_edit.setPlainText(stt_settings.get("wake_words", ""))
                     
                     # 等待设备列表更新后再设置设备
@@ -1597,6 +1937,68 @@ AI感：偶尔说出奇怪的话，比如思考ai与人类的关系与未来，
                 # 更新 tts_settings 字典
                 self.tts_settings.update(tts_settings)
                 
+            # 加载TTS流水线设置
+            tts_pipeline_settings = settings.get("tts_pipeline_settings", {})
+            if tts_pipeline_settings:
+                self.tts_prefetch_spin.setValue(tts_pipeline_settings.get("prefetch", TTSThread.PREFETCH))
+                
+            # 加载TTS缓存设置，并在后台预热常用短语
+            self.tts_cache_settings = settings.get("tts_cache_settings", {})
+            if self.tts_cache_settings:
+                TTSAudioCache.shared().configure(
+                    enabled=self.tts_cache_settings.get("enabled", True),
+                    memory_bytes=int(self.tts_cache_settings.get("memory_mb", 32) * 1024 * 1024),
+                    disk_bytes=int(self.tts_cache_settings.get("disk_mb", 256) * 1024 * 1024)
+                )
+                self.prewarmTTSCache()
+                
+            # 加载LLM后端设置
+            llm_backends = settings.get("llm_backends")
+            if llm_backends:
+                LLMBackendRegistry.shared().configure(llm_backends)
+                self.updateLLMModels()
+                
+            # 加载耗时记录设置
+            latency_trace_settings = settings.get("latency_trace_settings", {})
+            if latency_trace_settings:
+                TraceLog.shared().enabled = latency_trace_settings.get("enabled", True)
+                TraceLog.shared().path = latency_trace_settings.get("path", TraceLog.PATH)
+                
+            # 加载推测启动设置
+            speculative_settings = settings.get("speculative_settings", {})
+            if speculative_settings:
+                self.speculative_checkbox.setChecked(speculative_settings.get("enabled", False))
+                self.speculative_stable_spin.setValue(speculative_settings.get("stable_ms", 300))
+                
+            # 加载回声屏蔽设置
+            echo_gate_settings = settings.get("echo_gate_settings", {})
+            if echo_gate_settings:
+                self.echo_gate_checkbox.setChecked(echo_gate_settings.get("enabled", False))
+                self.barge_in_spin.setValue(echo_gate_settings.get("barge_in_rms", 2500))
+                
+            # 加载开场模型设置
+            draft_opener_settings = settings.get("draft_opener_settings", {})
+            if draft_opener_settings:
+                self.draft_pairs = dict(draft_opener_settings.get("pairs", {}))
+                self.draft_max_tokens = draft_opener_settings.get("max_tokens", LLMThread.DRAFT_MAX_TOKENS)
+                self.warmUpLLM(self.chat_model_combo.currentText())
+                
+            # 加载模型驻留设置
+            model_residency_settings = settings.get("model_residency_settings", {})
+            if model_residency_settings:
+                self.idle_unload_spin.setValue(model_residency_settings.get(
+                    "idle_unload_minutes", int(ModelResidencyScheduler.IDLE_UNLOAD // 60)))
+                self.model_residency.renew_interval = model_residency_settings.get(
+                    "renew_interval", ModelResidencyScheduler.RENEW_INTERVAL)
+                
+            # 加载对话记录预算
+            conversation_settings = settings.get("conversation_settings", {})
+            if conversation_settings:
+                self.conversation.max_context_tokens = conversation_settings.get(
+                    "max_context_tokens", Conversation.MAX_CONTEXT_TOKENS)
+                self.conversation.summary_tokens = conversation_settings.get(
+                    "summary_tokens", Conversation.SUMMARY_TOKENS)
+                
             # 加载对话设置
             chat_settings = settings.get("chat_settings", {})
             if chat_settings:
@@ -1,16 +1,48 @@
+import threading
 from numpy import full
-from openai import OpenAI
 from PyQt6.QtCore import QThread, pyqtSignal
 from TTS import TTSThread
-import os
+from segmenter import SentenceSegmenter
+from llm_backends import LLMBackendRegistry
+from conversation import Conversation, count_tokens
+from latency_trace import TurnTrace
+from draft_opener import DRAFT_MAX_TOKENS, draft_messages
+
+
+def make_summarizer(get_model):
+    """用对话模型把折叠出窗口的对话压缩进滚动摘要
+    :param get_model: 返回当前对话模型名的函数
+    """
+    def summarize(previous, folded, max_tokens):
+        model = get_model()
+        if not model:
+            return None
+        lines = [f"{'用户' if m['role'] == 'user' else '助手'}: {m['content']}" for m in folded]
+        prompt = (f"请把下面的对话要点合并进已有摘要，保留人物、事实、约定和未完成的话题，"
+                  f"用中文写成不超过{max_tokens}个token的摘要，只输出摘要本身。\n\n"
+                  f"[已有摘要]\n{previous or '无'}\n\n[新对话]\n" + "\n".join(lines))
+        backend = LLMBackendRegistry.shared().backend_for(model)
+        return backend.complete(model, [{"role": "user", "content": prompt}], max_tokens=max_tokens * 2)
+    return summarize
+
 
 class LLMThread(QThread):
     response_text_received = pyqtSignal(str)
     response_full_text_received = pyqtSignal(str)
     response_started = pyqtSignal()
     response_finished = pyqtSignal()
+    DRAFT_MAX_TOKENS = DRAFT_MAX_TOKENS
+    DRAFT_TIMEOUT = 1.5  # 开场模型超过该时间（秒）仍未给出短句时放弃，直接使用主模型
+    SPECULATION_TIMEOUT = 10.0  # 推测启动的回复生成完后等待确认的最长时间（秒）
 
-    def __init__(self, model, prompt, message, baseurl, tts_settings=None, tts_mode="gsv"):
+    def __init__(self, model, prompt, message, baseurl, tts_settings=None, tts_mode="gsv", tts_prefetch=None, conversation=None, trace=None,
+                 draft_model=None, draft_max_tokens=None, speculative=False):
+        """
+        :param draft_model: 开场模型：先由该小模型说出开场短句并立即合成，主模型以该短句为开头续写
+        :param draft_max_tokens: 开场模型最多生成的token数
+        :param speculative: 推测启动：按识别中间结果提前请求，生成的内容先保留，
+                            release() 确认后才显示、发声并写入对话记录，interrupt() 取消
+        """
         super().__init__()
         self.model = model
         self.prompt = prompt
@@ -18,122 +50,265 @@ class LLMThread(QThread):
         self.baseurl = baseurl
         self.tts_settings = tts_settings
         self.tts_mode = tts_mode
+        self.tts_prefetch = tts_prefetch
         self.tts_thread = None
         self.running = True
-        self.history_messages = []
+        # 对话记录跨轮次保存，由调用方持有
+        self.conversation = conversation if conversation is not None else Conversation()
+        self.response_recorded = False
         self.interrupted = False
         self.current_response = ""
+        self.stats = {}  # 本轮服务端耗时统计（Ollama 原生模式）
+        self.sentence_count = 0
+        self.response = None  # 进行中的流式回复，打断时直接断开
+        # 本轮各阶段耗时，结束时写入 logs/turn_traces.jsonl
+        self.trace = trace if trace is not None else TurnTrace()
+        self.draft_model = draft_model
+        self.draft_max_tokens = draft_max_tokens or self.DRAFT_MAX_TOKENS
+        self.speculative = speculative
+        self.committed = not speculative  # 推测启动的回复确认前不写入对话记录
+        self.released = threading.Event()  # 已确认，可以输出
+        if not speculative:
+            self.released.set()
+        self.output_started = False
+        self.pending = []  # 确认前收到的内容
+        self.conversation_version = None  # 推测启动时构造请求所依据的对话版本
     
     def interrupt(self):
         """打断当前生成"""
             
         self.interrupted = True
         self.running = False
+        # 断开HTTP流：阻塞在等待下一个token的读取立即返回，服务端停止生成
+        response = self.response
+        if response is not None:
+            response.close()
         if self.tts_thread:
             self.tts_thread.stop()
         
+        # 唤醒等待确认的推测回复
+        self.released.set()
+        
         # 如果有已生成的内容，保存到历史记录
-        if self.current_response:
-            self.history_messages.append({
-                'role': 'assistant',
-                'content': self.current_response
-            })
+        self.recordResponse()
+        self.trace.finish("interrupted" if self.committed else "cancelled")
+
+    def release(self, trace=None):
+        """确认推测启动的回复（最终识别结果与推测一致）：开始显示、发声并写入对话记录
+        :param trace: 识别线程为本轮创建的 TurnTrace，其中的事件并入本线程的记录
+        """
+        if trace is not None:
+            self.trace.absorb(trace)
+        self.trace.mark("speculation_commit")
+        self.committed = True
+        self.released.set()
+
+    def recordResponse(self):
+        """把本轮回复写入对话记录（只写一次）"""
+        if self.current_response and self.committed and not self.response_recorded:
+            self.response_recorded = True
+            self.conversation.add("assistant", self.current_response)
     
+    def draftOpener(self, messages):
+        """用开场模型生成到第一个停顿为止的开场短句；失败、超时或被打断时返回空字符串"""
+        try:
+            backend = LLMBackendRegistry.shared().backend_for(self.draft_model)
+            self.trace.mark("draft_request", model=self.draft_model)
+            response = backend.chat_stream(self.draft_model, draft_messages(messages), max_tokens=self.draft_max_tokens)
+            self.response = response
+            if self.interrupted:
+                response.close()
+            # 超时由定时器断开请求，开场模型迟迟不给出首token时也能按时放弃
+            timed_out = threading.Event()
+            def expire():
+                timed_out.set()
+                response.close()
+            timer = threading.Timer(self.DRAFT_TIMEOUT, expire)
+            timer.daemon = True
+            timer.start()
+            segmenter = SentenceSegmenter()
+            opener = ""
+            first_token = True
+            try:
+                for content in response:
+                    if self.interrupted:
+                        break
+                    if first_token:
+                        first_token = False
+                        self.trace.mark("draft_first_token")
+                    chunks = segmenter.feed(content)
+                    if chunks:
+                        opener = chunks[0]
+                        self.trace.mark("draft_done", chars=len(opener))
+                        break
+                else:
+                    if timed_out.is_set():
+                        print("开场模型超时，直接使用主模型")
+                    else:
+                        # 生成结束仍未遇到停顿：整段作为开场短句
+                        opener = "".join(segmenter.flush())
+            finally:
+                timer.cancel()
+            # 已拿到开场短句，停止开场模型的生成
+            response.close()
+            return "" if self.interrupted else opener
+        except Exception as e:
+            print(f"开场模型 {self.draft_model} 出错，直接使用主模型: {e}")
+            return ""
+
+    def addSentence(self, sentence):
+        """把一句话交给TTS，并记录该句可以开始合成的时间"""
+        self.trace.mark("segment", index=self.sentence_count, chars=len(sentence))
+        self.sentence_count += 1
+        self.tts_thread.add_text(sentence)
+
+    def reportStats(self, stats, messages):
+        """打印预填充与生成耗时；Ollama 只对未命中提示词缓存的token做预填充"""
+        if not stats:
+            return
+        self.stats = stats
+        prompt_tokens = sum(count_tokens(m["content"]) for m in messages)
+        reused = max(0, prompt_tokens - stats["prompt_eval_count"])
+        eval_rate = stats["eval_count"] / stats["eval_ms"] * 1000 if stats["eval_ms"] else 0
+        print(f"LLM耗时: 加载 {stats['load_ms']:.0f}ms, "
+              f"预填充 {stats['prompt_eval_count']} token {stats['prompt_eval_ms']:.0f}ms "
+              f"(缓存复用约 {reused}/{prompt_tokens} token), "
+              f"生成 {stats['eval_count']} token {stats['eval_ms']:.0f}ms ({eval_rate:.1f} token/s)")
+
+    def startOutput(self):
+        """开始输出：通知界面并创建TTS线程；推测启动的回复在确认后才调用"""
+        self.output_started = True
+        if self.speculative:
+            self.conversation.add("user", self.message)
+        self.response_started.emit()
+        
+        # 创建TTS线程（如果需要）
+        if self.tts_settings:
+            self.tts_thread = TTSThread(
+                baseurl=self.baseurl,
+                tts_settings=self.tts_settings,
+                stream=None,
+                tts_mode=self.tts_mode,
+                prefetch=self.tts_prefetch,
+                trace=self.trace
+            )
+            self.tts_thread.start()
+            if self.interrupted:
+                # 创建TTS线程前已被打断
+                self.tts_thread.stop()
+
+    def emitContent(self, content, segmenter):
+        """显示并合成新生成的内容，先输出确认前保留的部分"""
+        if not self.output_started:
+            self.startOutput()
+        if self.pending:
+            content = "".join(self.pending) + content
+            self.pending = []
+        if not content:
+            return
+        self.current_response += content
+        self.response_text_received.emit(content)
+        if self.tts_thread:
+            for sentence in segmenter.feed(content):
+                self.addSentence(sentence)
+
     def run(self):
         try:
-            self.interrupted = False
+            # 不重置 interrupted：线程启动前的打断同样有效
             self.current_response = ""
             
-            self.response_started.emit()
-            
-            # 创建TTS线程（如果需要）
-            if self.tts_settings:
-                self.tts_thread = TTSThread(
-                    baseurl=self.baseurl,
-                    tts_settings=self.tts_settings,
-                    stream=None,
-                    tts_mode=self.tts_mode
-                )
-                self.tts_thread.start()
-            
-            # 初始化或更新历史消息
-            if not self.history_messages:   
-                self.history_messages = [
-                    {'role': 'system', 'content': self.prompt},
-                    {'role': 'user', 'content': self.message}
-                ]
+            if self.speculative:
+                # 推测启动：用户消息在确认后才写入对话记录
+                self.trace.mark("speculation_start")
+                # 先取版本再构造：期间有新消息时只会误判为已变化
+                self.conversation_version = self.conversation.version
+                messages = self.conversation.build_messages(self.prompt) + \
+                    [{"role": "user", "content": self.message}]
             else:
-                # 添加新的用户消息
-                self.history_messages.append({'role': 'user', 'content': self.message})
+                self.startOutput()
+                # 系统提示词 + 滚动摘要 + 预算内的最近对话
+                self.conversation.add("user", self.message)
+                messages = self.conversation.build_messages(self.prompt)
             
-            client = OpenAI(
-                api_key='ollama', 
-                base_url="http://localhost:11434/v1/"
-            ) if self.model != "deepseek-chat" else OpenAI(
-                api_key=os.getenv('DEEPSEEK_API_KEY'),
-                base_url="https://api.deepseek.com/v1"
-            )
+            # 使用共享的后端客户端，请求走已打开的连接
+            backend = LLMBackendRegistry.shared().backend_for(self.model)
+            # GPT-SoVITS 模式沿用首句前加 "." 的处理
+            first_prefix = "." if self.tts_mode == "gsv" else ""
+            segmenter = SentenceSegmenter(first_prefix=first_prefix)
             
-            response = client.chat.completions.create(
-                model=self.model,
-                messages=self.history_messages,
-                stream=True
-            )
+            # 开场模式：小模型先说出开场短句，主模型接着该短句续写
+            opener = ""
+            if self.draft_model and not self.speculative and not self.interrupted:
+                if backend.continues_assistant_prefix:
+                    opener = self.draftOpener(messages)
+                else:
+                    print(f"模型 {self.model} 的后端不支持续写，不使用开场模型")
+            if opener and not self.interrupted:
+                self.trace.tag(mode="draft", draft_model=self.draft_model)
+                self.current_response = opener
+                self.response_text_received.emit(opener)
+                if self.tts_thread:
+                    self.addSentence(first_prefix + opener)
+                # 开场短句已作为首句送出
+                segmenter.mark_first_emitted()
+                messages = messages + [{"role": "assistant", "content": opener}]
             
-            current_segment = ""
-            first_sentence_in = True
+            self.trace.mark("llm_request", model=self.model)
+            response = backend.chat_stream(self.model, messages)
+            self.response = response
+            if self.interrupted:
+                # 建立连接期间已被打断
+                response.close()
             
-            for chunk in response:
+            first_token = True
+            for content in response:
                 if self.interrupted:
                     print("生成被打断")
                     break
                     
-                content = chunk.choices[0].delta.content
-                    
-                self.current_response += content
-                self.response_text_received.emit(content)
-                current_segment += content
-                if self.tts_thread:
-                    if chunk.choices[0].finish_reason == "stop":
-                        self.tts_thread.add_text(current_segment)
-                        current_segment = ""
-                    if len(current_segment) < 8:
-                        continue
-                    '''[
-                        # 英文
-                        '.', '?', '!', ';', ':',
-                        # 中文
-                        '。', '？', '！', '；', '：',
-                        # 法语
-                        '»', '«',
-                        # 西班牙语
-                        '¿', '¡',
-                        # 其他
-                        '…', '...', '——','···'
-                    ]'''
-                    if any(current_segment.endswith(p) for p in ',.?!，。！？'):
-                        if first_sentence_in:
-                            self.tts_thread.add_text("." + current_segment)
-                            first_sentence_in = False
-                        else:
-                            self.tts_thread.add_text(current_segment)
-                        current_segment = ""
+                if first_token:
+                    first_token = False
+                    self.trace.mark("llm_first_token")
+                if self.released.is_set():
+                    self.emitContent(content, segmenter)
+                else:
+                    self.pending.append(content)
+            
+            if not self.released.is_set() and not self.interrupted:
+                # 推测启动的回复已生成完，等待最终识别结果确认或取消
+                if not self.released.wait(self.SPECULATION_TIMEOUT):
+                    print("推测启动的回复等待确认超时")
+                    self.interrupt()
+            if not self.interrupted:
+                self.emitContent("", segmenter)
+            
+            if self.tts_thread and not self.interrupted:
+                for sentence in segmenter.flush():
+                    self.addSentence(sentence)
+            self.trace.mark("llm_done", chars=len(self.current_response))
             
             # 如果没有被打断，将完整响应添加到历史记录
             if not self.interrupted:
-                self.history_messages.append({
-                    'role': 'assistant',
-                    'content': self.current_response
-                })
+                self.recordResponse()
+                self.reportStats(response.stats, messages)
             
             # 等待TTS处理完成
             if self.tts_thread:
-                self.tts_thread.wait_for_cache_empty()
+                self.tts_thread.finish_input()
+                self.tts_thread.wait_until_done(self.tts_thread.DRAIN_STALL_TIMEOUT)
                 self.tts_thread.stop()
             
+            self.trace.finish("interrupted" if self.interrupted else "done")
             self.response_finished.emit()
             
         except Exception as e:
+            # 停止TTS线程：释放预取和工作线程，结束在共享播放器上的会话
+            if self.tts_thread:
+                self.tts_thread.stop()
+            if self.interrupted:
+                # 打断时断开连接引起的错误
+                return
+            self.trace.finish("error")
             if self.tts_settings:
                 self.response_full_text_received.emit(f"错误：{str(e)}")
             else:
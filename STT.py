@@ -1,33 +1,109 @@
+import os
+import time
+import threading
+from collections import deque
 from PyQt6.QtCore import QThread, pyqtSignal
 from RealtimeSTT import AudioToTextRecorder
+from latency_trace import TurnTrace
+from speculation import PartialStabilityDetector
+
+
+class VoiceTurn:
+    """一句识别完成的语音输入"""
+    def __init__(self, text, trace):
+        self.text = text
+        self.trace = trace
+
+
+class TurnQueue:
+    """识别线程到界面线程的语音输入队列：放入不阻塞，不丢弃
+    积压达到上限时新的一句并入最后一项，界面线程一次取出全部
+    """
+    MAX_TURNS = 8
+
+    def __init__(self, max_turns=MAX_TURNS):
+        self.max_turns = max_turns
+        self._turns = deque()
+        self._lock = threading.Lock()
+        self.coalesced = 0  # 因积压而合并的句数
+
+    def put(self, turn):
+        with self._lock:
+            if len(self._turns) >= self.max_turns:
+                # 按最新一句计时
+                last = self._turns[-1]
+                turn.text = merge_utterances([last.text, turn.text])
+                turn.trace.absorb(last.trace)
+                self._turns[-1] = turn
+                self.coalesced += 1
+            else:
+                self._turns.append(turn)
+
+    def drain(self):
+        with self._lock:
+            turns = list(self._turns)
+            self._turns.clear()
+            return turns
+
+    def __len__(self):
+        return len(self._turns)
+
+
+def merge_utterances(texts):
+    """把连续的几句语音输入合并为一条消息"""
+    merged = ""
+    for text in texts:
+        text = text.strip()
+        if not text:
+            continue
+        if merged and merged[-1] not in "，。！？,.!?；;…":
+            merged += "，"
+        merged += text
+    return merged
+
 
 class STTThread(QThread):
     text_signal = pyqtSignal(str)
     test_signal = pyqtSignal(str)
     STTmodel_ready_signal = pyqtSignal()
+    partial_stable_signal = pyqtSignal(str)  # 中间结果已稳定，可推测启动LLM
+    turn_ready_signal = pyqtSignal()  # turns 中有新的语音输入，由界面线程取出
 
-    def __init__(self, config):
+    def __init__(self, config, speculative_ms=None, audio_source=None):
+        """
+        :param speculative_ms: 中间结果保持该毫秒数不变时发出 partial_stable_signal；None 表示不推测
+        :param audio_source: 代替麦克风的音频来源（如 audio_replay.WavReplaySource），None 表示使用麦克风
+        """
         super().__init__()
         # 添加实时转录相关配置
         self.config = config.copy()
         self.config.update({
-            'on_realtime_transcription_update': self.process_text  # 实时转录回调
+            'on_realtime_transcription_update': self.process_text,  # 实时转录回调
+            'on_recording_stop': self.on_recording_stop  # 检测到说话结束
         })
+        # CPU 配置的线程数不是识别器参数，创建识别器前通过环境变量设置
+        self.cpu_threads = self.config.pop('cpu_threads', None)
+        self.audio_source = audio_source
+        if audio_source:
+            self.config['use_microphone'] = False
+            self.config.pop('input_device_index', None)
+        self.speech_end_time = None
+        self.stability = PartialStabilityDetector(speculative_ms, self.partial_stable_signal.emit) \
+            if speculative_ms else None
         self.running = True
         self.is_testing = False
         self.recorder = None
         self.paused = True
         self.last_text = ""
-        self.control_panel = None
-
-    def set_control_panel(self, control_panel):
-        """设置控制面板引用"""
-        self.control_panel = control_panel
+        # 识别结果经队列交给界面线程，识别循环不等待LLM和TTS
+        self.turns = TurnQueue()
 
     def run(self):
         try:
             if not self.recorder:
-                # 创建录音器
+                # 创建录音器（最终识别在子进程中进行，会继承这里设置的线程数）
+                if self.cpu_threads:
+                    os.environ['OMP_NUM_THREADS'] = str(self.cpu_threads)
                 self.recorder = AudioToTextRecorder(**self.config)
                 
                 # 等待 recorder.is_running 变为 True
@@ -38,15 +114,28 @@ class STTThread(QThread):
                 
                 # 发送模型就绪信号
                 self.STTmodel_ready_signal.emit()
+                if self.audio_source:
+                    self.audio_source.start(self.recorder)
             
                 # 开始录音和识别循环
                 while self.running:
                     if not self.paused:
                         # 获取识别结果
                         result = self.recorder.text()
-                        # 如果不是测试模式且有control_panel，则更新输入框
-                        if result and not self.is_testing and self.control_panel and self.control_panel.voice_input_enabled and not self.control_panel.user_editing:
-                            self.control_panel.sendMessage(result)
+                        # 不是测试模式时放入队列，由界面线程发送；这里不访问任何界面对象
+                        if result and not self.is_testing:
+                            # 记录说话结束和最终识别结果的时间
+                            trace = TurnTrace(source="voice")
+                            if self.speech_end_time is not None:
+                                trace.mark("speech_end", at=self.speech_end_time)
+                            trace.mark("stt_final", chars=len(result))
+                            self.turns.put(VoiceTurn(result, trace))
+                            self.turn_ready_signal.emit()
+                        if self.audio_source:
+                            self.audio_source.utterance_done(result, self.speech_end_time)
+                        self.speech_end_time = None
+                        if self.stability:
+                            self.stability.reset()
                     else:
                         self.msleep(100)
                 
@@ -57,17 +146,25 @@ class STTThread(QThread):
         """处理实时转录的文本"""
         if text != self.last_text and not self.is_testing:
             self.last_text = text
+            if self.stability:
+                self.stability.update(text)
             # 发送文本用于显示
             self.text_signal.emit(text)
         elif text != self.last_text and self.is_testing:
             self.last_text = text
             self.test_signal.emit(text)
 
+    def on_recording_stop(self):
+        """VAD 判断说话结束（识别尚未完成）"""
+        self.speech_end_time = time.perf_counter()
+
     def pause(self):
         """暂停录音"""
         if self.recorder:
             self.paused = True
             self.recorder.stop()
+        if self.stability:
+            self.stability.reset()
 
     def resume(self):
         """恢复录音"""
@@ -76,6 +173,8 @@ class STTThread(QThread):
     def stop(self):
         """停止线程"""
         self.running = False
+        if self.audio_source:
+            self.audio_source.stop()
         if self.recorder:
             self.recorder.stop()
         self.wait()
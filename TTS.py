@@ -1,110 +1,671 @@
 import threading
 from queue import Queue
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import pyaudio as pa
 import time
-import wave
 import requests
-import io
+from requests.adapters import HTTPAdapter
 import os
 from datetime import datetime
+from tts_cache import TTSAudioCache
+from audio_recorder import StreamingRecorder
+from segmenter import SentenceSegmenter
+from audio_format import AudioFormat, StreamingResampler, read_stream_header, fade_out
 
 from requests.auth import CONTENT_TYPE_FORM_URLENCODED
 
+class AudioRingBuffer:
+    """定长PCM环形缓冲区（单生产者/单消费者），读取按帧对齐
+    读取端不加锁，可在 PyAudio 回调中调用；写入端之间及与 clear() 之间用锁互斥
+    """
+    DISCARDED = -1  # write_from 的返回值：缓冲区已清空或关闭，本次数据被丢弃
+    def __init__(self, capacity_frames, frame_size=2):
+        self.frame_size = frame_size
+        self.capacity = capacity_frames * frame_size
+        self._buf = bytearray(self.capacity)
+        self._view = memoryview(self._buf)
+        self._discard_to = 0  # clear() 请求丢弃到的位置，由读取端应用
+        self._epoch = 0  # clear() 时递增，丢弃清空前开始的写入
+        self._closed = False
+        self._lock = threading.Lock()  # 写入端/clear() 互斥，读取端不使用
+        self._readable = threading.Condition(threading.Lock())
+        self._writable = threading.Condition(threading.Lock())
+        # 只有对方在等待时才通知，读写的常规路径不获取任何锁
+        self._reader_waiting = False
+        self._writer_waiting = False
+        # 统计计数
+        self.overruns = 0  # 写入时缓冲区已满的次数
+        self.underruns = 0  # 播放中途缓冲区被读空的次数
+        self.total_written = 0  # 只由写入端修改
+        self.total_read = 0  # 只由读取端修改（含 clear() 丢弃的部分）
+        self.discarded = 0
+
+    def _read_position(self):
+        return max(self.total_read, self._discard_to)
+
+    @property
+    def fill_level(self):
+        """当前缓冲的字节数"""
+        return self.total_written - self._read_position()
+
+    @property
+    def free_space(self):
+        return self.capacity - self.fill_level
+
+    def _wait_for_space(self, timeout, epoch):
+        """等待可写空间，调用时不能持有锁；返回是否有空间"""
+        if self.free_space > 0:
+            return True
+        self.overruns += 1
+        with self._writable:
+            self._writer_waiting = True
+            try:
+                self._writable.wait_for(
+                    lambda: self.free_space > 0 or self._closed or epoch != self._epoch, timeout)
+            finally:
+                self._writer_waiting = False
+        return self.free_space > 0 and not self._closed and epoch == self._epoch
+
+    def write(self, data, timeout=None):
+        """写入数据，缓冲区满时阻塞等待；返回实际写入的字节数"""
+        data = memoryview(data).cast('B')
+        written = 0
+        epoch = self._epoch
+        while written < len(data):
+            if not self._wait_for_space(timeout, epoch):
+                break
+            with self._lock:
+                if epoch != self._epoch:
+                    break
+                start = self.total_written % self.capacity
+                n = min(len(data) - written, self.free_space, self.capacity - start)
+                self._view[start:start + n] = data[written:written + n]
+                self._commit(n)
+            written += n
+        return written
+
+    def write_from(self, reader, max_bytes, timeout=None, tap=None):
+        """用 reader.readinto 直接把数据读入缓冲区，避免中间分配
+        :param tap: 可选回调，接收本次读入数据的 memoryview
+        :return: 读取的字节数，0 表示 reader 已结束；DISCARDED 表示缓冲区已清空或关闭
+        """
+        epoch = self._epoch
+        if not self._wait_for_space(timeout, epoch):
+            return self.DISCARDED
+        with self._lock:
+            start = self.total_written % self.capacity
+            n = min(max_bytes, self.free_space, self.capacity - start)
+        # 读取网络数据时不持有锁，消费者只会读取已提交的区域
+        n = reader.readinto(self._view[start:start + n]) or 0
+        if n:
+            if tap is not None:
+                tap(self._view[start:start + n])
+            with self._lock:
+                if epoch != self._epoch:
+                    return self.DISCARDED
+                self._commit(n)
+        return n
+
+    def _commit(self, n):
+        """发布已写入的数据，调用时需持有写入锁"""
+        self.total_written += n
+        if self._reader_waiting:
+            with self._readable:
+                self._readable.notify_all()
+
+    def read(self, max_bytes, timeout=None):
+        """读取最多 max_bytes 字节（整帧），缓冲区为空时等待 timeout 秒
+        timeout=0 时不阻塞也不加锁
+        """
+        if self._discard_to > self.total_read:
+            self.total_read = self._discard_to
+        if self.fill_level < self.frame_size and timeout != 0:
+            self.wait_readable(timeout)
+            if self._discard_to > self.total_read:
+                self.total_read = self._discard_to
+        n = min(max_bytes, self.total_written - self.total_read)
+        n -= n % self.frame_size
+        if n <= 0:
+            return b""
+        start = self.total_read % self.capacity
+        end = start + n
+        if end <= self.capacity:
+            data = bytes(self._view[start:end])
+        else:
+            data = bytes(self._view[start:]) + bytes(self._view[:end - self.capacity])
+        self.total_read += n
+        if self._writer_waiting:
+            with self._writable:
+                self._writable.notify_all()
+        return data
+
+    def wait_readable(self, timeout=None, until=None):
+        """阻塞直到有可读数据或缓冲区关闭
+        :param until: 可选的等待条件，代替"有可读数据"；条件在缓冲区之外变化时需调用 wake()
+        """
+        if until is None:
+            ready = lambda: self.fill_level >= self.frame_size or self._closed
+        else:
+            ready = lambda: until() or self._closed
+        with self._readable:
+            self._reader_waiting = True
+            try:
+                return self._readable.wait_for(ready, timeout)
+            finally:
+                self._reader_waiting = False
+
+    def wake(self):
+        """唤醒等待读取的一方（例如等待条件在缓冲区之外发生了变化）"""
+        with self._readable:
+            self._readable.notify_all()
+
+    def peek(self, max_bytes):
+        """读取但不移除缓冲区头部的数据（整帧）"""
+        position = self._read_position()
+        start = position % self.capacity
+        n = min(max_bytes, self.total_written - position, self.capacity - start)
+        n -= n % self.frame_size
+        return bytes(self._view[start:start + n]) if n > 0 else b""
+
+    def clear(self):
+        """清空缓冲区，正在进行的写入会被丢弃"""
+        with self._lock:
+            # 丢弃的数据由读取端计为已消费，保持 total_read + fill == total_written
+            self.discarded += self.fill_level
+            self._discard_to = self.total_written
+            self._epoch += 1
+        with self._writable:
+            self._writable.notify_all()
+
+    def close(self):
+        """关闭缓冲区，唤醒所有等待的读写方"""
+        self._closed = True
+        with self._readable:
+            self._readable.notify_all()
+        with self._writable:
+            self._writable.notify_all()
+
+    def stats(self):
+        return {
+            "fill_level": self.fill_level,
+            "capacity": self.capacity,
+            "overruns": self.overruns,
+            "underruns": self.underruns,
+            "total_written": self.total_written,
+            "total_read": self._read_position(),
+            "discarded": self.discarded,
+        }
+
+
+class PlaybackSegment:
+    """播放时间线上的一段音频（通常是一句话）"""
+    def __init__(self, index, text, start_sample, sample_rate):
+        self.index = index
+        self.text = text
+        self.start_sample = start_sample
+        self.sample_rate = sample_rate
+        self.num_samples = None  # 写入结束前为 None
+
+    @property
+    def end_sample(self):
+        return None if self.num_samples is None else self.start_sample + self.num_samples
+
+    @property
+    def duration(self):
+        """时长（秒），写入结束前为 None"""
+        return None if self.num_samples is None else self.num_samples / self.sample_rate
+
+
+class PlaybackSession:
+    """一轮对话对共享播放器的写入句柄，关闭后该轮尚在进行的写入全部丢弃"""
+    def __init__(self, player):
+        self.player = player
+        self.active = True
+        self.discarded = 0  # 关闭后丢弃的写入次数
+
+    def add_audio_data(self, audio_data):
+        if self.active:
+            self.player.add_audio_data(audio_data)
+        else:
+            self.discarded += 1
+
+    def fill_from(self, reader, tap=None):
+        if self.active:
+            return self.player.fill_from(reader, tap=tap)
+        # 已关闭：读出并丢弃，由调用方自行结束读取
+        self.discarded += 1
+        data = reader.read(self.player.period_bytes)
+        return len(data)
+
+
 class AudioPlayer:
-    def __init__(self, play_device=None):
+    SAMPLE_WIDTH = 2  # 16位采样
+    CHANNELS = 1
+    PERIOD_FRAMES = 1024  # 每次写入声卡的帧数
+    BUFFER_SECONDS = 10  # 环形缓冲区容量（秒）
+    OUTPUT_RATE = None  # 输出采样率，None 表示使用设备默认采样率
+    FALLBACK_RATE = 48000
+    CALLBACK_MODE = True  # 由 PyAudio 回调拉取数据，不受 Python 线程调度影响
+    MAX_PREBUFFER = 3.0  # 预缓冲上限（秒）
+    JITTER_STEP = 0.05  # 每次欠载增加的抖动余量（秒）
+    JITTER_MAX = 0.5
+    echo_reference = None  # echo_gate.EchoReference，设置后记录送出的音频及发声时间，供识别端判断回声
+
+    _players = {}  # 播放设备 -> 共享的播放器
+    _players_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, play_device=None):
+        """获取指定设备的共享播放器，首次调用时打开设备并启动播放线程，之后各轮对话复用"""
+        with cls._players_lock:
+            player = cls._players.get(play_device)
+            if player is None or not player.running:
+                player = cls(play_device)
+                player.start()
+                cls._players[play_device] = player
+            return player
+
+    @classmethod
+    def shutdown_all(cls):
+        """程序退出时关闭所有共享播放器"""
+        with cls._players_lock:
+            players = list(cls._players.values())
+            cls._players.clear()
+        for player in players:
+            player.stop()
+
+    def __init__(self, play_device=None, callback_mode=None):
         self.running = True
-        self.audio_cache = deque()
-        self.cache_lock = threading.Lock()
-        self.cache_event = threading.Event()
         self.p = pa.PyAudio()
-        self.stream = None
         self.play_device = play_device
-        self.setup_stream()
+        self.callback_mode = self.CALLBACK_MODE if callback_mode is None else callback_mode
+        # 输出流固定使用设备采样率，各引擎的音频在写入前转换
+        self.sample_rate = self.OUTPUT_RATE or self._device_rate()
+        self.frame_size = self.SAMPLE_WIDTH * self.CHANNELS
+        self.period_bytes = self.PERIOD_FRAMES * self.frame_size
+        self.buffer = AudioRingBuffer(self.sample_rate * self.BUFFER_SECONDS, self.frame_size)
+        self._silence = bytes(self.period_bytes)
+        # 播放位置标记：写入位置 -> 播放到该位置时的回调
+        self.markers = deque()
+        self.marker_lock = threading.Lock()
+        self.played_position = 0  # 已写入声卡的字节位置（与 buffer.total_written 同一坐标）
+        self._progress = threading.Event()  # 回调模式下通知播放线程触发标记
+        # 播放时钟：(样本位置, 该样本发声的时间, 已交给声卡的样本位置)，整体替换
+        self.segments = []  # PlaybackSegment 列表，按起始样本排序
+        self.max_segments = 256
+        self._clock = (0, time.perf_counter(), 0)
+        self.output_latency = 0.0  # 声卡输出延迟（秒）
+        # 预缓冲（抖动缓冲）：写入位置达到 _gate_position 前保持静音
+        self._gate_position = 0
+        self._gate_time = None
+        self.jitter_margin = 0.0  # 根据欠载自适应的额外余量（秒）
+        self.start_delays = deque(maxlen=200)  # 从开始接收到开始发声的时间（秒）
+        self.device_underflows = 0  # 声卡报告的输出欠载次数
+        # 打断：下一个周期播放淡出后的尾音，并记录从打断到静音的时间
+        self._fade_tail = None
+        self._interrupt_time = None
+        self.interrupt_latencies = deque(maxlen=200)
+        self._stream_underruns = 0
         self.error_count = 0
         self.max_errors = 3
         self.is_playing = False
         self.last_play_time = time.time()
         self.total_played = 0
-        self.saved_audio = bytearray()  # 用于保存音频数据
-        self.save_audio = False  # 是否保存音频数据的标志
+        self.recorder = None  # 录音器，写入缓冲区的音频同时写入磁盘
+        self._record_origin = 0  # 开始录音时的样本位置
         self.is_realtime_tts = False  # 是否是 RealtimeTTS 模式
+        self.producing = 0  # 正在写入缓冲区的音频段数
+        self.session = None  # 当前占用播放器的一轮对话
+        self.session_lock = threading.Lock()
+        self.thread = None
+        # 回调模式下打开即开始调用 _callback，所以放在所有状态初始化之后
+        self.stream = None
+        self.setup_stream()
         
+    def _device_rate(self):
+        """查询输出设备的默认采样率"""
+        try:
+            if self.play_device is None:
+                info = self.p.get_default_output_device_info()
+            else:
+                info = self.p.get_device_info_by_index(self.play_device)
+            return int(info["defaultSampleRate"])
+        except Exception as e:
+            print(f"获取输出设备采样率失败，使用 {self.FALLBACK_RATE}Hz: {e}")
+            return self.FALLBACK_RATE
+
     def setup_stream(self):
         try:
             if self.stream is not None:
                 self.stream.stop_stream()
                 self.stream.close()
+                self.stream = None
             
-            self.stream = self.p.open(
+            kwargs = dict(
                 format=self.p.get_format_from_width(2),
                 channels=1,
-                rate=24000 if self.is_realtime_tts else 32000,  # RealtimeTTS 使用 24000Hz
+                rate=self.sample_rate,
                 output=True,
-                output_device_index=self.play_device
+                output_device_index=self.play_device,
+                frames_per_buffer=self.PERIOD_FRAMES
             )
+            if self.callback_mode:
+                try:
+                    self.stream = self.p.open(stream_callback=self._callback, **kwargs)
+                except Exception as e:
+                    print(f"回调模式打开音频流失败，改用阻塞写入: {e}")
+                    self.callback_mode = False
+            if self.stream is None:
+                self.stream = self.p.open(**kwargs)
+            self.output_latency = self.stream.get_output_latency()
         except Exception as e:
             print(f"设置音频流时出错: {e}")
             
+    def start(self):
+        """启动播放线程"""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def open_session(self):
+        """新一轮对话开始使用播放器；上一轮若未结束则丢弃其剩余音频"""
+        with self.session_lock:
+            previous = self.session
+            self.session = PlaybackSession(self)
+        if previous is not None and previous.active:
+            previous.active = False
+            self.flush()
+        return self.session
+
+    def close_session(self, session, flush=True):
+        """一轮对话结束
+        :param flush: 是否丢弃该轮尚未播放的音频（打断时）
+        """
+        if not session.active:
+            return
+        session.active = False
+        with self.session_lock:
+            current = self.session is session
+            if current:
+                self.session = None
+        if flush and current:
+            self.flush()
+
     def add_audio_data(self, audio_data):
-        with self.cache_lock:
-            if self.is_realtime_tts:
-                # 如果是 RealtimeTTS 模式，检查是否需要添加 WAV 头
-                if not audio_data.startswith(b'RIFF'):
-                    # 创建 WAV 文件头
-                    wav_header = io.BytesIO()
-                    with wave.open(wav_header, 'wb') as wav_file:
-                        wav_file.setnchannels(1)  # 单声道
-                        wav_file.setsampwidth(2)  # 16位采样
-                        wav_file.setframerate(24000)  # RealtimeTTS 采样率
-                        wav_file.setnframes(0)  # 帧数将在写入数据时自动计算
-                    wav_header.seek(0)
-                    audio_data = wav_header.read() + audio_data
-                    
-            self.audio_cache.append(audio_data)
-            if self.save_audio:
-                self.saved_audio.extend(audio_data)
-        self.cache_event.set()
-        
+        """写入PCM数据（不含WAV头）"""
+        self.buffer.write(audio_data)
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.write(audio_data)
+
+    def fill_from(self, reader, tap=None):
+        """从HTTP响应等可 readinto 的对象直接读入环形缓冲区
+        :param tap: 可选回调，接收读入的数据（用于缓存整句音频）
+        :return: 读取的字节数，0 表示数据已读完，AudioRingBuffer.DISCARDED 表示数据被清空丢弃
+        """
+        recorder = self.recorder
+        if recorder is not None:
+            save_tap = recorder.write
+            if tap is not None:
+                extra_tap = tap
+                tap = lambda data: (save_tap(data), extra_tap(data))
+            else:
+                tap = save_tap
+        return self.buffer.write_from(reader, self.period_bytes, tap=tap)
+
+    def begin_stream(self, prebuffer=0.0):
+        """标记开始接收一段音频，期间读空缓冲区计为欠载
+        :param prebuffer: 当前未在播放时，开始发声前需要缓冲的音频时长（秒）；另加自适应抖动余量
+        """
+        self.producing += 1
+        self._stream_underruns = self.buffer.underruns
+        if not self.is_playing:
+            self._arm_gate(prebuffer + self.jitter_margin)
+
+    def end_stream(self):
+        """标记一段音频已全部写入"""
+        self.producing = max(0, self.producing - 1)
+        if self.buffer.underruns == self._stream_underruns:
+            # 本段没有欠载，逐步收回抖动余量
+            self.jitter_margin = max(0.0, self.jitter_margin - self.JITTER_STEP / 4)
+        self.buffer.wake()
+
+    def _arm_gate(self, seconds):
+        """在写入位置再增加 seconds 秒音频之前保持静音"""
+        seconds = min(self.MAX_PREBUFFER, seconds)
+        self._gate_position = self.buffer.total_written + int(seconds * self.sample_rate) * self.frame_size
+        self._gate_time = time.perf_counter()
+
+    def _gate_open(self):
+        """预缓冲已满足（或音频已全部写入）时允许播放"""
+        return (self.is_playing or not self.producing
+                or self.buffer.total_written >= self._gate_position)
+
+    def _pull(self, nbytes, min_bytes):
+        """取出下一块要播放的数据，处理预缓冲和欠载；不足 min_bytes 时视为缓冲区读空"""
+        data = self.buffer.read(nbytes, timeout=0) if self._gate_open() else b""
+        if data:
+            if not self.is_playing:
+                self.is_playing = True
+                if self._gate_time is not None:
+                    self.start_delays.append(time.perf_counter() - self._gate_time)
+                    self._gate_time = None
+            self.last_play_time = time.time()
+            self.total_played += len(data)
+        if len(data) < min_bytes and self.is_playing:
+            if self.producing:
+                # 音频仍在接收时缓冲区被读空，即为欠载：加大抖动余量并重新预缓冲
+                self.buffer.underruns += 1
+                self.jitter_margin = min(self.JITTER_MAX, self.jitter_margin + self.JITTER_STEP)
+                self._arm_gate(self.jitter_margin)
+            self.is_playing = False
+        return data
+
+    def _set_clock(self, end, nbytes, delay):
+        """end 之前的 nbytes 字节将在 delay 秒后开始发声"""
+        end_sample = end // self.frame_size
+        self._clock = (end_sample - nbytes // self.frame_size, time.perf_counter() + delay, end_sample)
+
+    def begin_segment(self, text, index=None):
+        """在当前写入位置开始一段新的音频，返回 PlaybackSegment"""
+        segment = PlaybackSegment(index, text, self.buffer.total_written // self.frame_size, self.sample_rate)
+        segments = self.segments[-(self.max_segments - 1):] + [segment]
+        self.segments = segments  # 整体替换，读取方无需加锁
+        return segment
+
+    def end_segment(self, segment):
+        """结束一段音频，记录其时长"""
+        segment.num_samples = self.buffer.total_written // self.frame_size - segment.start_sample
+        recorder = self.recorder
+        if recorder is not None and segment.start_sample >= self._record_origin:
+            recorder.add_label(segment.start_sample - self._record_origin,
+                               segment.end_sample - self._record_origin, segment.text)
+
+    def start_recording(self, path, audio_format="wav"):
+        """开始把写入的音频流式保存到文件（按输出采样率）"""
+        self.stop_recording()
+        self._record_origin = self.buffer.total_written // self.frame_size
+        self.recorder = StreamingRecorder(path, self.sample_rate, audio_format,
+                                          self.CHANNELS, self.SAMPLE_WIDTH)
+        return self.recorder
+
+    def stop_recording(self, recorder=None):
+        """结束录音，等待剩余数据写入磁盘
+        :param recorder: 只结束指定的录音（已被新的录音替换时不影响新录音）
+        """
+        if recorder is None or recorder is self.recorder:
+            recorder, self.recorder = self.recorder, None
+        if recorder is not None:
+            recorder.close()
+
+    def get_playback_sample(self):
+        """估算当前正在发声的样本位置（扣除声卡延迟，按时间插值）"""
+        samples, clock_time, limit = self._clock
+        elapsed = int((time.perf_counter() - clock_time) * self.sample_rate)
+        return max(0, min(limit, samples + elapsed))
+
+    def get_position(self):
+        """返回 (当前段, 段内偏移秒数)，没有正在播放的段时返回 (None, 0.0)
+        只读取整体替换的列表和整数，不需要加锁
+        """
+        sample = self.get_playback_sample()
+        segments = self.segments
+        lo, hi = 0, len(segments)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if segments[mid].start_sample <= sample:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == 0:
+            return None, 0.0
+        segment = segments[lo - 1]
+        end = segment.end_sample
+        if end is not None and sample >= end:
+            return None, 0.0
+        return segment, (sample - segment.start_sample) / segment.sample_rate
+
+    def played_segments(self):
+        """已完整播放的段"""
+        sample = self.get_playback_sample()
+        return [seg for seg in self.segments if seg.end_sample is not None and seg.end_sample <= sample]
+
+    def add_marker(self, callback, position=None):
+        """在当前写入位置（或指定的字节位置）放置标记，该位置之前的音频全部播放后调用 callback"""
+        with self.marker_lock:
+            if position is None:
+                position = self.buffer.total_written
+            if position > self.played_position:
+                # 标记按位置排序；指定位置的标记可能晚于之后追加的标记
+                i = len(self.markers)
+                while i and self.markers[i - 1][0] > position:
+                    i -= 1
+                self.markers.insert(i, (position, callback))
+                return
+        callback()
+
+    def _fire_markers(self, position):
+        """触发所有不晚于 position 的标记"""
+        fired = []
+        with self.marker_lock:
+            self.played_position = max(self.played_position, position)
+            while self.markers and self.markers[0][0] <= self.played_position:
+                fired.append(self.markers.popleft()[1])
+        for callback in fired:
+            try:
+                callback()
+            except Exception as e:
+                print(f"播放标记回调出错: {e}")
+
     def get_cache_size(self):
-        with self.cache_lock:
-            return len(self.audio_cache)
-            
+        """当前缓冲的字节数"""
+        return self.buffer.fill_level
+
+    def get_stats(self):
+        """缓冲区填充量、溢出与欠载统计，以及延迟（毫秒）"""
+        stats = self.buffer.stats()
+        delays = sorted(self.start_delays)
+        stats.update({
+            "mode": "callback" if self.callback_mode else "blocking",
+            "device_underflows": self.device_underflows,
+            "buffered_ms": self.buffer.fill_level / self.frame_size / self.sample_rate * 1000,
+            "output_latency_ms": self.output_latency * 1000,
+            "jitter_margin_ms": self.jitter_margin * 1000,
+        })
+        if delays:
+            stats["start_delay_p50_ms"] = delays[len(delays) // 2] * 1000
+            stats["start_delay_max_ms"] = delays[-1] * 1000
+        interrupts = sorted(self.interrupt_latencies)
+        if interrupts:
+            stats["interrupt_p50_ms"] = interrupts[len(interrupts) // 2] * 1000
+            stats["interrupt_max_ms"] = interrupts[-1] * 1000
+        return stats
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        """PyAudio 回调：从环形缓冲区取数据，不足部分补静音；不获取任何锁"""
+        if status & pa.paOutputUnderflow:
+            self.device_underflows += 1
+        nbytes = frame_count * self.frame_size
+        delay = time_info.get("output_buffer_dac_time", 0) - time_info.get("current_time", 0)
+        if delay <= 0:
+            delay = self.output_latency
+        interrupt_time = self._interrupt_time
+        if interrupt_time is not None:
+            # 打断后的第一个周期：只播放淡出的尾音，之后即为静音
+            self._interrupt_time = None
+            data = (self._fade_tail or b"")[:nbytes]
+            self._fade_tail = None
+            silent_at = time.perf_counter() + delay + len(data) / self.frame_size / self.sample_rate
+            self.interrupt_latencies.append(silent_at - interrupt_time)
+        else:
+            data = self._pull(nbytes, nbytes)
+        if data and interrupt_time is None:
+            position = self.buffer.total_read
+            self._set_clock(position, len(data), delay)
+            self.played_position = max(self.played_position, position)
+        reference = self.echo_reference
+        if data and reference is not None:
+            reference.push(data, time.perf_counter() + delay, self.sample_rate)
+        try:
+            if self.markers[0][0] <= self.played_position:
+                self._progress.set()
+        except IndexError:
+            pass
+        if len(data) < nbytes:
+            pad = nbytes - len(data)
+            data += self._silence[:pad] if pad <= len(self._silence) else bytes(pad)
+        return (data, pa.paContinue)
+
     def run(self):
+        if self.callback_mode:
+            self._run_markers()
+            return
         while self.running:
             try:
-                if not self.audio_cache:
-                    self.cache_event.wait(timeout=0.1)
-                    self.cache_event.clear()
-                    continue
-                    
-                with self.cache_lock:
-                    if not self.audio_cache:
-                        continue
-                    audio_data = self.audio_cache.popleft()
-                
+                # 每次取一个周期大小的数据块
+                audio_data = self._pull(self.period_bytes, self.frame_size)
                 if audio_data:
-                    # 如果是 RealtimeTTS 模式，跳过 WAV 头
-                    if self.is_realtime_tts and audio_data.startswith(b'RIFF'):
-                        audio_data = audio_data[44:]
+                    position = self.buffer.total_read
                     self.stream.write(audio_data)
-                    self.is_playing = True
-                    self.last_play_time = time.time()
-                    self.total_played += len(audio_data)
+                    # 刚写入的数据在声卡延迟之后全部发声
+                    n = len(audio_data) // self.frame_size
+                    self._set_clock(position, len(audio_data), self.output_latency - n / self.sample_rate)
+                    reference = self.echo_reference
+                    if reference is not None:
+                        reference.push(audio_data, time.perf_counter() + self.output_latency - n / self.sample_rate,
+                                       self.sample_rate)
+                    self._fire_markers(position)
+                elif self.buffer.fill_level:
+                    # 预缓冲中，等待数据足够或本段写入结束
+                    self.buffer.wait_readable(until=self._gate_open)
                 else:
-                    self.is_playing = False
-                    
+                    # 阻塞等待新数据，空闲时不占用CPU
+                    self.buffer.wait_readable()
+
             except Exception as e:
                 print(f"音频播放错误: {e}")
+                # 没有写入声卡的音频不会再播放，视为已播放，避免等待播放完毕的一方一直阻塞
+                self._fire_markers(self.buffer.total_read)
                 self.error_count += 1
                 if self.error_count >= self.max_errors:
                     print("错误次数过多，重新设置音频流")
                     self.setup_stream()
                     self.error_count = 0
                 time.sleep(0.1)
-                
+
+    def _run_markers(self):
+        """回调模式下的播放线程：只负责在回调线程之外触发播放标记"""
+        while self.running:
+            self._progress.wait()
+            self._progress.clear()
+            self._fire_markers(self.played_position)
+
     def stop(self):
+        """关闭播放器并释放音频设备（共享播放器只在程序退出时调用）"""
         self.running = False
+        self.buffer.close()
+        self._progress.set()
         try:
             if self.stream is not None:
                 self.stream.stop_stream()
@@ -113,15 +674,40 @@ class AudioPlayer:
             print(f"关闭音频流时出错: {e}")
         self.p.terminate()
         
-    def wait_for_cache_empty(self):
-        while self.get_cache_size() > 0:
-            time.sleep(0.1)
+    def wait_for_cache_empty(self, timeout=None):
+        """等待当前已写入的音频全部播放完毕"""
+        drained = threading.Event()
+        self.add_marker(drained.set)
+        return drained.wait(timeout)
+
+    def _discard(self):
+        """丢弃缓冲区中的所有音频"""
+        self.buffer.clear()
+        # 被丢弃的音频视为已播放，唤醒所有等待者
+        self._fire_markers(self.buffer.total_written)
+        self._set_clock(self.buffer.total_written, 0, 0.0)
+
+    def flush(self, fade=True):
+        """打断播放：丢弃未播放的音频，不重建音频流
+        回调模式下正在播放的声音在一个周期内淡出；阻塞模式下声卡中已排队的数据会播完
+        """
+        if self.is_playing:
+            now = time.perf_counter()
+            if self.callback_mode:
+                if fade:
+                    head = self.buffer.peek(self.period_bytes)
+                    self._fade_tail = fade_out(head) if head else None
+                self._interrupt_time = now
+            else:
+                self.interrupt_latencies.append(self.output_latency)
+        self._discard()
+        self.is_playing = False
 
     def clear(self):
         """清理所有音频缓存并重置音频流"""
-        with self.cache_lock:
-            self.audio_cache.clear()
-        if self.stream:
+        self._discard()
+        if self.stream and not self.callback_mode:
+            # 阻塞模式下重建音频流以丢弃声卡中已排队的数据
             try:
                 self.stream.stop_stream()
                 self.stream.close()
@@ -130,253 +716,594 @@ class AudioPlayer:
             except Exception as e:
                 print(f"重置音频流时出错: {e}")
         self.is_playing = False
-        self.cache_event.clear()
         
     def set_realtime_tts_mode(self, is_realtime):
-        """设置是否为 RealtimeTTS 模式"""
+        """设置是否为 RealtimeTTS 模式；输出流采样率固定，无需重建"""
         self.is_realtime_tts = is_realtime
-        # 重新设置音频流以使用正确的采样率
-        self.setup_stream()
+
+class TTSClient:
+    """TTS后端HTTP客户端，同一地址的所有 TTSThread 共享一个长连接池"""
+    POOL_SIZE = 4  # 默认连接池大小
+    RTF_ALPHA = 0.3  # 实时率滑动平均系数
+    SECONDS_PER_CHAR = 0.2  # 尚无测量时每字的估计时长（秒）
+    INTERRUPT_TIMEOUT = 2.0
+    _clients = {}
+    _clients_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, baseurl, pool_size=None):
+        """获取（或创建）指定地址的共享客户端"""
+        with cls._clients_lock:
+            client = cls._clients.get(baseurl)
+            if client is None:
+                client = cls(baseurl, pool_size or cls.POOL_SIZE)
+                cls._clients[baseurl] = client
+            elif pool_size and pool_size != client.pool_size:
+                client.set_pool_size(pool_size)
+            return client
+
+    def __init__(self, baseurl, pool_size=POOL_SIZE):
+        self.baseurl = baseurl
+        self.pool_size = pool_size
+        self.session = requests.Session()
+        self.session.headers.update({'Connection': 'keep-alive'})
+        self._mount_adapter()
+        self.ttfb_history = []  # 每句的首字节延迟（秒）
+        self._stats_lock = threading.Lock()
+        # 后端生成速度：实时率（生成耗时/音频时长）和每字音频时长的滑动平均，None 表示尚未测量
+        self.rtf = None
+        self.seconds_per_char = None
+        # RealtimeTTS 服务端当前的引擎/声音，None 表示未知
+        self._state_lock = threading.Lock()
+        self._engine = None
+        self._voice = None
+        self._state_version = None
+        self._state_supported = None  # 服务端是否提供 /state，False 时不再查询
+
+    def _mount_adapter(self):
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def set_pool_size(self, pool_size):
+        """修改连接池大小（重新挂载适配器，已有连接会被回收）"""
+        self.pool_size = pool_size
+        self._mount_adapter()
+
+    def get(self, path, **kwargs):
+        return self.session.get(f"{self.baseurl}{path}", **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.session.post(f"{self.baseurl}{path}", **kwargs)
+
+    def set_engine(self, engine_name):
+        return self.get("/set_engine", params={"engine_name": engine_name})
+
+    def set_voice(self, voice_name):
+        return self.get("/setvoice", params={"voice_name": voice_name})
+
+    def _update_state(self, state):
+        """根据服务端返回的状态更新本地缓存"""
+        if "version" in state:
+            self._engine = state.get("engine")
+            self._voice = state.get("voice")
+            self._state_version = state["version"]
+
+    def invalidate_state(self):
+        """丢弃缓存的引擎/声音状态，下次合成前重新查询"""
+        with self._state_lock:
+            self._engine = None
+            self._voice = None
+            self._state_version = None
+
+    def sync_state(self):
+        """查询服务端当前的引擎和声音"""
+        response = self.get("/state")
+        if response.status_code == 200:
+            state = response.json()
+            self._update_state(state)
+            self._state_supported = "version" in state
+        elif response.status_code == 404:
+            # 旧版服务端：之后只按切换请求的结果记录状态
+            self._state_supported = False
+        return response
+
+    def ensure_engine_voice(self, engine, voice):
+        """仅在配置变化时切换引擎和声音
+        :return: 失败时返回错误描述，成功返回 None
+        """
+        with self._state_lock:
+            if self._state_version is None and self._state_supported is not False:
+                self.sync_state()
+            if engine != self._engine:
+                response = self.set_engine(engine)
+                result = response.json() if response.status_code == 200 else {}
+                if response.status_code != 200 or "error" in result:
+                    self._state_version = None
+                    return f"设置引擎失败: {response.text}"
+                self._update_state(result)
+                self.reset_rtf()  # 换引擎后生成速度需要重新测量
+                if "version" not in result:
+                    # 旧版服务端不返回状态，只能按请求结果记录
+                    self._engine = engine
+                    self._voice = None
+            if voice and voice != self._voice:
+                response = self.set_voice(voice)
+                result = response.json() if response.status_code == 200 else {}
+                if response.status_code != 200 or "error" in result:
+                    self._state_version = None
+                    return f"设置声音失败: {response.text}"
+                self._update_state(result)
+                if "version" not in result:
+                    self._voice = voice
+        return None
+
+    def check_state_version(self, response):
+        """合成响应携带的状态版本与缓存不一致时（服务重启或被其他客户端切换）使缓存失效"""
+        version = response.headers.get("X-TTS-State-Version")
+        if version is not None and self._state_version is not None and int(version) != self._state_version:
+            self.invalidate_state()
+
+    def request_gsv(self, settings):
+        """GPT-SoVITS 合成请求（流式读取）"""
+        return self.post(
+            "/tts",
+            json=settings,
+            stream=True,
+            headers={'Accept': 'audio/x-wav'}
+        )
+
+    def request_realtime(self, text):
+        """RealtimeTTS 合成请求（流式读取）"""
+        return self.get("/tts", params={"text": text}, stream=True)
+
+    def interrupt(self):
+        return self.get("/interrupt")
+
+    def interrupt_async(self):
+        """在后台线程通知服务端取消合成，不等待结果"""
+        def worker():
+            try:
+                self.get("/interrupt", timeout=self.INTERRUPT_TIMEOUT)
+            except requests.RequestException as e:
+                print(f"发送打断请求失败: {e}")
+        threading.Thread(target=worker, daemon=True).start()
+
+    def synthesize(self, job, tts_settings, tts_mode, block_size=4096, is_running=None):
+        """合成 job.text，音频流式写入 job
+        :param is_running: 返回 False 时停止读取
+        :return: 失败时返回错误描述，成功返回 None
+        """
+        if tts_mode == "realtime":
+            # 引擎或声音变化时才切换
+            error = self.ensure_engine_voice(
+                tts_settings.get("engine", "kokoro"),
+                tts_settings.get("voice", "")
+            )
+            if error:
+                return error
+            request_time = time.perf_counter()
+            response = self.request_realtime(job.text)
+            self.check_state_version(response)
+            default_format = AudioFormat(24000)
+        else:
+            # 每个请求使用独立的参数副本
+            request_time = time.perf_counter()
+            response = self.request_gsv(dict(tts_settings, text=job.text))
+            default_format = AudioFormat(32000)
+
+        if response.status_code != 200:
+            return f"语音合成失败: {response.text}"
+
+        raw = response.raw
+        raw.decode_content = True
+        try:
+            # 解析WAV头获取真实格式；裸PCM流按后端默认格式处理
+            fmt, leftover = read_stream_header(raw, default_format)
+            first_byte_time = time.perf_counter()
+            self.record_ttfb(job.text, first_byte_time - request_time)
+            job.set_format(fmt)
+            if leftover:
+                job.put(leftover)
+            received = len(leftover)
+            while is_running is None or is_running():
+                n = job.fill_from(raw, block_size)
+                if n == AudioRingBuffer.DISCARDED:
+                    break
+                if not n:
+                    job.complete = True
+                    break
+                received += n
+        finally:
+            response.close()
+        if job.complete and received:
+            self.record_rtf(job.text, time.perf_counter() - first_byte_time,
+                            received / fmt.frame_size / fmt.sample_rate)
+        return None
+
+    def record_ttfb(self, text, seconds):
+        """记录一句话的首字节延迟"""
+        with self._stats_lock:
+            self.ttfb_history.append(seconds)
+            if len(self.ttfb_history) > 1000:
+                del self.ttfb_history[:-1000]
+        print(f"首字节延迟: {seconds * 1000:.1f}ms ({text[:20]})")
+
+    def record_rtf(self, text, synth_seconds, audio_seconds):
+        """记录一句话首字节之后的生成耗时和音频时长，更新实时率和每字时长"""
+        if audio_seconds <= 0:
+            return
+        rtf = synth_seconds / audio_seconds
+        with self._stats_lock:
+            self.rtf = rtf if self.rtf is None else self.rtf + self.RTF_ALPHA * (rtf - self.rtf)
+            if text:
+                per_char = audio_seconds / len(text)
+                if self.seconds_per_char is None:
+                    self.seconds_per_char = per_char
+                else:
+                    self.seconds_per_char += self.RTF_ALPHA * (per_char - self.seconds_per_char)
+
+    def reset_rtf(self):
+        with self._stats_lock:
+            self.rtf = None
+            self.seconds_per_char = None
+
+    def estimate_prebuffer(self, text):
+        """开始播放一句话前需要缓冲的音频时长（秒）
+        生成慢于实时（RTF>1）时，时长为D的句子要先缓冲 D*(1-1/RTF) 秒，剩余部分才能按时到达
+        """
+        rtf = self.rtf
+        if rtf is None or rtf <= 1.0:
+            return 0.0
+        duration = len(text) * (self.seconds_per_char or self.SECONDS_PER_CHAR)
+        return duration * (1.0 - 1.0 / rtf)
+
+    def ttfb_stats(self):
+        """首字节延迟统计（毫秒）"""
+        with self._stats_lock:
+            samples = sorted(self.ttfb_history)
+        if not samples:
+            return {"count": 0}
+        return {
+            "count": len(samples),
+            "mean_ms": sum(samples) / len(samples) * 1000,
+            "p50_ms": samples[len(samples) // 2] * 1000,
+            "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000,
+            "rtf": self.rtf,
+        }
+
+
+class SentenceJob:
+    """单句合成任务：预取的音频先缓存在这里，轮到它播放时再交给 AudioPlayer"""
+    def __init__(self, index, text, output_rate=None):
+        """
+        :param output_rate: 输出采样率，音频会被转换为该采样率的16位单声道PCM；None 表示保持原采样率
+        """
+        self.index = index
+        self.text = text
+        self.output_rate = output_rate
+        self.chunks = deque()
+        self.cond = threading.Condition()
+        self.sink = None  # 轮到播放后直接写入的 PlaybackSession
+        self.done = False
+        self.complete = False  # 音频是否完整接收
+        self.discarded = False  # 是否有音频因播放会话关闭被丢弃
+        self.error = None
+        self.format = None  # 后端返回的音频格式
+        self.resampler = None
+        self.recorded = None  # 需要写入缓存时记录整句PCM（输出格式）
+        self.played = threading.Event()  # 本句音频已全部播放
+        self.segment = None  # 播放时间线上对应的 PlaybackSegment
+        self.first_byte_time = None  # 收到第一段音频的时间
+
+    @property
+    def cacheable(self):
+        """音频完整接收并全部写入了仍在进行的播放会话，可以写入缓存"""
+        return self.complete and not self.discarded
+
+    @property
+    def sample_rate(self):
+        """输出音频（即 recorded 中数据）的采样率"""
+        return self.resampler.dst_rate if self.resampler else None
+
+    def set_format(self, fmt):
+        """设置后端音频格式，创建到输出格式的流式转换器"""
+        self.format = fmt
+        self.resampler = StreamingResampler(fmt, self.output_rate or fmt.sample_rate)
+        self.first_byte_time = time.perf_counter()
+
+    def record(self):
+        """开始记录整句音频"""
+        self.recorded = bytearray()
+
+    def put(self, data):
+        """写入一段后端格式的音频；已开始播放时直接写入播放器"""
+        self._deliver(self.resampler.process(data))
+
+    def _deliver(self, data):
+        if not data:
+            return
+        with self.cond:
+            if self.recorded is not None:
+                self.recorded.extend(data)
+            if self.sink is not None:
+                self._write(self.sink.add_audio_data, data)
+            else:
+                self.chunks.append(data)
+
+    def fill_from(self, reader, block_size):
+        """从响应读取一块音频，返回读取的字节数"""
+        sink = self.sink
+        if sink is not None and self.resampler.passthrough and not self.resampler.pending_bytes:
+            # 格式与输出一致，直接读入播放器的环形缓冲区
+            tap = self.recorded.extend if self.recorded is not None else None
+            n = self._write(sink.fill_from, reader, tap=tap)
+            if n == AudioRingBuffer.DISCARDED:
+                # 播放被打断清空，音频不完整
+                self.discarded = True
+            return n
+        data = reader.read(block_size)
+        if data:
+            self.put(data)
+        return len(data)
+
+    def _write(self, write, *args, **kwargs):
+        """写入播放会话，会话已关闭、数据被丢弃时标记本句"""
+        discarded = self.sink.discarded
+        result = write(*args, **kwargs)
+        if self.sink.discarded != discarded:
+            self.discarded = True
+        return result
+
+    def attach(self, sink):
+        """轮到本句播放：先把已缓存的音频交给播放器，之后的数据直接写入"""
+        with self.cond:
+            self.sink = sink
+            while self.chunks:
+                self._write(sink.add_audio_data, self.chunks.popleft())
+
+    def finish(self, error=None):
+        if self.done:
+            return
+        if error is None and self.resampler is not None:
+            self._deliver(self.resampler.flush())
+        with self.cond:
+            if self.done:
+                return
+            self.error = error
+            self.done = True
+            self.cond.notify_all()
+
+    def wait(self, timeout=None):
+        """等待合成结束，返回是否已结束"""
+        with self.cond:
+            return self.cond.wait_for(lambda: self.done, timeout)
+
 
 class TTSThread:
-    def __init__(self, baseurl, tts_settings, stream=None, play_device=None, save_wav=False, tts_mode="gsv"):
+    PREFETCH = 2  # 默认同时向后端请求的句数
+    END_OF_INPUT = object()  # 文本输入结束标记
+    DRAIN_STALL_TIMEOUT = 30.0  # 等待播放完毕时，播放和合成都没有进展的最长秒数
+
+    def __init__(self, baseurl, tts_settings, stream=None, play_device=None, save_wav=False, tts_mode="gsv", pool_size=None, prefetch=None, use_cache=True, record_format="wav", trace=None):
         """
         初始化实时TTS系统
         :param tts_settings: TTS设置，包含所有必要的参数
         :param stream: 文本流，用于实时生成文本
         :param play_device: 播放设备索引，默认为None使用系统默认设备
         :param save_wav: 是否保存音频文件
+        :param record_format: 保存音频的格式，"wav" 或 "flac"
         :param tts_mode: TTS模式，可选 "gsv" 或 "realtime"
+        :param pool_size: 共享连接池大小，默认为 TTSClient.POOL_SIZE
+        :param prefetch: 预取句数K，最多同时合成K句，按顺序播放
+        :param use_cache: 是否使用合成音频缓存
+        :param trace: 记录本轮各阶段耗时的 TurnTrace
         """
         self.baseurl = baseurl
+        self.client = TTSClient.shared(baseurl, pool_size)
+        self.cache = TTSAudioCache.shared() if use_cache else None
         self.tts_settings = tts_settings
         self.stream = stream
         self.text_queue = Queue()
         self.running = False
-        self.audio_player = AudioPlayer(play_device)
-        self.audio_thread = None
+        self.stopping = False
+        self.teardown_thread = None
+        # 播放器在各轮对话之间共享，设备保持打开
+        self.audio_player = AudioPlayer.shared(play_device)
+        self.session = None  # 本轮对播放器的写入句柄
         self.tts_thread = None
         self.stream_thread = None
+        self.play_thread = None
         self.tts_mode = tts_mode  # 添加TTS模式
+        self.prefetch = max(1, prefetch or self.PREFETCH)
+        if tts_mode == "realtime":
+            # RealtimeTTS 服务端同一时间只处理一个合成请求
+            self.prefetch = 1
+        self.job_queue = Queue()  # 按句子顺序排列的合成任务（重排序缓冲）
+        self.prefetch_slots = threading.Semaphore(self.prefetch)
+        self.executor = None
+        self.job_index = 0
+        self.jobs = deque()  # 尚未播放完毕的任务
+        # 完成事件：单句合成完成/单句播放完成的回调，以及全部播放完毕
+        self.on_sentence_synthesized = None
+        self.on_sentence_played = None
+        self.all_drained = threading.Event()
         # 设置 RealtimeTTS 模式
         self.audio_player.set_realtime_tts_mode(tts_mode == "realtime")
         # 检查是否有初始文本需要处理
         self.initial_text = self.tts_settings.get("text")
-        self.full_text = self.initial_text
+        self.full_text = self.initial_text or ""
         self.content = ""
         self.save_wav = save_wav
+        self.record_format = record_format
+        self.recorder = None
         self.text_ready = threading.Event()
+        self.trace = trace
         
         # 如果需要保存音频，创建保存目录
         if self.save_wav:
             self.audio_dir = os.path.join("logs", "audio")
             os.makedirs(self.audio_dir, exist_ok=True)
-            self.audio_player.save_audio = True
 
-    def _save_current_audio(self):
-        """保存当前音频"""
-        if not self.save_wav or not self.audio_player.saved_audio:
-            return
-            
+    def _start_recording(self):
+        """开始把本次播放的音频流式写入文件，每句话的起止时间写入同名标签文件"""
         try:
-            # 生成文件名
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = os.path.join(self.audio_dir, f"tts_{timestamp}.wav")
-            
-            # 创建WAV文件
-            with wave.open(filename, 'wb') as wf:
-                wf.setnchannels(1)  # 单声道
-                wf.setsampwidth(2)  # 16位采样
-                wf.setframerate(32000)  # 采样率
-                wf.writeframes(self.audio_player.saved_audio)
-            print(f"音频已保存到: {filename}")
-            
-            # 清理已保存的音频数据
-            self.audio_player.saved_audio = bytearray()
-            
+            filename = os.path.join(self.audio_dir, f"tts_{timestamp}")
+            self.recorder = self.audio_player.start_recording(filename, self.record_format)
+            print(f"音频保存路径: {self.recorder.path}")
         except Exception as e:
-            print(f"保存音频失败: {e}")
+            print(f"开始保存音频失败: {e}")
             
     def process_text(self):
-        """处理文本并生成音频"""
-        # 如果有初始文本，先处理它
-        if self.initial_text and self.running:
-            print(f"处理初始文本: {self.initial_text}")
-            self._synthesize_text(self.initial_text)
-            self.initial_text = None  # 清除初始文本，避免重复处理
-        
+        """按顺序取出文本，最多提前K句提交给后端合成"""
         while self.running:
+            text = self.text_queue.get()
+            if text is None or not self.running:
+                break
             try:
-                if not self.text_queue.empty():
-                    text = self.text_queue.get()
-                    if text:
-                        self._synthesize_text(text)
+                if text is self.END_OF_INPUT:
+                    self.job_queue.put(text)
+                elif text:
+                    self._submit_text(text)
             except Exception as e:
                 print(f"TTS处理错误: {e}")
-                time.sleep(1)
-            time.sleep(0.001)
-            
-    def _synthesize_text(self, text):
-        """合成单个文本并播放"""
+
+    def _submit_text(self, text):
+        """占用一个预取名额并提交合成任务"""
+        self.prefetch_slots.acquire()
+        if not self.running:
+            return
+        job = SentenceJob(self.job_index, text, output_rate=self.audio_player.sample_rate)
+        self.job_index += 1
+        self.jobs.append(job)
+        self.job_queue.put(job)
+        self.executor.submit(self._synthesize_text, job)
+
+    def play_jobs(self):
+        """按句子顺序把合成结果交给播放器"""
+        while self.running:
+            job = self.job_queue.get()
+            if job is None or not self.running:
+                break
+            if job is self.END_OF_INPUT:
+                # 之前的音频全部播放后即为本轮结束
+                self.audio_player.add_marker(self._on_all_played)
+                continue
+            try:
+                # 按后端实测的实时率决定开始发声前的预缓冲量
+                prebuffer = 0.0 if job.done else self.client.estimate_prebuffer(job.text)
+                self.audio_player.begin_stream(prebuffer)
+                job.segment = self.audio_player.begin_segment(job.text, job.index)
+                if self.trace and job.index == 0:
+                    # 第一帧交给声卡时，加上输出延迟即为开始发声的时间
+                    first_frame = (job.segment.start_sample + 1) * self.audio_player.frame_size
+                    self.audio_player.add_marker(lambda: self._mark_played("audio_first"), position=first_frame)
+                job.attach(self.session)
+                job.wait()
+                if job.error:
+                    print(job.error)
+                elif self.running:
+                    print(f"文本合成完成: {job.text}")
+                    if self.on_sentence_synthesized:
+                        self.on_sentence_synthesized(job)
+            finally:
+                self.audio_player.end_stream()
+                self.audio_player.end_segment(job.segment)
+                self.audio_player.add_marker(lambda job=job: self._on_job_played(job))
+                self.prefetch_slots.release()
+
+    def _mark_played(self, event):
+        """记录发声时间（交给声卡的时间加上输出延迟）；被打断时丢弃的音频不计"""
+        if self.trace and self.running:
+            self.trace.mark(event, at=time.perf_counter() + self.audio_player.output_latency)
+
+    def _on_all_played(self):
+        self._mark_played("audio_last")
+        self.all_drained.set()
+
+    def _on_job_played(self, job):
+        """一句话的音频全部播放完毕"""
+        job.played.set()
         try:
-            print(f"正在合成文本: {text}")
-            # 保存当前设置中的文本
-            original_text = self.tts_settings.get("text")
-            
-            # 设置要合成的文本
-            self.tts_settings["text"] = text
-            
-            if self.tts_mode == "realtime":
-                # RealtimeTTS 模式
-                # 首先设置引擎
-                engine_url = f"{self.baseurl}/set_engine"
-                print(engine_url)
-                engine_params = {
-                    "engine_name": self.tts_settings.get("engine", "kokoro")
-                }
-                print(engine_params)
-                engine_response = requests.get(engine_url, params=engine_params)
-                if engine_response.status_code != 200:
-                    print(f"设置引擎失败: {engine_response.text}")
-                    return
-                
-                # 然后设置声音
-                voice_url = f"{self.baseurl}/setvoice"
-                voice_params = {
-                    "voice_name": self.tts_settings.get("voice", "")
-                }
-                voice_response = requests.get(voice_url, params=voice_params)
-                if voice_response.status_code != 200:
-                    print(f"设置声音失败: {voice_response.text}")
+            self.jobs.remove(job)
+        except ValueError:
+            pass
+        if self.on_sentence_played and self.running:
+            self.on_sentence_played(job)
+
+    def _synthesize_text(self, job):
+        """在工作线程中合成单句文本，音频写入任务；优先使用缓存"""
+        error = None
+        if self.trace:
+            self.trace.mark("tts_request", index=job.index)
+        try:
+            key = None
+            if self.cache is not None and self.cache.enabled:
+                key = self.cache.make_key(job.text, self.tts_settings, self.tts_mode)
+                cached = self.cache.get(key)
+                if cached is not None:
+                    print(f"命中TTS缓存: {job.text}")
+                    pcm, sample_rate = cached
+                    job.set_format(AudioFormat(sample_rate))
+                    job.put(pcm)
+                    job.complete = True
                     return
-                
-                # 使用与 GSV 相同的请求方式
-                url = f"{self.baseurl}/tts"
-                params = {
-                    "text": text
-                }
-                response = requests.get(url, params=params, stream=True)
-                
-                if response.status_code == 200:
-                    first_chunk = True
-                    for chunk in response.iter_content(chunk_size=1024):
-                        if not self.running:
-                            break
-                            
-                        if chunk:
-                            if first_chunk and chunk.startswith(b'RIFF'):
-                                chunk = chunk[44:]
-                                first_chunk = False
-                            
-                            if len(chunk) > 0:
-                                if self.save_wav:
-                                    self.audio_player.save_audio = True
-                                self.audio_player.add_audio_data(chunk)
-                                
-                    print(f"文本合成完成: {text}")
-                    
-                    # 如果不是流式输入，保存当前音频
-                    if not self.stream and self.save_wav:
-                        print("保存音频...")
-                        self._save_current_audio()
-                else:
-                    print(f"语音合成失败: {response.text}")
-            else:
-                # GSV 模式
-                url = f"{self.baseurl}/tts"
-                response = requests.post(
-                    url,
-                    json=self.tts_settings,
-                    stream=True,
-                    headers={'Accept': 'audio/x-wav'}
-                )
-                
-                if response.status_code == 200:
-                    first_chunk = True
-                    for chunk in response.iter_content(chunk_size=1024):
-                        if not self.running:
-                            break
-                            
-                        if chunk:
-                            if first_chunk and chunk.startswith(b'RIFF'):
-                                chunk = chunk[44:]
-                                first_chunk = False
-                            
-                            if len(chunk) > 0:
-                                if self.save_wav:
-                                    self.audio_player.save_audio = True
-                                self.audio_player.add_audio_data(chunk)
-                                
-                    print(f"文本合成完成: {text}")
-                    
-                    # 如果不是流式输入，保存当前音频
-                    if not self.stream and self.save_wav:
-                        print("保存音频...")
-                        self._save_current_audio()
-                else:
-                    print(f"语音合成失败: {response.text}")
-                
-            # 恢复原始文本设置
-            self.tts_settings["text"] = original_text
+                job.record()
+
+            print(f"正在合成文本: {job.text}")
+            error = self.client.synthesize(
+                job,
+                self.tts_settings,
+                self.tts_mode,
+                block_size=self.audio_player.period_bytes,
+                is_running=lambda: self.running
+            )
+            # 先结束任务，转换器中剩余的采样写入 recorded 后再缓存
+            job.finish(error)
+            if key is not None and not error and job.cacheable and self.running:
+                self.cache.put(key, job.recorded, job.sample_rate)
             
         except Exception as e:
-            print(f"处理文本时出错: {e}")
-            
+            error = f"处理文本时出错: {e}"
+        finally:
+            job.finish(error)
+            if self.trace:
+                if job.first_byte_time is not None:
+                    self.trace.mark("tts_first_byte", at=job.first_byte_time, index=job.index)
+                self.trace.mark("tts_done", index=job.index, ok=error is None)
+
     def process_stream(self):
         """处理文本流"""
         if not self.stream:
             return
             
-        current_segment = ""
-        first_sentence_in = True
+        segmenter = SentenceSegmenter(first_prefix="." if self.tts_mode == "gsv" else "")
         for chunk in self.stream:
             if not self.running:
                 break
-            
-
-            if chunk.choices[0].delta.constent:
-                content = chunk.choices[0].delta.content
+            content = chunk.choices[0].delta.content
+            if content:
                 self.full_text += content
-                current_segment += content
-                if chunk.choices[0].finish_reason == "stop":
-                    self.text_queue.put(current_segment)
-                    current_segment = ""
-                if len(current_segment)<6:
-                    continue
-                        # 当遇到标点符号时，将文本加入队列
-                if any(current_segment.endswith(p) for p in '，,。！？.!?~'):
-                    if first_sentence_in:
-                        self.text_queue.put("."+current_segment)
-                        first_sentence_in = False
-                    else:
-                        self.text_queue.put(current_segment)
-                    current_segment = ""
+                for sentence in segmenter.feed(content):
+                    self.text_queue.put(sentence)
                     
         # 处理最后剩余的文本
-        if current_segment and self.running:
-            self.text_queue.put(current_segment)
-            
-        # 等待所有文本处理完成
-        while not self.text_queue.empty() and self.running:
-            time.sleep(0.1)
-            
-        # 等待音频处理和播放完成
-        time.sleep(1.0)  # 增加等待时间
-        
-        # 等待音频缓存处理完成
-        self.audio_player.wait_for_cache_empty()
-        
-        # 再等待一小段时间确保音频完全处理完成
-        time.sleep(0.5)
+        if self.running:
+            for sentence in segmenter.flush():
+                self.text_queue.put(sentence)
             
-        # 如果是流式输入，保存完整音频
-        if self.save_wav and self.audio_player.saved_audio:
-            print("保存流式合成的完整音频...")
-            self._save_current_audio()
+        # 等待所有文本合成并播放完毕
+        self.finish_input()
+        self.wait_until_done(self.DRAIN_STALL_TIMEOUT)
             
         # 设置文本准备完成标志
         self.text_ready.set()
             
+    def get_playback_position(self):
+        """当前正在播放的句子及其段内偏移（秒），见 AudioPlayer.get_position"""
+        return self.audio_player.get_position()
+
     def get_full_text(self):
         """等待并获取完整文本"""
         self.text_ready.wait()  # 等待文本准备完成
@@ -388,6 +1315,24 @@ class TTSThread:
             return
             
         self.running = True
+        self.stopping = False
+        self.all_drained.clear()
+        
+        # 如果有初始文本，先处理它
+        if self.initial_text:
+            print(f"处理初始文本: {self.initial_text}")
+            self.text_queue.put(self.initial_text)
+            self.initial_text = None  # 清除初始文本，避免重复处理
+        
+        self.session = self.audio_player.open_session()
+        
+        # 合成线程池，最多同时合成K句
+        self.executor = ThreadPoolExecutor(max_workers=self.prefetch)
+        
+        # 启动顺序播放线程
+        self.play_thread = threading.Thread(target=self.play_jobs)
+        self.play_thread.daemon = True
+        self.play_thread.start()
         
         # 启动TTS线程
         self.tts_thread = threading.Thread(target=self.process_text)
@@ -400,53 +1345,135 @@ class TTSThread:
             self.stream_thread.daemon = True
             self.stream_thread.start()
             
-        # 清理之前的音频数据
-        self.audio_player.saved_audio = bytearray()
-        
-        # 启动音频播放线程
-        self.audio_thread = threading.Thread(target=self.audio_player.run)
-        self.audio_thread.daemon = True
-        self.audio_thread.start()
+        if self.save_wav:
+            self._start_recording()
         
         print(f"音频保存状态: {'启用' if self.save_wav else '禁用'}")
         if self.save_wav:
             print(f"音频保存目录: {self.audio_dir}")
             
-    def stop(self):
-        """停止TTS系统"""
+    def stop(self, wait=False):
+        """停止TTS系统：调用方线程上只做让声音立即停止的操作，其余清理在后台线程完成
+        :param wait: 是否等待后台清理完成
+        """
+        if self.stopping:
+            return
+        self.stopping = True
         print("正在停止TTS系统...")
         
         # 首先设置运行状态为False
         self.running = False
-        requests.get(f"{self.baseurl}/interrupt")
-        # 立即清空文本队列
+        interrupted = not self.all_drained.is_set()
+        # 丢弃本轮未播放的音频（一个周期内淡出），播放器和设备保持打开供下一轮使用
+        if self.session:
+            self.audio_player.close_session(self.session, flush=interrupted)
+        if interrupted:
+            # 通知服务端取消合成，不等待结果
+            self.client.interrupt_async()
+        # 立即清空文本队列和未播放的合成任务
         while not self.text_queue.empty():
             try:
                 self.text_queue.get_nowait()
             except:
                 pass
-        
-        # 完全清理和重置音频播放器
-        if self.audio_player:
-            self.audio_player.clear()
-        
-        # 确保在停止前保存音频
-        if self.save_wav and self.audio_player.saved_audio:
-            print("停止前保存音频...")
-            self._save_current_audio()
-            
-        # 完全停止音频播放器
-        if self.audio_player:
-            self.audio_player.stop()
+        while not self.job_queue.empty():
+            try:
+                self.job_queue.get_nowait()
+            except:
+                pass
+        # 唤醒阻塞在队列、预取名额和任务上的线程
+        self.text_queue.put(None)
+        self.job_queue.put(None)
+        for _ in range(self.prefetch):
+            self.prefetch_slots.release()
+        for job in list(self.jobs):
+            job.finish("TTS已停止")
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        self.all_drained.set()
+
+        self.teardown_thread = threading.Thread(target=self._teardown, daemon=True)
+        self.teardown_thread.start()
+        if wait:
+            self.teardown_thread.join()
+
+    def _teardown(self):
+        """后台清理：写完录音、等待各线程退出并输出统计"""
+        # 写完录音文件
+        if self.recorder:
+            self.audio_player.stop_recording(self.recorder)
+            self.recorder = None
             
         # 等待线程结束
-        if self.audio_thread:
-            self.audio_thread.join(timeout=1.0)
         if self.tts_thread:
             self.tts_thread.join(timeout=1.0)
+        if self.play_thread:
+            self.play_thread.join(timeout=1.0)
         if self.stream_thread:
             self.stream_thread.join(timeout=1.0)
+
+        print(f"TTS首字节延迟统计: {self.client.ttfb_stats()}")
+        print(f"TTS播放统计: {self.audio_player.get_stats()}")
+        if self.cache is not None:
+            print(f"TTS缓存统计: {self.cache.stats()}")
+
+    def finish_input(self):
+        """标记本轮文本已全部送入，播放完毕后 all_drained 置位"""
+        if self.running:
+            self.text_queue.put(self.END_OF_INPUT)
+
+    def wait_until_done(self, stall_timeout=None):
+        """等待本轮所有文本合成并播放完毕（或TTS被停止）
+        :param stall_timeout: 播放位置和写入位置都超过该秒数没有变化时放弃等待，None 为一直等待
+        :return: 是否已播放完毕
+        """
+        if stall_timeout is None:
+            return self.all_drained.wait()
+        player = self.audio_player
+        progress = (player.played_position, player.buffer.total_written)
+        while not self.all_drained.wait(stall_timeout):
+            current = (player.played_position, player.buffer.total_written)
+            if current == progress:
+                print(f"TTS播放超过 {stall_timeout:g}s 没有进展，停止等待")
+                return False
+            progress = current
+        return True
             
+    @staticmethod
+    def prewarm_cache(baseurl, tts_settings, phrases, tts_mode="gsv"):
+        """在后台线程中为常用短语预先合成并写入缓存，不播放"""
+        cache = TTSAudioCache.shared()
+        client = TTSClient.shared(baseurl)
+        settings = dict(tts_settings)
+
+        def worker():
+            warmed = 0
+            for phrase in phrases:
+                phrase = phrase.strip()
+                if not phrase or not cache.enabled:
+                    continue
+                key = cache.make_key(phrase, settings, tts_mode)
+                if cache.contains(key):
+                    continue
+                job = SentenceJob(-1, phrase)
+                job.record()
+                try:
+                    error = client.synthesize(job, settings, tts_mode)
+                except Exception as e:
+                    error = str(e)
+                if error:
+                    print(f"预热TTS缓存失败: {error}")
+                    break
+                job.finish()
+                if job.cacheable:
+                    cache.put(key, job.recorded, job.sample_rate)
+                    warmed += 1
+            print(f"TTS缓存预热完成: 新增 {warmed} 条, {cache.stats()}")
+
+        thread = threading.Thread(target=worker, daemon=True)
+        thread.start()
+        return thread
+
     def add_text(self, text):
         """添加文本到队列"""
         if self.running:
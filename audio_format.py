@@ -0,0 +1,161 @@
+import struct
+import numpy as np
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class AudioFormat:
+    """PCM流参数"""
+    def __init__(self, sample_rate, channels=1, sample_width=2, is_float=False):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.is_float = is_float
+
+    @property
+    def frame_size(self):
+        return self.channels * self.sample_width
+
+    def __eq__(self, other):
+        return (isinstance(other, AudioFormat)
+                and self.sample_rate == other.sample_rate
+                and self.channels == other.channels
+                and self.sample_width == other.sample_width
+                and self.is_float == other.is_float)
+
+    def __repr__(self):
+        kind = "float" if self.is_float else "int"
+        return f"AudioFormat({self.sample_rate}Hz, {self.channels}ch, {kind}{self.sample_width * 8})"
+
+
+def _read_exact(reader, n):
+    data = b""
+    while len(data) < n:
+        chunk = reader.read(n - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+def read_stream_header(reader, default_format):
+    """解析流开头的WAV头（按块遍历，不假定44字节）
+    :return: (AudioFormat, 已读取但属于音频数据的字节)；不是WAV时返回默认格式和已读的字节
+    """
+    head = _read_exact(reader, 12)
+    if len(head) < 12 or head[:4] != b"RIFF" or head[8:12] != b"WAVE":
+        return default_format, head
+
+    fmt = default_format
+    while True:
+        chunk_header = _read_exact(reader, 8)
+        if len(chunk_header) < 8:
+            return fmt, b""
+        chunk_id, chunk_size = chunk_header[:4], struct.unpack("<I", chunk_header[4:])[0]
+        if chunk_id == b"data":
+            # 流式响应的 data 块长度可能为0或占位值，直接读到流结束
+            return fmt, b""
+        body = _read_exact(reader, chunk_size + (chunk_size & 1))
+        if chunk_id == b"fmt " and len(body) >= 16:
+            format_tag, channels, sample_rate = struct.unpack("<HHI", body[:8])
+            bits = struct.unpack("<H", body[14:16])[0]
+            if format_tag == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                format_tag = struct.unpack("<H", body[24:26])[0]
+            fmt = AudioFormat(sample_rate, channels, bits // 8, format_tag == WAVE_FORMAT_IEEE_FLOAT)
+
+
+def pcm_to_float(data, fmt):
+    """PCM字节转为 float32 单声道数组（多声道取平均）"""
+    if fmt.is_float:
+        samples = np.frombuffer(data, dtype="<f4" if fmt.sample_width == 4 else "<f8").astype(np.float32)
+    elif fmt.sample_width == 1:
+        samples = (np.frombuffer(data, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif fmt.sample_width == 2:
+        samples = np.frombuffer(data, dtype="<i2").astype(np.float32) / 32768.0
+    elif fmt.sample_width == 3:
+        raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3)
+        ints = (raw[:, 0].astype(np.int32) | (raw[:, 1].astype(np.int32) << 8)
+                | (raw[:, 2].astype(np.int32) << 16))
+        ints = np.where(ints & 0x800000, ints - 0x1000000, ints)
+        samples = ints.astype(np.float32) / 8388608.0
+    else:
+        samples = np.frombuffer(data, dtype="<i4").astype(np.float32) / 2147483648.0
+    if fmt.channels > 1:
+        samples = samples.reshape(-1, fmt.channels).mean(axis=1)
+    return samples
+
+
+def float_to_int16(samples):
+    return (np.clip(samples, -1.0, 1.0) * 32767.0).astype("<i2").tobytes()
+
+
+class StreamingResampler:
+    """流式格式转换：任意PCM格式 -> 16位单声道目标采样率（分块线性插值，块间保持相位连续）"""
+    def __init__(self, src_format, dst_rate):
+        self.src_format = src_format
+        self.dst_rate = dst_rate
+        self.step = src_format.sample_rate / dst_rate  # 每个输出样本前进的输入样本数
+        self._pending = b""  # 不足一帧的剩余字节
+        self._last = None  # 上一块的最后一个样本
+        self._t = 0.0  # 下一个输出样本在当前块中的位置
+
+    @property
+    def passthrough(self):
+        """格式已与输出一致，无需转换"""
+        fmt = self.src_format
+        return (fmt.sample_rate == self.dst_rate and fmt.channels == 1
+                and fmt.sample_width == 2 and not fmt.is_float)
+
+    @property
+    def pending_bytes(self):
+        """缓存的不足一帧的字节数；为 0 时后续数据可以不经转换直接使用"""
+        return len(self._pending)
+
+    def process(self, data):
+        """转换一块数据，返回16位单声道PCM字节"""
+        data = self._pending + bytes(data)
+        frame_size = self.src_format.frame_size
+        usable = len(data) - len(data) % frame_size
+        self._pending = data[usable:]
+        if not usable:
+            return b""
+        if self.passthrough:
+            return data[:usable]
+        samples = pcm_to_float(data[:usable], self.src_format)
+        if self.step == 1.0:
+            return float_to_int16(samples)
+
+        if self._last is not None:
+            samples = np.concatenate(([self._last], samples))
+        last_index = len(samples) - 1
+        if last_index <= self._t:
+            # 本块不足以产生新的输出样本
+            self._last = samples[-1]
+            self._t -= last_index
+            return b""
+        count = int(np.ceil((last_index - self._t) / self.step))
+        positions = self._t + self.step * np.arange(count)
+        index = positions.astype(np.int64)
+        frac = (positions - index).astype(np.float32)
+        out = samples[index] * (1.0 - frac) + samples[index + 1] * frac
+        self._t = positions[-1] + self.step - last_index
+        self._last = samples[-1]
+        return float_to_int16(out)
+
+    def flush(self):
+        """输出残留的最后一个样本"""
+        if self._last is None or self.passthrough:
+            return b""
+        last = self._last
+        self._last = None
+        self._t = 0.0
+        return float_to_int16(np.array([last], dtype=np.float32))
+
+
+def fade_out(data):
+    """16位单声道PCM线性淡出到静音"""
+    samples = np.frombuffer(data, dtype="<i2").astype(np.float32)
+    samples *= np.linspace(1.0, 0.0, len(samples), dtype=np.float32)
+    return samples.astype("<i2").tobytes()
@@ -0,0 +1,126 @@
+import os
+import wave
+import threading
+from queue import Queue, Full
+
+try:
+    import soundfile
+    import numpy as np
+except ImportError:  # FLAC 为可选功能
+    soundfile = None
+
+
+class StreamingRecorder:
+    """流式录音：音频经有界队列交给后台线程增量写入磁盘，内存占用与录音时长无关
+    每句话的起止位置写入同名的 .txt 标签文件（Audacity 标签格式：开始秒\t结束秒\t文本）
+    """
+    QUEUE_SIZE = 256  # 队列中最多积压的数据块数
+    PUT_TIMEOUT = 0.5  # 磁盘长时间无响应时丢弃数据，避免阻塞播放
+
+    def __init__(self, path, sample_rate, audio_format="wav", channels=1, sample_width=2):
+        """
+        :param path: 输出文件路径（不含扩展名时按格式补全）
+        :param audio_format: "wav" 或 "flac"（需要安装 soundfile）
+        """
+        audio_format = audio_format.lower()
+        if audio_format == "flac" and soundfile is None:
+            print("未安装 soundfile，录音改用 WAV 格式")
+            audio_format = "wav"
+        root, ext = os.path.splitext(path)
+        if ext.lower() != f".{audio_format}":
+            root = path
+        self.path = f"{root}.{audio_format}"
+        self.label_path = f"{root}.txt"
+        self.audio_format = audio_format
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.frame_size = channels * sample_width
+        self.samples_written = 0  # 已送入队列的样本数（标签按此计时）
+        self.dropped_bytes = 0
+        self._queue = Queue(maxsize=self.QUEUE_SIZE)
+        self._closed = False
+        self._thread = threading.Thread(target=self._writer, daemon=True)
+        self._thread.start()
+
+    def write(self, data):
+        """追加一块PCM数据（可在任意线程调用）"""
+        if self._closed or not data:
+            return
+        data = bytes(data)
+        try:
+            self._queue.put(("audio", data), timeout=self.PUT_TIMEOUT)
+        except Full:
+            self.dropped_bytes += len(data)
+            return
+        self.samples_written += len(data) // self.frame_size
+
+    def add_label(self, start_sample, end_sample, text):
+        """记录一段音频（按录音内的样本位置）对应的文本"""
+        if self._closed:
+            return
+        label = (max(0, start_sample) / self.sample_rate, max(0, end_sample) / self.sample_rate,
+                 " ".join(text.split()))
+        try:
+            self._queue.put(("label", label), timeout=self.PUT_TIMEOUT)
+        except Full:
+            pass
+
+    def close(self, timeout=None):
+        """写完队列中的数据并关闭文件"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+        if self.dropped_bytes:
+            print(f"录音写入过慢，丢弃了 {self.dropped_bytes} 字节音频")
+
+    def _open(self):
+        if self.audio_format == "flac":
+            return soundfile.SoundFile(self.path, "w", samplerate=self.sample_rate,
+                                       channels=self.channels, subtype="PCM_16", format="FLAC")
+        wf = wave.open(self.path, "wb")
+        wf.setnchannels(self.channels)
+        wf.setsampwidth(self.sample_width)
+        wf.setframerate(self.sample_rate)
+        return wf
+
+    def _writer(self):
+        """后台写入线程"""
+        audio_file = None
+        label_file = None
+        saved = False
+        try:
+            audio_file = self._open()
+            label_file = open(self.label_path, "w", encoding="utf-8")
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                kind, payload = item
+                if kind == "audio":
+                    if self.audio_format == "flac":
+                        samples = np.frombuffer(payload, dtype="<i2").reshape(-1, self.channels)
+                        audio_file.write(samples)
+                    else:
+                        # writeframes 每次都会更新文件头，意外退出时文件仍可读
+                        audio_file.writeframes(payload)
+                else:
+                    label_file.write("%.3f\t%.3f\t%s\n" % payload)
+                    label_file.flush()
+            saved = True
+        except Exception as e:
+            print(f"录音写入失败: {e}")
+            # 继续取出队列中的数据，避免写入方阻塞
+            while self._queue.get() is not None:
+                pass
+        finally:
+            for f in (audio_file, label_file):
+                if f is not None:
+                    try:
+                        f.close()
+                    except Exception as e:
+                        print(f"关闭录音文件失败: {e}")
+        if saved:
+            print(f"音频已保存到: {self.path}")
@@ -0,0 +1,138 @@
+import time
+import wave
+import threading
+import numpy as np
+
+
+def read_wav(path):
+    """读取 16 位 PCM 的 WAV 文件，多声道取平均，返回 (int16 数组, 采样率)"""
+    with wave.open(path, "rb") as f:
+        if f.getsampwidth() != 2:
+            raise ValueError(f"只支持16位PCM的WAV文件: {path}")
+        channels, rate = f.getnchannels(), f.getframerate()
+        audio = np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16)
+    if channels > 1:
+        audio = audio.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    return audio, rate
+
+
+class WavReplaySource:
+    """代替麦克风，把录好的 WAV 文件按实时或加速的速度送入识别器（recorder.feed_audio）
+    每个文件视为一句话：送完后以实时速度补静音，直到识别器给出这句的最终结果再送下一个文件。
+    识别器按实际时间判断说话结束，所以静音部分不加速。
+    结果记录在 results 中，每个文件一项（时间均为 time.perf_counter()）：
+        path, duration, speech_end（最后一段语音送入的时间）, vad_end（识别器判断说话结束的时间）,
+        final_at（最后一个最终结果的时间）, texts, partials [(时间, 文本)]
+    """
+    CHUNK_MS = 32
+    SILENCE_RMS = 300  # 低于该幅度的片段视为静音，用于确定说话结束的时刻
+    UTTERANCE_TIMEOUT = 15.0  # 送完一句后最多等待最终结果的秒数
+
+    def __init__(self, paths, speed=1.0, lead_silence=1.0):
+        """
+        :param speed: 语音部分的送入速度倍数，1 为实时
+        :param lead_silence: 每句前补的静音秒数，需大于识别器的 min_gap_between_recordings
+        """
+        self.paths = list(paths)
+        self.speed = speed
+        self.lead_silence = lead_silence
+        self.results = []
+        self.finished = threading.Event()
+        self._current = None
+        self._done = threading.Event()
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, recorder):
+        """识别器就绪后由 STTThread 调用"""
+        self._thread = threading.Thread(target=self._feed, args=(recorder,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._done.set()
+
+    def on_partial(self, text):
+        """实时识别的中间结果"""
+        with self._lock:
+            if self._current is not None:
+                self._current["partials"].append((time.perf_counter(), text))
+
+    def utterance_done(self, text, vad_end=None):
+        """识别器给出一个最终结果（由 STTThread 的识别循环调用）；一个文件可能被切成几句"""
+        now = time.perf_counter()
+        with self._lock:
+            record = self._current
+            if record is None:
+                return
+            if text:
+                record["texts"].append(text)
+            record["final_at"] = now
+            if vad_end is not None:
+                record["vad_end"] = vad_end
+            # 最后一段语音送入之后的结果才是这个文件的最终结果
+            if record["speech_end"] is not None:
+                self._done.set()
+
+    def _feed(self, recorder):
+        try:
+            for path in self.paths:
+                if self._stopped.is_set():
+                    break
+                try:
+                    self._play(recorder, path)
+                except Exception as e:
+                    print(f"回放 {path} 失败: {e}")
+        finally:
+            with self._lock:
+                self._current = None
+            self.finished.set()
+
+    def _play(self, recorder, path):
+        audio, rate = read_wav(path)
+        chunk = max(1, rate * self.CHUNK_MS // 1000)
+        voiced_end = self._last_voiced(audio, chunk)
+        self._send_silence(recorder, rate, chunk, self.lead_silence)
+
+        record = {"path": path, "duration": len(audio) / rate, "speech_end": None, "vad_end": None,
+                  "final_at": None, "texts": [], "partials": []}
+        self._done.clear()
+        with self._lock:
+            self._current = record
+            self.results.append(record)
+
+        start = time.perf_counter()
+        for offset in range(0, len(audio), chunk):
+            if self._stopped.is_set():
+                return
+            recorder.feed_audio(audio[offset:offset + chunk].tobytes(), rate)
+            if voiced_end is not None and offset < voiced_end <= offset + chunk:
+                with self._lock:
+                    record["speech_end"] = time.perf_counter()
+            delay = start + (offset + chunk) / rate / self.speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        if voiced_end is None:
+            return  # 整个文件都是静音，不等待识别结果
+
+        deadline = time.perf_counter() + self.UTTERANCE_TIMEOUT
+        silence = np.zeros(chunk, dtype=np.int16).tobytes()
+        while not self._done.is_set() and time.perf_counter() < deadline:
+            recorder.feed_audio(silence, rate)
+            self._done.wait(chunk / rate)
+
+    def _send_silence(self, recorder, rate, chunk, seconds):
+        silence = np.zeros(chunk, dtype=np.int16).tobytes()
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end and not self._stopped.is_set():
+            recorder.feed_audio(silence, rate)
+            time.sleep(chunk / rate)
+
+    def _last_voiced(self, audio, chunk):
+        """最后一个非静音片段的结束位置，没有语音时返回 None"""
+        for offset in range((len(audio) - 1) // chunk * chunk, -1, -chunk):
+            piece = audio[offset:offset + chunk].astype(np.float32)
+            if np.sqrt(np.mean(piece * piece)) >= self.SILENCE_RMS:
+                return min(len(audio), offset + chunk)
+        return None
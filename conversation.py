@@ -0,0 +1,188 @@
+import os
+import json
+import threading
+import unicodedata
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # 没有 tiktoken 时按字符估算
+    tiktoken = None
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    """加载一次分词器，之后复用"""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        print(f"加载分词器失败，改用估算: {e}")
+        return None
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text):
+    """文本的token数；没有分词器时按 中日韩字符1个、其他约4个字符1个 估算"""
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    wide = sum(1 for ch in text if unicodedata.east_asian_width(ch) in "WF")
+    return wide + (len(text) - wide + 3) // 4
+
+
+class Conversation:
+    """跨轮次保存的对话记录
+    每次请求由 系统提示词 + 滚动摘要 + 最近若干轮 组成，总长度受token预算限制；
+    超出预算时把最早的一批对话折叠进摘要，窗口起点成批移动，前缀在两次折叠之间保持不变
+    """
+    MAX_CONTEXT_TOKENS = 3000  # 请求中历史部分（摘要+最近对话）的预算
+    SUMMARY_TOKENS = 400  # 摘要的目标长度
+    FOLD_RATIO = 0.5  # 折叠后窗口保留的比例
+    MESSAGE_OVERHEAD = 4  # 每条消息的格式开销（token）
+
+    def __init__(self, max_context_tokens=MAX_CONTEXT_TOKENS, summary_tokens=SUMMARY_TOKENS, summarizer=None):
+        """
+        :param summarizer: summarizer(旧摘要, 要折叠的消息列表, 目标token数) -> 新摘要，在后台线程调用；
+                           为 None 或失败时使用摘取式摘要
+        """
+        self.max_context_tokens = max_context_tokens
+        self.summary_tokens = summary_tokens
+        self.summarizer = summarizer
+        self.messages = []  # 全部消息 {"role", "content", "tokens"}
+        self.window_start = 0  # 尚未折叠进摘要的第一条消息
+        self.summary = ""
+        self.version = 0  # 每次增删消息加一，用于判断对话是否在某个时间点之后有变化
+        self._lock = threading.Lock()
+        self._summarizing = False
+
+    def __len__(self):
+        return len(self.messages)
+
+    def add(self, role, content):
+        """追加一条消息，token数只计算一次"""
+        if not content:
+            return
+        message = {"role": role, "content": content, "tokens": count_tokens(content) + self.MESSAGE_OVERHEAD}
+        with self._lock:
+            self.messages.append(message)
+            self.version += 1
+            fold = self._fold_if_needed()
+        if fold:
+            self._summarize(*fold)
+
+    def clear(self):
+        with self._lock:
+            self.messages = []
+            self.window_start = 0
+            self.summary = ""
+            self.version += 1
+
+    def window_tokens(self):
+        with self._lock:
+            return self._window_tokens()
+
+    def _window_tokens(self):
+        return sum(m["tokens"] for m in self.messages[self.window_start:]) + count_tokens(self.summary)
+
+    def build_messages(self, system_prompt):
+        """构造请求消息：系统提示词（含摘要）+ 窗口内的对话"""
+        with self._lock:
+            system = system_prompt or ""
+            if self.summary:
+                system = f"{system}\n\n[之前的对话摘要]\n{self.summary}".strip()
+            messages = [{"role": "system", "content": system}] if system else []
+            messages.extend({"role": m["role"], "content": m["content"]}
+                            for m in self.messages[self.window_start:])
+            return messages
+
+    def _fold_if_needed(self):
+        """窗口超出预算时把最早的消息移出窗口，调用时需持有锁
+        :return: (旧摘要, 被折叠的消息) 或 None
+        """
+        if self._window_tokens() <= self.max_context_tokens:
+            return None
+        target = self.max_context_tokens * self.FOLD_RATIO
+        end = self.window_start
+        last = len(self.messages) - 1  # 至少保留最新一条
+        tokens = self._window_tokens()
+        while end < last and tokens > target:
+            tokens -= self.messages[end]["tokens"]
+            end += 1
+        # 按整轮折叠，窗口总是从用户消息开始
+        while end < last and self.messages[end]["role"] != "user":
+            end += 1
+        if end == self.window_start:
+            return None
+        folded = self.messages[self.window_start:end]
+        previous = self.summary
+        self.window_start = end
+        # 先用摘取式摘要占位，保证下一次请求不超出预算
+        self.summary = self._extractive_summary(previous, folded)
+        return previous, folded
+
+    def _extractive_summary(self, previous, folded):
+        """截取每条消息的开头作为摘要，超出目标长度时丢弃最早的部分"""
+        lines = [line for line in previous.split("\n") if line] if previous else []
+        for m in folded:
+            speaker = "用户" if m["role"] == "user" else "助手"
+            content = " ".join(m["content"].split())
+            lines.append(f"{speaker}: {content[:60]}")
+        while len(lines) > 1 and count_tokens("\n".join(lines)) > self.summary_tokens:
+            lines.pop(0)
+        return "\n".join(lines)
+
+    def _summarize(self, previous, folded):
+        """在后台用 summarizer 生成新的摘要，完成后替换占位摘要"""
+        if self.summarizer is None or self._summarizing:
+            return
+        placeholder = self.summary
+        self._summarizing = True
+
+        def worker():
+            try:
+                summary = self.summarizer(previous, folded, self.summary_tokens)
+                if summary:
+                    with self._lock:
+                        # 期间又发生了折叠时保留新的占位摘要
+                        if self.summary == placeholder:
+                            self.summary = summary.strip()
+            except Exception as e:
+                print(f"生成对话摘要失败: {e}")
+            finally:
+                self._summarizing = False
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def save(self, path):
+        with self._lock:
+            data = {
+                "summary": self.summary,
+                "window_start": self.window_start,
+                "messages": [{"role": m["role"], "content": m["content"]} for m in self.messages],
+            }
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        """从文件恢复对话；文件不存在时保持为空"""
+        if not os.path.exists(path):
+            return
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        messages = [
+            {"role": m["role"], "content": m["content"],
+             "tokens": count_tokens(m["content"]) + self.MESSAGE_OVERHEAD}
+            for m in data.get("messages", []) if m.get("content")
+        ]
+        with self._lock:
+            self.messages = messages
+            self.summary = data.get("summary", "")
+            self.window_start = min(data.get("window_start", 0), len(messages))
+            self._fold_if_needed()
@@ -0,0 +1,14 @@
+# 开场模式下给小模型的附加指令：只说一个简短的开场短句，由主模型接着说完
+DRAFT_INSTRUCTION = ("现在只说回复开头的一个简短短句（几个字，如语气词或对问题的简短回应），"
+                     "语气与角色一致，不要回答具体内容，以逗号结尾。")
+DRAFT_MAX_TOKENS = 16
+
+
+def draft_messages(messages):
+    """开场模型的请求消息：在系统提示词后附加开场指令"""
+    draft = [dict(m) for m in messages]
+    if draft and draft[0]["role"] == "system":
+        draft[0]["content"] += "\n\n" + DRAFT_INSTRUCTION
+    else:
+        draft.insert(0, {"role": "system", "content": DRAFT_INSTRUCTION})
+    return draft
@@ -0,0 +1,212 @@
+import time
+import threading
+from collections import deque
+import numpy as np
+import pyaudio as pa
+
+
+def envelope(chunks, start, end, frame_s):
+    """[start, end) 时间段内的幅度包络（每 frame_s 秒一个 RMS 值）
+    :param chunks: [(第一个样本的时间, 采样率, int16 PCM)]，没有音频的时间为 0
+    """
+    n = max(1, int(round((end - start) / frame_s)))
+    energy = np.zeros(n)
+    counts = np.zeros(n)
+    for at, rate, data in chunks:
+        if not data or at >= end or at + len(data) / 2 / rate <= start:
+            continue
+        samples = np.frombuffer(data, dtype=np.int16).astype(np.float32)
+        t = at + np.arange(len(samples)) / rate
+        mask = (t >= start) & (t < end)
+        bins = np.minimum(((t[mask] - start) / frame_s).astype(int), n - 1)
+        energy += np.bincount(bins, samples[mask] ** 2, n)
+        counts += np.bincount(bins, None, n)
+    return np.sqrt(energy / np.maximum(counts, 1))
+
+
+class EchoReference:
+    """播放器实际送出的音频及其发声时间，作为判断回声的参考信号
+    push() 在播放回调中调用，只做追加，不加锁
+    """
+    MAX_CHUNKS = 512  # 约 10 秒（48kHz，每块 1024 帧）
+
+    def __init__(self):
+        self._chunks = deque(maxlen=self.MAX_CHUNKS)
+        self.audible_until = 0.0  # 已送出音频的发声结束时间（perf_counter）
+
+    def push(self, data, sound_at, sample_rate):
+        """:param sound_at: data 第一个样本发声的时间"""
+        self._chunks.append((sound_at, sample_rate, data))
+        self.audible_until = max(self.audible_until, sound_at + len(data) / 2 / sample_rate)
+
+    def playing(self, at, tail=0.0):
+        """at 时刻扬声器是否在发声（含 tail 秒的房间混响余量）"""
+        if at > self.audible_until + tail:
+            return False
+        # 按时间从新到旧查找，句子之间的空隙不算发声
+        for start, rate, data in reversed(list(self._chunks)):
+            end = start + len(data) / 2 / rate
+            if end + tail < at:
+                return False
+            if start - tail <= at:
+                return True
+        return False
+
+    def envelope(self, start, end, frame_s):
+        return envelope(list(self._chunks), start, end, frame_s)
+
+
+class EchoGate:
+    """半双工的回声门限：扬声器发声期间衰减麦克风输入，避免把自己的语音识别成用户输入
+    响度超过 barge_in_rms 且与播放的参考信号不相关时视为用户插话，放行到说完为止
+    """
+    FRAME_S = 0.01  # 包络的帧长
+    WINDOW_S = 0.5  # 计算相关性的麦克风窗口
+    MAX_DELAY_S = 0.3  # 扬声器到麦克风的最大延迟（含声卡延迟的估计误差）
+    LEAD_S = 0.05
+    ECHO_CORRELATION = 0.6  # 包络相关系数超过该值视为回声
+    TAIL_S = 0.3  # 播放结束后继续屏蔽的时间（混响）
+    BARGE_IN_HOLD_S = 1.0  # 插话后持续放行的时间，避免词间停顿被截断
+    SPEECH_RMS = 500  # 被屏蔽的音频中超过该响度的部分视为语音
+    MIN_SPEECH_S = 0.3  # 与识别器的 min_length_of_recording 一致，更短的不会被识别
+
+    def __init__(self, reference, barge_in_rms=2500, attenuation=0.0):
+        """
+        :param attenuation: 屏蔽期间的增益，0 为静音
+        """
+        self.reference = reference
+        self.barge_in_rms = barge_in_rms
+        self.attenuation = attenuation
+        self._mic = deque()  # 最近的麦克风音频 [(时间, 采样率, PCM)]
+        self._barge_in_until = 0.0
+        self._run_speech = 0.0  # 当前屏蔽段中语音的时长
+        self._gating = False
+        # 统计
+        self.gated_seconds = 0.0
+        self.avoided = 0  # 屏蔽掉的回声语音段数，即避免的识别次数
+        self.barge_ins = 0
+
+    def process(self, data, captured_at, sample_rate):
+        """处理一块麦克风输入，返回送入识别器的数据
+        :param captured_at: 第一个样本的采集时间（perf_counter）
+        """
+        duration = len(data) / 2 / sample_rate
+        end = captured_at + duration
+        self._mic.append((captured_at, sample_rate, data))
+        while self._mic and self._mic[0][0] < end - self.WINDOW_S - duration:
+            self._mic.popleft()
+
+        if end < self._barge_in_until:
+            if rms(data) >= self.barge_in_rms:
+                self._barge_in_until = end + self.BARGE_IN_HOLD_S
+            return data
+        if not self.reference.playing(captured_at, self.TAIL_S) and not self.reference.playing(end, self.TAIL_S):
+            self._end_run()
+            return data
+        level = rms(data)
+        if level >= self.barge_in_rms and self.correlation(end) < self.ECHO_CORRELATION:
+            self._end_run()
+            self.barge_ins += 1
+            self._barge_in_until = end + self.BARGE_IN_HOLD_S
+            return data
+
+        self._gating = True
+        self.gated_seconds += duration
+        if level >= self.SPEECH_RMS:
+            self._run_speech += duration
+        if self.attenuation <= 0:
+            return bytes(len(data))
+        samples = np.frombuffer(data, dtype=np.int16) * self.attenuation
+        return samples.astype(np.int16).tobytes()
+
+    def correlation(self, end):
+        """最近 WINDOW_S 秒麦克风包络与参考信号包络在各延迟下的最大相关系数"""
+        frames = int(round(self.WINDOW_S / self.FRAME_S))
+        mic = envelope(list(self._mic), end - self.WINDOW_S, end, self.FRAME_S)
+        lead = int(round(self.LEAD_S / self.FRAME_S))
+        ref = self.reference.envelope(end - self.WINDOW_S - self.MAX_DELAY_S, end + self.LEAD_S, self.FRAME_S)
+        if mic.std() == 0:
+            return 0.0
+        best = 0.0
+        # 参考信号向后移动 lag 帧后与麦克风对齐；lag 为负表示声卡延迟估计偏大
+        for lag in range(-lead, len(ref) - frames - lead + 1):
+            start = len(ref) - lead - frames - lag
+            segment = ref[start:start + frames]
+            if len(segment) < frames or segment.std() == 0:
+                continue
+            best = max(best, float(np.corrcoef(mic, segment)[0, 1]))
+        return best
+
+    def _end_run(self):
+        if self._gating and self._run_speech >= self.MIN_SPEECH_S:
+            self.avoided += 1
+        self._gating = False
+        self._run_speech = 0.0
+
+    def summary(self):
+        return (f"回声屏蔽: 避免识别 {self.avoided} 次, 屏蔽 {self.gated_seconds:.1f}s, "
+                f"插话放行 {self.barge_ins} 次")
+
+
+def rms(data):
+    samples = np.frombuffer(data, dtype=np.int16).astype(np.float32)
+    return float(np.sqrt(np.mean(samples * samples))) if len(samples) else 0.0
+
+
+class EchoGatedMicrophone:
+    """自行读取麦克风，经 EchoGate 处理后送入识别器（作为 STTThread 的 audio_source）"""
+    SAMPLE_RATE = 16000  # 识别器的采样率
+    CHUNK = 512
+
+    def __init__(self, device_index, gate):
+        self.device_index = device_index
+        self.gate = gate
+        self.running = False
+        self._thread = None
+
+    def start(self, recorder):
+        self.running = True
+        self._thread = threading.Thread(target=self._read, args=(recorder,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def utterance_done(self, text, vad_end=None):
+        pass
+
+    def _open(self, p):
+        kwargs = dict(format=pa.paInt16, channels=1, input=True, input_device_index=self.device_index)
+        try:
+            return p.open(rate=self.SAMPLE_RATE, frames_per_buffer=self.CHUNK, **kwargs), self.SAMPLE_RATE
+        except Exception:
+            # 设备不支持 16kHz 时使用默认采样率，由识别器转换
+            info = p.get_device_info_by_index(self.device_index) if self.device_index is not None \
+                else p.get_default_input_device_info()
+            rate = int(info["defaultSampleRate"])
+            chunk = self.CHUNK * rate // self.SAMPLE_RATE
+            return p.open(rate=rate, frames_per_buffer=chunk, **kwargs), rate
+
+    def _read(self, recorder):
+        p = pa.PyAudio()
+        stream = None
+        try:
+            stream, rate = self._open(p)
+            chunk = self.CHUNK * rate // self.SAMPLE_RATE
+            latency = stream.get_input_latency()
+            while self.running:
+                data = stream.read(chunk, exception_on_overflow=False)
+                # 这一块的第一个样本在读出前 (声卡延迟 + 块长) 采集
+                captured_at = time.perf_counter() - latency - chunk / rate
+                recorder.feed_audio(self.gate.process(data, captured_at, rate), rate)
+        except Exception as e:
+            if self.running:  # 关闭识别器时的错误不输出
+                print(f"读取麦克风失败: {e}")
+        finally:
+            if stream is not None:
+                stream.stop_stream()
+                stream.close()
+            p.terminate()
@@ -0,0 +1,117 @@
+import os
+import json
+import time
+import threading
+from datetime import datetime
+
+
+class TraceLog:
+    """把每轮对话的耗时记录追加写入 JSONL 文件（每行一轮）"""
+    PATH = os.path.join("logs", "turn_traces.jsonl")
+    _shared = None
+
+    @classmethod
+    def shared(cls):
+        if cls._shared is None:
+            cls._shared = cls()
+        return cls._shared
+
+    def __init__(self, path=PATH, enabled=True):
+        self.path = path
+        self.enabled = enabled
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        if not self.enabled:
+            return
+        line = json.dumps(record, ensure_ascii=False)
+        try:
+            with self._lock:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+        except Exception as e:
+            print(f"写入耗时记录失败: {e}")
+
+
+class TurnTrace:
+    """一轮对话各阶段的时间点，由 STT/LLM/TTS/播放各线程记录，结束时写入一行 JSONL
+    事件名：speech_end, stt_final, turn_start, llm_request, llm_first_token, segment,
+    draft_request, draft_first_token, draft_done（开场模式下小模型的请求、首token和开场短句）,
+    tts_request, tts_first_byte, tts_done, audio_first, audio_last, llm_done
+    """
+    _counter = 0
+    _counter_lock = threading.Lock()
+
+    def __init__(self, source="text", log=None):
+        """
+        :param source: "voice"（语音识别）或 "text"（手动输入）
+        """
+        with TurnTrace._counter_lock:
+            TurnTrace._counter += 1
+            self.turn = TurnTrace._counter
+        self.source = source
+        self.log = log or TraceLog.shared()
+        self.created = datetime.now()
+        self.events = []  # (事件名, perf_counter 时间, 附加字段)
+        self.tags = {"mode": "single"}  # 本轮的整体属性，写入记录顶层
+        self.finished = False
+        self._lock = threading.Lock()
+
+    def mark(self, event, at=None, **fields):
+        """记录一个时间点；at 为 time.perf_counter() 的值，默认为当前时间"""
+        with self._lock:
+            if not self.finished:
+                self.events.append((event, time.perf_counter() if at is None else at, fields))
+
+    def tag(self, **fields):
+        """设置本轮的整体属性（如 mode="draft"）"""
+        with self._lock:
+            self.tags.update(fields)
+
+    def absorb(self, other):
+        """并入另一条记录的事件（如识别线程记录的说话结束时间），被并入的记录不再写出"""
+        with other._lock:
+            events = list(other.events)
+            other.finished = True
+        with self._lock:
+            self.events.extend(events)
+            self.source = other.source
+
+    def first(self, event):
+        """某事件第一次发生的时间，没有发生时返回 None"""
+        with self._lock:
+            return next((at for name, at, _ in self.events if name == event), None)
+
+    def metrics(self):
+        """首token延迟、首音频延迟、说完话到开始发声的延迟（毫秒）"""
+        def span(start, end):
+            start, end = self.first(start), self.first(end)
+            return round((end - start) * 1000, 1) if start is not None and end is not None else None
+        # 开场模式下第一个发声的token来自开场模型
+        draft = self.tags.get("mode") == "draft"
+        return {
+            "ttft_ms": span("draft_request", "draft_first_token") if draft else span("llm_request", "llm_first_token"),
+            "ttfa_ms": span("turn_start", "audio_first"),
+            "eos_ms": span("speech_end", "audio_first"),
+        }
+
+    def finish(self, status="done"):
+        """结束本轮并写入记录（只写一次）"""
+        with self._lock:
+            if self.finished:
+                return
+            self.finished = True
+            events = sorted(self.events, key=lambda e: e[1])
+        origin = events[0][1] if events else 0.0
+        record = {
+            "turn": self.turn,
+            "time": self.created.isoformat(timespec="milliseconds"),
+            "source": self.source,
+            "status": status,
+            **self.tags,
+            "events": [dict({"event": name, "ms": round((at - origin) * 1000, 1)}, **fields)
+                       for name, at, fields in events],
+        }
+        record.update(self.metrics())
+        self.log.write(record)
@@ -0,0 +1,478 @@
+import os
+import json
+import time
+import socket
+import weakref
+import threading
+import httpx
+import httpcore
+from openai import OpenAI
+
+# 默认后端：本地 Ollama（原生接口）和 DeepSeek（OpenAI兼容接口）
+DEFAULT_BACKENDS = {
+    "default": "ollama",
+    "backends": [
+        {
+            "name": "ollama",
+            "base_url": "http://localhost:11434/v1/",
+            "api_key": "ollama",
+            "api": "ollama",
+            "keep_alive": "30m",
+            # 固定上下文长度：超出时 Ollama 会从开头截断，破坏可复用的前缀
+            "options": {"num_ctx": 8192},
+        },
+        {
+            "name": "deepseek",
+            "base_url": "https://api.deepseek.com/v1",
+            "api_key_env": "DEEPSEEK_API_KEY",
+            "models": ["deepseek-chat", "deepseek-reasoner"],
+        },
+    ],
+}
+
+
+def abort_response(response):
+    """立即断开一个仍在接收的HTTP响应（可在其他线程调用）
+    先 shutdown 套接字：阻塞在读取上的线程马上返回，服务端也会收到断开并停止生成
+    """
+    if response is None:
+        return
+    stream = response.extensions.get("network_stream")
+    sock = stream.get_extra_info("socket") if stream is not None else None
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass  # 连接已关闭
+    try:
+        response.close()
+    except Exception:
+        pass  # 读取线程可能正在使用该响应，连接已断开即可
+
+
+class TrackedStream(httpcore.NetworkStream):
+    """记录最近使用该连接的线程，使等待响应头的请求也可以被其他线程断开"""
+    def __init__(self, stream):
+        self._stream = stream
+        self.owner = None
+
+    def read(self, max_bytes, timeout=None):
+        self.owner = threading.get_ident()
+        return self._stream.read(max_bytes, timeout)
+
+    def write(self, buffer, timeout=None):
+        self.owner = threading.get_ident()
+        self._stream.write(buffer, timeout)
+
+    def close(self):
+        self._stream.close()
+
+    def start_tls(self, ssl_context, server_hostname=None, timeout=None):
+        self._stream = self._stream.start_tls(ssl_context, server_hostname, timeout)
+        return self
+
+    def get_extra_info(self, info):
+        return self._stream.get_extra_info(info)
+
+    def abort(self):
+        sock = self._stream.get_extra_info("socket")
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass  # 连接已关闭
+
+
+class AbortableNetworkBackend(httpcore.NetworkBackend):
+    """连接池的网络层：跟踪所有连接，abort(线程) 断开该线程正在使用的连接（包括尚未收到响应头的请求）"""
+    def __init__(self):
+        self._backend = httpcore.SyncBackend()
+        self._streams = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def _track(self, stream):
+        stream = TrackedStream(stream)
+        with self._lock:
+            self._streams.add(stream)
+        return stream
+
+    def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        return self._track(self._backend.connect_tcp(host, port, timeout, local_address, socket_options))
+
+    def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return self._track(self._backend.connect_unix_socket(path, timeout, socket_options))
+
+    def sleep(self, seconds):
+        self._backend.sleep(seconds)
+
+    def abort(self, thread_id):
+        with self._lock:
+            streams = [stream for stream in self._streams if stream.owner == thread_id]
+        for stream in streams:
+            stream.abort()
+
+
+class AbortableTransport(httpx.HTTPTransport):
+    """使用 AbortableNetworkBackend 的 HTTP 传输层（httpx 没有提供设置网络层的参数，这里替换其连接池）"""
+    def __init__(self, limits, network_backend):
+        super().__init__(limits=limits)
+        self._pool = httpcore.ConnectionPool(
+            ssl_context=httpx.create_ssl_context(),
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            network_backend=network_backend,
+        )
+
+
+class ChatStream:
+    """流式回复：逐段产出文本；结束后 stats 中为服务端返回的耗时统计
+    请求在迭代时由读取线程发出；close() 可在其他线程调用，用于打断：
+    断开读取线程正在使用的连接（包括仍在等待响应头的请求），迭代随即结束
+    """
+    def __init__(self, network=None):
+        self.stats = {}
+        self.closed = False
+        self.network = network  # AbortableNetworkBackend
+        self._thread = None  # 读取线程
+        self._done = False
+
+    def __iter__(self):
+        self._thread = threading.get_ident()
+        try:
+            yield from self._deltas()
+        except Exception:
+            if not self.closed:
+                raise
+            # 被 close() 断开导致的读取错误
+        finally:
+            self._done = True
+
+    def _deltas(self):
+        raise NotImplementedError
+
+    def close(self):
+        self.closed = True
+        # 读取结束后连接已归还连接池，可能正被其他请求使用，不再断开
+        if self.network is not None and self._thread is not None and not self._done:
+            self.network.abort(self._thread)
+
+
+class OpenAIChatStream(ChatStream):
+    """OpenAI兼容接口（/v1/chat/completions）的流式回复"""
+    def __init__(self, create, network=None):
+        """
+        :param create: 发出请求并返回流式响应的函数，在读取线程中调用
+        """
+        super().__init__(network)
+        self.create = create
+        self.response = None
+
+    def _deltas(self):
+        if self.closed:
+            return
+        self.response = self.create()
+        if self.closed:
+            # 等待响应头期间已被打断
+            abort_response(self.response.response)
+            return
+        for chunk in self.response:
+            if self.closed:
+                break
+            if not chunk.choices:
+                continue
+            content = chunk.choices[0].delta.content
+            if content:
+                yield content
+
+    def close(self):
+        super().close()
+        response = self.response
+        if response is not None:
+            abort_response(response.response)
+
+
+class OllamaChatStream(ChatStream):
+    """Ollama 原生接口（/api/chat）的流式回复，每行一个JSON"""
+    def __init__(self, http_client, url, payload, network=None):
+        super().__init__(network)
+        self.http_client = http_client
+        self.url = url
+        self.payload = payload
+        self.response = None
+
+    def _deltas(self):
+        if self.closed:
+            return
+        with self.http_client.stream("POST", self.url, json=self.payload) as response:
+            self.response = response
+            if self.closed:
+                # 建立连接期间已被打断
+                abort_response(response)
+                return
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if self.closed:
+                    break
+                if not line:
+                    continue
+                data = json.loads(line)
+                if data.get("error"):
+                    raise RuntimeError(data["error"])
+                content = data.get("message", {}).get("content")
+                if content:
+                    yield content
+                if data.get("done"):
+                    self.stats = ollama_stats(data)
+                    break
+
+    def close(self):
+        super().close()
+        abort_response(self.response)
+
+
+def ollama_stats(data):
+    """把 Ollama 返回的耗时（纳秒）换算为毫秒；prompt_eval 只计未命中缓存、需要重新预填充的token"""
+    stats = {
+        "prompt_eval_count": data.get("prompt_eval_count", 0),
+        "eval_count": data.get("eval_count", 0),
+    }
+    for key in ("load_duration", "prompt_eval_duration", "eval_duration", "total_duration"):
+        stats[key.replace("duration", "ms")] = data.get(key, 0) / 1e6
+    return stats
+
+
+class LLMBackend:
+    """一个LLM服务端点：持有带长连接池的 HTTP 客户端，各轮对话复用同一连接
+    api="openai" 使用 OpenAI 兼容接口；api="ollama" 使用 Ollama 原生接口，
+    通过 keep_alive 让模型常驻，并在各轮之间保持相同的上下文长度，使提示词缓存可以命中
+    """
+    POOL_SIZE = 4
+    KEEPALIVE_SECONDS = 300  # 空闲连接保留时间，覆盖对话之间的停顿
+    CONNECT_TIMEOUT = 10.0
+    READ_TIMEOUT = 120.0
+
+    def __init__(self, name, base_url, api_key=None, api_key_env=None, models=None, pool_size=POOL_SIZE,
+                 api="openai", keep_alive=None, options=None):
+        """
+        :param api_key_env: 从该环境变量读取密钥（优先于 api_key）
+        :param models: 由该后端提供的模型名列表；为空表示只作为默认后端使用
+        :param api: "openai" 或 "ollama"
+        :param keep_alive: Ollama 模型在空闲后保留在内存中的时间（如 "30m"，-1 表示一直保留）
+        :param options: Ollama 模型参数（如 {"num_ctx": 8192}），每轮保持一致以免模型重新加载
+        """
+        self.name = name
+        self.base_url = base_url
+        self.api_key = api_key
+        self.api_key_env = api_key_env
+        self.models = list(models or [])
+        self.pool_size = pool_size
+        self.api = api
+        self.keep_alive = keep_alive
+        self.options = dict(options or {})
+        # 原生接口与 /v1 兼容接口在同一服务地址下
+        root = base_url.rstrip("/")
+        self.native_url = root[:-len("/v1")] if root.endswith("/v1") else root
+        key = os.getenv(api_key_env) if api_key_env else None
+        self.network = AbortableNetworkBackend()
+        limits = httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+            keepalive_expiry=self.KEEPALIVE_SECONDS,
+        )
+        self.http_client = httpx.Client(
+            transport=AbortableTransport(limits, self.network),
+            timeout=httpx.Timeout(self.READ_TIMEOUT, connect=self.CONNECT_TIMEOUT),
+        )
+        self.client = OpenAI(base_url=base_url, api_key=key or api_key or "none", http_client=self.http_client)
+        # 流式请求不自动重试：被打断断开的连接不应重新发出请求
+        self.stream_client = self.client.with_options(max_retries=0)
+        self.last_used = 0.0
+        self._warming = False
+
+    def config(self):
+        """可写入 settings.json 的配置"""
+        config = {"name": self.name, "base_url": self.base_url}
+        if self.api_key_env:
+            config["api_key_env"] = self.api_key_env
+        elif self.api_key:
+            config["api_key"] = self.api_key
+        if self.models:
+            config["models"] = self.models
+        if self.pool_size != self.POOL_SIZE:
+            config["pool_size"] = self.pool_size
+        if self.api != "openai":
+            config["api"] = self.api
+        if self.keep_alive is not None:
+            config["keep_alive"] = self.keep_alive
+        if self.options:
+            config["options"] = self.options
+        return config
+
+    def serves(self, model):
+        return model in self.models
+
+    def chat_stream(self, model, messages, **kwargs):
+        """流式对话请求，返回 ChatStream；请求在开始迭代时发出"""
+        self.last_used = time.time()
+        if self.api == "ollama":
+            return OllamaChatStream(self.http_client, f"{self.native_url}/api/chat",
+                                    self._ollama_payload(model, messages, True, kwargs), self.network)
+        return OpenAIChatStream(lambda: self.stream_client.chat.completions.create(
+            model=model, messages=messages, stream=True, **kwargs), self.network)
+
+    def complete(self, model, messages, **kwargs):
+        """非流式对话请求，返回回复文本"""
+        self.last_used = time.time()
+        if self.api == "ollama":
+            response = self.http_client.post(f"{self.native_url}/api/chat",
+                                             json=self._ollama_payload(model, messages, False, kwargs))
+            response.raise_for_status()
+            return response.json().get("message", {}).get("content", "")
+        response = self.client.chat.completions.create(model=model, messages=messages, **kwargs)
+        return response.choices[0].message.content
+
+    def _ollama_payload(self, model, messages, stream, kwargs):
+        """原生接口请求体；options 只在本次请求有额外参数时才复制，保证各轮一致"""
+        options = self.options
+        if "max_tokens" in kwargs or "temperature" in kwargs:
+            options = dict(options)
+            if "max_tokens" in kwargs:
+                options["num_predict"] = kwargs["max_tokens"]
+            if "temperature" in kwargs:
+                options["temperature"] = kwargs["temperature"]
+        payload = {"model": model, "messages": messages, "stream": stream}
+        if options:
+            payload["options"] = options
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        return payload
+
+    @property
+    def continues_assistant_prefix(self):
+        """最后一条 assistant 消息是否作为回复开头被续写（Ollama 原生接口）"""
+        return self.api == "ollama"
+
+    @property
+    def manages_residency(self):
+        """是否可以控制模型的加载和卸载（仅 Ollama 原生模式）"""
+        return self.api == "ollama"
+
+    def load_model(self, model, keep_alive=None):
+        """加载模型（已在内存中时只刷新保留时间），返回耗时（毫秒）"""
+        start = time.perf_counter()
+        # 空消息的请求只加载模型，不生成内容
+        payload = {"model": model, "messages": []}
+        keep_alive = self.keep_alive if keep_alive is None else keep_alive
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+        if self.options:
+            payload["options"] = self.options
+        self.http_client.post(f"{self.native_url}/api/chat", json=payload).raise_for_status()
+        return (time.perf_counter() - start) * 1000
+
+    def unload_model(self, model):
+        """立即从内存中卸载模型"""
+        self.load_model(model, keep_alive=0)
+
+    def loaded_models(self):
+        """当前在内存中的模型名"""
+        response = self.http_client.get(f"{self.native_url}/api/ps")
+        response.raise_for_status()
+        return [m["name"] for m in response.json().get("models", [])]
+
+    def warm_up(self, model=None):
+        """在后台建立连接，下一轮对话直接使用已打开的连接
+        Ollama 原生模式下同时把指定模型加载进内存
+        """
+        if self._warming:
+            return
+
+        def worker():
+            start = time.perf_counter()
+            try:
+                if self.manages_residency and model:
+                    self.load_model(model)
+                elif self.manages_residency:
+                    self.http_client.get(f"{self.native_url}/api/version").raise_for_status()
+                else:
+                    self.client.models.list()
+                print(f"LLM后端 {self.name} 连接已预热: {(time.perf_counter() - start) * 1000:.0f}ms")
+            except Exception as e:
+                print(f"预热LLM后端 {self.name} 失败: {e}")
+            finally:
+                self._warming = False
+
+        self._warming = True
+        threading.Thread(target=worker, daemon=True).start()
+
+    def close(self):
+        self.http_client.close()
+
+
+class LLMBackendRegistry:
+    """进程内共享的LLM后端注册表：按模型名选择后端"""
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls):
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(DEFAULT_BACKENDS)
+            return cls._shared
+
+    def __init__(self, settings=None):
+        self._lock = threading.Lock()
+        self.backends = {}
+        self.default = None
+        self.configure(settings or DEFAULT_BACKENDS)
+
+    def configure(self, settings):
+        """按配置创建后端；配置未变化的后端保留原有连接池"""
+        with self._lock:
+            old = self.backends
+            backends = {}
+            for config in settings.get("backends", []):
+                config = dict(config)
+                name = config.pop("name")
+                existing = old.get(name)
+                if existing is not None and existing.config() == dict(config, name=name):
+                    backends[name] = existing
+                else:
+                    backends[name] = LLMBackend(name, **config)
+            self.backends = backends
+            self.default = settings.get("default") or next(iter(backends), None)
+            stale = [b for name, b in old.items() if backends.get(name) is not b]
+        for backend in stale:
+            backend.close()
+
+    def settings(self):
+        """可写入 settings.json 的配置"""
+        return {
+            "default": self.default,
+            "backends": [backend.config() for backend in self.backends.values()],
+        }
+
+    def backend_for(self, model):
+        """返回提供该模型的后端，没有声明该模型的后端时使用默认后端"""
+        backends = self.backends
+        for backend in backends.values():
+            if backend.serves(model):
+                return backend
+        backend = backends.get(self.default)
+        if backend is None:
+            raise ValueError(f"没有可用于模型 {model} 的LLM后端")
+        return backend
+
+    def model_names(self):
+        """各后端声明的模型名"""
+        return [model for backend in self.backends.values() for model in backend.models]
+
+    def warm_up(self, model=None):
+        """预热指定模型所在的后端；不指定时预热所有后端"""
+        if model:
+            self.backend_for(model).warm_up(model)
+        else:
+            for backend in list(self.backends.values()):
+                backend.warm_up()
@@ -4,6 +4,7 @@ from PyQt6.QtWidgets import QApplication
 
 from Live2DWindow import Live2DWindow
 from ControlPanel import ControlPanel
+from TTS import AudioPlayer
 
 def main():
     app = QApplication(sys.argv)
@@ -28,6 +29,10 @@ def main():
         # 确保在程序退出时清理资源
         if 'live2d_window' in locals():
             live2d_window.close()
+        if 'control_panel' in locals():
+            control_panel.model_residency.stop()
+        # 关闭各轮对话共享的音频输出设备
+        AudioPlayer.shutdown_all()
 
 if __name__ == '__main__':
     main()
@@ -35,13 +35,12 @@ class MicLipSync:
         # 从音频数据计算RMS值
         try:
             if self.tts_player.is_playing:
-                with self.tts_player.cache_lock:
-                    if self.tts_player.audio_cache:
-                        audio_data = self.tts_player.audio_cache[0]  # 只读取不移除
-                        audio_array = np.frombuffer(audio_data, dtype=np.int16)
-                        rms = np.sqrt(np.mean(np.square(audio_array.astype(np.float32) / 32768.0)))
-                        self.current_rms = min(1.0, rms * 2)  # 可以调整系数来改变灵敏度
-                        return self.current_rms
+                audio_data = self.tts_player.buffer.peek(self.tts_player.period_bytes)  # 只读取不移除
+                if audio_data:
+                    audio_array = np.frombuffer(audio_data, dtype=np.int16)
+                    rms = np.sqrt(np.mean(np.square(audio_array.astype(np.float32) / 32768.0)))
+                    self.current_rms = min(1.0, rms * 2)  # 可以调整系数来改变灵敏度
+                    return self.current_rms
         except Exception as e:
             print(f"计算RMS值时出错: {e}")
             
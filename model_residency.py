@@ -0,0 +1,159 @@
+import time
+import threading
+from PyQt6.QtCore import QThread, pyqtSignal
+from llm_backends import LLMBackendRegistry
+
+
+class ModelResidencyScheduler(QThread):
+    """后台管理对话模型（及开场模型）的驻留：选中模型时预先加载，使用期间定期续期，空闲超时后卸载
+    远程（OpenAI兼容）后端无法控制模型加载，只保持连接可用
+    """
+    status_changed = pyqtSignal(str)
+
+    RENEW_INTERVAL = 240.0  # 续期间隔（秒），小于后端的 keep_alive
+    IDLE_UNLOAD = 1800.0  # 无操作超过该时间（秒）后卸载模型
+    CHECK_INTERVAL = 5.0
+    RETRY_INTERVAL = 30.0  # 加载失败后的重试间隔
+    LOADED_MS = 500.0  # 耗时超过该值视为发生了实际加载（而不是已在内存中）
+
+    def __init__(self, idle_unload=IDLE_UNLOAD, renew_interval=RENEW_INTERVAL):
+        super().__init__()
+        self.idle_unload = idle_unload
+        self.renew_interval = renew_interval
+        self.model = ""  # 选中的模型
+        self.draft_model = ""  # 开场模型，与对话模型一起保持驻留
+        self.loaded_model = ""  # 当前由本调度器保持驻留的模型
+        self.loaded_backend = None
+        self.loaded_draft = ""
+        self.draft_failure = 0.0
+        self.last_activity = time.time()
+        self.last_renew = 0.0
+        self.last_failure = 0.0
+        self.load_ms = None  # 最近一次实际加载的耗时
+        self.running = True
+        self._wake = threading.Event()
+
+    def select_model(self, model, draft_model=None):
+        """切换对话模型（和开场模型）：立即在后台加载"""
+        self.model = model or ""
+        self.draft_model = draft_model or ""
+        self.last_failure = 0.0
+        self.draft_failure = 0.0
+        self.touch()
+
+    def touch(self):
+        """记录一次用户操作；模型因空闲被卸载时重新加载"""
+        self.last_activity = time.time()
+        if self.loaded_model != self.model or self.loaded_draft != self.draft_model:
+            self._wake.set()
+
+    def stop(self):
+        self.running = False
+        self._wake.set()
+        self.wait()
+
+    def run(self):
+        while self.running:
+            try:
+                self._step()
+            except Exception as e:
+                print(f"模型驻留调度出错: {e}")
+            self._wake.wait(self.CHECK_INTERVAL)
+            self._wake.clear()
+
+    def _step(self):
+        now = time.time()
+        model = self.model
+        idle = now - self.last_activity >= self.idle_unload
+        # 切换了模型或长时间空闲：释放之前保持驻留的模型
+        if self.loaded_model and (self.loaded_model != model or idle):
+            self._unload(idle)
+        self._update_draft(model, idle)
+        if not model or idle:
+            return
+        if self.loaded_model == model and now - self.last_renew < self.renew_interval:
+            return
+        if self.loaded_model != model and now - self.last_failure < self.RETRY_INTERVAL:
+            return
+        try:
+            backend = LLMBackendRegistry.shared().backend_for(model)
+        except ValueError as e:
+            self.status_changed.emit(str(e))
+            self.last_failure = now
+            return
+        renew = self.loaded_model == model
+        try:
+            if backend.manages_residency:
+                if not renew:
+                    self.status_changed.emit(f"正在加载 {model}...")
+                elapsed = backend.load_model(model)
+            else:
+                backend.warm_up()
+                elapsed = None
+        except Exception as e:
+            print(f"加载模型 {model} 失败: {e}")
+            self.status_changed.emit(f"加载失败: {model}")
+            self.loaded_model = ""
+            self.last_failure = now
+            return
+        if model != self.model:
+            return  # 加载期间切换了模型，下一轮处理
+        self.loaded_model = model
+        self.loaded_backend = backend
+        self.last_renew = time.time()
+        if elapsed is None:
+            self.status_changed.emit(f"{model}: 远程后端")
+            return
+        if not renew or elapsed >= self.LOADED_MS:
+            # 首次加载，或续期时发现模型已被服务端卸载
+            self.load_ms = elapsed
+            print(f"模型 {model} 已加载: {elapsed:.0f}ms")
+        loaded = f"（加载 {self.load_ms:.0f}ms）" if self.load_ms is not None else ""
+        self.status_changed.emit(f"{model}: 已驻留{loaded}")
+
+    def _update_draft(self, model, idle):
+        """开场模型随对话模型一起加载、续期和卸载；失败时只打印，不影响对话模型"""
+        draft = "" if idle or not model else self.draft_model
+        if draft == model:
+            draft = ""
+        loaded = self.loaded_draft
+        if loaded and loaded != draft:
+            self.loaded_draft = ""
+            try:
+                backend = LLMBackendRegistry.shared().backend_for(loaded)
+                if backend.manages_residency:
+                    backend.unload_model(loaded)
+                    print(f"开场模型 {loaded} 已卸载")
+            except Exception as e:
+                print(f"卸载开场模型 {loaded} 失败: {e}")
+        # 与对话模型同步续期：对话模型需要续期（或尚未加载）时一并处理
+        now = time.time()
+        if not draft or (loaded == draft and now - self.last_renew < self.renew_interval):
+            return
+        if loaded != draft and now - self.draft_failure < self.RETRY_INTERVAL:
+            return
+        try:
+            backend = LLMBackendRegistry.shared().backend_for(draft)
+            if backend.manages_residency:
+                elapsed = backend.load_model(draft)
+                if loaded != draft:
+                    print(f"开场模型 {draft} 已加载: {elapsed:.0f}ms")
+            self.loaded_draft = draft
+        except Exception as e:
+            print(f"加载开场模型 {draft} 失败: {e}")
+            self.draft_failure = now
+
+    def _unload(self, idle):
+        model, backend = self.loaded_model, self.loaded_backend
+        self.loaded_model = ""
+        self.loaded_backend = None
+        self.load_ms = None
+        if backend is None or not backend.manages_residency:
+            return
+        try:
+            backend.unload_model(model)
+            print(f"模型 {model} 已卸载")
+        except Exception as e:
+            print(f"卸载模型 {model} 失败: {e}")
+        if idle:
+            self.status_changed.emit(f"{model}: 空闲已卸载")
@@ -0,0 +1,165 @@
+import re
+
+# 句末标点：遇到即可断句
+STRONG_BREAKS = set("。！？!?；;…\n")
+# 句中停顿：只在句子已足够长（或首句）时断句
+WEAK_BREAKS = set("，、,：:")
+# 断句标点之后应归入当前句的右引号和右括号
+CLOSERS = set("\"'”’」』）)】》]")
+# 以 "." 结尾但不表示句末的英文缩写（小写比较）
+ABBREVIATIONS = {
+    "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "etc", "e.g", "i.e",
+    "no", "fig", "approx", "dept", "inc", "ltd", "co", "jan", "feb", "mar", "apr",
+    "jun", "jul", "aug", "sep", "sept", "oct", "nov", "dec", "u.s", "a.m", "p.m",
+}
+_WORD_BEFORE_DOT = re.compile(r"([A-Za-z][A-Za-z.]*)$")
+
+
+def _is_cjk(ch):
+    return "　" <= ch <= "鿿" or "豈" <= ch <= "﫿" or "＀" <= ch <= "￯"
+
+
+class SentenceSegmenter:
+    """增量断句：把LLM逐token输出的文本切成适合TTS合成的片段
+    首句较短以尽快开始发声，之后的句子较长以减少请求次数；每个字符只扫描一次
+    """
+    FIRST_MIN_LEN = 3  # 首句最短长度，任意停顿处即可断开
+    FIRST_MAX_LEN = 30  # 首句超过该长度时在空白处断开
+    MIN_LEN = 10  # 之后的句子在句末标点处断开的最短长度
+    MAX_LEN = 80  # 超过该长度时强制断开
+
+    def __init__(self, first_min_len=FIRST_MIN_LEN, min_len=MIN_LEN, max_len=MAX_LEN,
+                 first_max_len=FIRST_MAX_LEN, first_prefix=""):
+        """
+        :param first_prefix: 加在首句前的文本（部分TTS后端需要，如GPT-SoVITS的"."）
+        """
+        self.first_min_len = first_min_len
+        self.min_len = min_len
+        self.max_len = max(max_len, min_len)
+        self.first_max_len = max(first_max_len, first_min_len)
+        self.first_prefix = first_prefix
+        self._buf = ""
+        self._scan = 0  # 下一个待检查的字符位置
+        self.chunks_emitted = 0
+
+    def reset(self):
+        self._buf = ""
+        self._scan = 0
+        self.chunks_emitted = 0
+
+    def mark_first_emitted(self):
+        """首句已由外部送出（如开场模型的短句）：之后的片段按后续句切分，不再加 first_prefix"""
+        self.chunks_emitted = max(self.chunks_emitted, 1)
+
+    def feed(self, text):
+        """送入新的文本，返回已经可以合成的片段列表"""
+        if not text:
+            return []
+        self._buf += text
+        chunks = []
+        while True:
+            end = self._find_break(final=False)
+            if end is None:
+                break
+            self._emit(end, chunks)
+        return chunks
+
+    def flush(self):
+        """输入结束，返回剩余的所有片段"""
+        chunks = []
+        while True:
+            end = self._find_break(final=True)
+            if end is None:
+                break
+            self._emit(end, chunks)
+        if self._buf.strip():
+            self._emit(len(self._buf), chunks)
+        self._buf = ""
+        self._scan = 0
+        return chunks
+
+    def _emit(self, end, chunks):
+        chunk = self._buf[:end].strip()
+        self._buf = self._buf[end:]
+        self._scan = 0
+        if not chunk:
+            return
+        if self.chunks_emitted == 0 and self.first_prefix:
+            chunk = self.first_prefix + chunk
+        self.chunks_emitted += 1
+        chunks.append(chunk)
+
+    def _find_break(self, final):
+        """从上次停下的位置继续扫描，返回断句位置（不含）；需要更多输入才能判断时返回 None"""
+        buf = self._buf
+        n = len(buf)
+        first = self.chunks_emitted == 0
+        min_len = self.first_min_len if first else self.min_len
+        weak_len = self.first_min_len if first else max(self.min_len, self.max_len // 2)
+        max_len = self.first_max_len if first else self.max_len
+        i = self._scan
+        while i < n:
+            ch = buf[i]
+            if ch in STRONG_BREAKS or ch == "." or ch in WEAK_BREAKS:
+                end = self._boundary_end(i, final)
+                if end is None:
+                    # 需要看到后面的字符（小数点、省略号、引号）才能判断
+                    self._scan = i
+                    return None
+                if end:
+                    strong = ch not in WEAK_BREAKS
+                    length = len(buf[:end].strip())
+                    if length >= (min_len if strong else weak_len):
+                        return end
+                    i = end
+                    continue
+            if i + 1 >= max_len:
+                self._scan = i + 1
+                return self._force_break(i + 1)
+            i += 1
+        self._scan = n
+        return None
+
+    def _boundary_end(self, i, final):
+        """判断位置 i 的标点是否构成断句点
+        :return: 断句后的位置（已包含连续的标点和右引号）；0 表示不是断句点；None 表示需要更多输入
+        """
+        buf = self._buf
+        n = len(buf)
+        ch = buf[i]
+        prev = buf[i - 1] if i else ""
+        if ch in ",，:" and prev.isdigit():
+            # 千位分隔符和时间（1,000 / 12:30）
+            if i + 1 >= n:
+                return len(buf) if final else None
+            if buf[i + 1].isdigit():
+                return 0
+        if ch == ".":
+            if i + 1 >= n and not final:
+                return None
+            nxt = buf[i + 1] if i + 1 < n else ""
+            if prev.isdigit() and nxt.isdigit():
+                return 0  # 小数
+            if nxt and nxt != "." and not nxt.isspace() and nxt not in CLOSERS and not _is_cjk(nxt):
+                return 0  # 网址、文件名等
+            if nxt != ".":
+                match = _WORD_BEFORE_DOT.search(buf, max(0, i - 12), i)
+                if match:
+                    word = match.group(1).lower()
+                    if word in ABBREVIATIONS or (len(word) == 1 and prev.isupper()):
+                        return 0  # 缩写或姓名首字母
+        # 吸收连续的标点（省略号、"？！"等）和右引号
+        j = i + 1
+        while j < n and (buf[j] in STRONG_BREAKS or buf[j] == "." or buf[j] in CLOSERS):
+            j += 1
+        if j >= n and not final:
+            return None
+        return j
+
+    def _force_break(self, limit):
+        """超长时在 limit 之前最后一个停顿或空白处断开，都没有则直接截断"""
+        buf = self._buf
+        for k in range(limit - 1, max(0, limit // 2), -1):
+            if buf[k] in WEAK_BREAKS or buf[k].isspace():
+                return k + 1
+        return limit
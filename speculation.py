@@ -0,0 +1,88 @@
+import re
+import threading
+
+# 比较识别结果时忽略的标点和空白
+_IGNORED = re.compile(r"[\s\.,!?;:，。！？；：、…\"'“”‘’（）()]+")
+
+
+def normalize_transcript(text):
+    """用于比较中间结果和最终结果的文本：去掉标点和空白，统一小写"""
+    return _IGNORED.sub("", text or "").lower()
+
+
+class PartialStabilityDetector:
+    """实时识别的中间结果在 stable_ms 内没有变化时回调 on_stable(text)
+    每个稳定文本只回调一次；reset() 在一句话识别结束后调用
+    """
+    MIN_CHARS = 2  # 太短的中间结果不推测
+
+    def __init__(self, stable_ms, on_stable):
+        self.stable_ms = stable_ms
+        self.on_stable = on_stable
+        self._lock = threading.Lock()
+        self._timer = None
+        self._text = ""
+        self._version = 0
+        self._fired = ""
+
+    def update(self, text):
+        """收到新的中间结果（在识别器的回调线程中调用）"""
+        key = normalize_transcript(text)
+        with self._lock:
+            if key == normalize_transcript(self._text):
+                return
+            self._text = text
+            self._version += 1
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if len(key) < self.MIN_CHARS or key == self._fired:
+                return
+            self._timer = threading.Timer(self.stable_ms / 1000, self._fire, args=(self._version,))
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _fire(self, version):
+        with self._lock:
+            if version != self._version:
+                return
+            text = self._text
+            self._fired = normalize_transcript(text)
+            self._timer = None
+        self.on_stable(text)
+
+    def reset(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._text = ""
+            self._fired = ""
+            self._version += 1
+
+
+class SpeculationStats:
+    """推测启动的命中率和节省的时间"""
+    def __init__(self):
+        self.started = 0
+        self.hits = 0
+        self.misses = 0
+        self.saved_ms = []
+
+    def record_start(self):
+        self.started += 1
+
+    def record_hit(self, saved_ms):
+        self.hits += 1
+        self.saved_ms.append(saved_ms)
+
+    def record_miss(self):
+        self.misses += 1
+
+    def summary(self):
+        decided = self.hits + self.misses
+        rate = self.hits / decided * 100 if decided else 0.0
+        saved = sorted(self.saved_ms)
+        p50 = saved[len(saved) // 2] if saved else 0.0
+        return (f"推测启动 {self.started} 次, 命中 {self.hits}/{decided} ({rate:.0f}%), "
+                f"节省 p50 {p50:.0f}ms, 累计 {sum(saved) / 1000:.1f}s")
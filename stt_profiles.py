@@ -0,0 +1,84 @@
+import os
+
+# 识别器的公共参数：VAD 灵敏度、断句静音时长、实时识别
+RECORDER_SETTINGS = {
+    "silero_sensitivity": 0.2,
+    "webrtc_sensitivity": 3,
+    "post_speech_silence_duration": 0.4,
+    "min_length_of_recording": 0.3,
+    "min_gap_between_recordings": 1,
+    "enable_realtime_transcription": True,
+}
+
+# 有 GPU 时的识别参数（原先写死在 loadSTTModel 中的设置）
+GPU_PROFILE = {
+    "device": "cuda",
+    "realtime_model_type": "tiny",
+    "realtime_processing_pause": 0.05,
+}
+
+# 纯 CPU 的识别参数：int8 量化，贪心解码；实时模型用最小的模型并降低刷新频率，
+# 避免实时识别占满 CPU 拖慢说话结束后的最终识别
+CPU_PROFILE = {
+    "device": "cpu",
+    "compute_type": "int8",
+    "beam_size": 1,
+    "beam_size_realtime": 1,
+    "realtime_model_type": "tiny",
+    "realtime_processing_pause": 0.2,
+    "silero_use_onnx": True,
+}
+
+# CPU 上最终识别明显慢于实时的模型
+SLOW_ON_CPU = ("medium", "large")
+
+DEVICES = ["auto", "cuda", "cpu"]
+
+
+def cuda_available():
+    """是否有可用的 CUDA 设备；依次尝试 torch 和 ctranslate2，都没有时视为没有 GPU"""
+    try:
+        import torch
+        return torch.cuda.is_available()
+    except Exception:
+        pass
+    try:
+        import ctranslate2
+        return ctranslate2.get_cuda_device_count() > 0
+    except Exception:
+        return False
+
+
+def cpu_threads():
+    """识别使用的线程数：物理核心数，留一个核心给录音和界面"""
+    try:
+        import psutil
+        cores = psutil.cpu_count(logical=False)
+    except Exception:
+        cores = None
+    if not cores:
+        # 没有 psutil 时按开启超线程估计
+        cores = max(1, (os.cpu_count() or 2) // 2)
+    return max(1, cores - 1)
+
+
+def resolve_device(device="auto"):
+    if device == "auto":
+        return "cuda" if cuda_available() else "cpu"
+    return device
+
+
+def stt_profile(device="auto", language="", model=""):
+    """返回与 device 对应的 AudioToTextRecorder 参数
+    CPU 配置额外带有 cpu_threads，由 STTThread 在创建识别器前设置为 OMP_NUM_THREADS
+    """
+    device = resolve_device(device)
+    if device != "cpu":
+        return dict(GPU_PROFILE)
+    profile = dict(CPU_PROFILE, cpu_threads=cpu_threads())
+    if language == "en":
+        profile["realtime_model_type"] = "tiny.en"
+    if model.startswith(SLOW_ON_CPU):
+        print(f"提示: 在 CPU 上使用 {model} 模型识别较慢，建议使用 small 或更小的模型"
+              f"（可用 tools/bench_stt_cpu.py 测试）")
+    return profile
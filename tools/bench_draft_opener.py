@@ -0,0 +1,136 @@
+"""开场模型对比：同一组问题分别用单模型和“开场模型 + 对话模型”回答，比较首句可合成时间
+
+单模型：对话模型首句（SentenceSegmenter 断出的第一个片段）的时间
+开场模式：开场模型给出开场短句的时间，以及对话模型接着续写的首token时间
+（续写首token晚于开场短句的播放时长时，开场短句之后会出现停顿）
+
+后端配置与程序相同，读取 settings.json 中的 llm_backends（没有时使用默认后端）。
+
+用法：
+    python tools/bench_draft_opener.py --model qwen2.5:14b --draft qwen2.5:0.5b [--rounds 3] [--prompts prompts.txt]
+        [--settings settings.json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from segmenter import SentenceSegmenter
+from llm_backends import LLMBackendRegistry
+from draft_opener import DRAFT_MAX_TOKENS, draft_messages
+
+DEFAULT_PROMPTS = [
+    "你好呀，今天过得怎么样？",
+    "给我讲一个关于猫的冷笑话。",
+    "你觉得AI以后会有自己的想法吗？",
+    "推荐一部适合周末看的电影。",
+    "我今天有点累，能安慰我一下吗？",
+    "用一句话介绍一下你自己。",
+]
+SYSTEM_PROMPT = "你是AI虚拟主播艾芙，性格活泼幽默。回答尽量简短。"
+
+
+def first_chunk(backend, model, messages, **kwargs):
+    """流式请求直到断出第一个片段，返回 (首token秒, 首片段秒, 首片段)"""
+    start = time.perf_counter()
+    stream = backend.chat_stream(model, messages, **kwargs)
+    segmenter = SentenceSegmenter()
+    first_token = None
+    chunk = ""
+    try:
+        for content in stream:
+            if first_token is None:
+                first_token = time.perf_counter() - start
+            chunks = segmenter.feed(content)
+            if chunks:
+                chunk = chunks[0]
+                break
+        else:
+            chunk = "".join(segmenter.flush())
+    finally:
+        stream.close()
+    return first_token, time.perf_counter() - start, chunk
+
+
+def run_single(registry, model, prompt):
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": prompt}]
+    _, first_chunk_s, chunk = first_chunk(registry.backend_for(model), model, messages)
+    return {"first_chunk": first_chunk_s, "text": chunk}
+
+
+def run_draft(registry, model, draft, prompt, max_tokens):
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": prompt}]
+    start = time.perf_counter()
+    _, opener_s, opener = first_chunk(registry.backend_for(draft), draft, draft_messages(messages),
+                                      max_tokens=max_tokens)
+    continued = messages + [{"role": "assistant", "content": opener}]
+    main_token_s, _, chunk = first_chunk(registry.backend_for(model), model, continued)
+    return {"first_chunk": opener_s, "main_first_token": opener_s + (main_token_s or 0.0),
+            "total": time.perf_counter() - start, "text": opener + " | " + chunk}
+
+
+def load_registry(path):
+    """按 settings.json 中的 llm_backends 配置后端，与 ControlPanel.loadsettings 一致"""
+    registry = LLMBackendRegistry.shared()
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            llm_backends = json.load(f).get("llm_backends")
+        if llm_backends:
+            registry.configure(llm_backends)
+    else:
+        print(f"找不到 {path}，使用默认后端")
+    return registry
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", required=True, help="对话模型")
+    parser.add_argument("--draft", required=True, help="开场模型")
+    parser.add_argument("--prompts", help="问题文件，每行一个")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--max-tokens", type=int, default=DRAFT_MAX_TOKENS)
+    parser.add_argument("--settings", default=os.path.join(ROOT, "settings.json"), help="程序的配置文件")
+    args = parser.parse_args()
+
+    prompts = DEFAULT_PROMPTS
+    if args.prompts:
+        with open(args.prompts, encoding="utf-8") as f:
+            prompts = [line.strip() for line in f if line.strip()]
+    registry = load_registry(args.settings)
+    if not registry.backend_for(args.model).continues_assistant_prefix:
+        sys.exit(f"模型 {args.model} 的后端不支持续写（需要 api=ollama）")
+    # 预先加载两个模型，避免把加载时间计入第一轮
+    for model in (args.model, args.draft):
+        backend = registry.backend_for(model)
+        if backend.manages_residency:
+            print(f"加载 {model}: {backend.load_model(model):.0f}ms")
+
+    single, draft = [], []
+    for r in range(args.rounds):
+        for prompt in prompts:
+            s = run_single(registry, args.model, prompt)
+            d = run_draft(registry, args.model, args.draft, prompt, args.max_tokens)
+            single.append(s)
+            draft.append(d)
+            print(f"[{r}] {prompt[:12]:<12} 单模型首句 {s['first_chunk'] * 1000:6.0f}ms | "
+                  f"开场 {d['first_chunk'] * 1000:6.0f}ms 续写首token {d['main_first_token'] * 1000:6.0f}ms | "
+                  f"{d['text'][:30]!r}")
+
+    print("\n首句可合成时间 (ms)   p50      p95")
+    for name, rows in (("单模型", single), ("开场模型", draft)):
+        values = [row["first_chunk"] * 1000 for row in rows]
+        print(f"{name:<16}{percentile(values, 0.5):8.0f} {percentile(values, 0.95):8.0f}")
+    values = [row["main_first_token"] * 1000 for row in draft]
+    print(f"{'续写首token':<16}{percentile(values, 0.5):8.0f} {percentile(values, 0.95):8.0f}")
+
+
+if __name__ == "__main__":
+    main()
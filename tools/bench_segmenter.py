@@ -0,0 +1,125 @@
+"""断句基准测试：回放录制的LLM token流，比较首段可合成时间和片段长度分布
+
+用法：
+    python tools/bench_segmenter.py [token_streams.jsonl] [--first-min-len 3] [--min-len 10] [--max-len 80]
+
+token流文件每行一个JSON：{"name": "...", "tokens": [[相对开始的毫秒数, "token文本"], ...]}
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from segmenter import SentenceSegmenter
+
+DEFAULT_STREAMS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "token_streams.jsonl")
+
+
+class LegacySegmenter:
+    """原 LLMThread 中的断句规则（最短8字，遇到 ,.?!，。！？ 断开），作为对照"""
+    def __init__(self):
+        self.current = ""
+
+    def feed(self, text):
+        self.current += text
+        if len(self.current) >= 8 and any(self.current.endswith(p) for p in ",.?!，。！？"):
+            chunk, self.current = self.current, ""
+            return [chunk]
+        return []
+
+    def flush(self):
+        chunk, self.current = self.current, ""
+        return [chunk] if chunk else []
+
+
+def load_streams(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def replay(segmenter, tokens):
+    """按token时间回放，返回 [(片段可合成的时间ms, 片段)]"""
+    out = []
+    for at, token in tokens:
+        for chunk in segmenter.feed(token):
+            out.append((at, chunk))
+    end = tokens[-1][0] if tokens else 0.0
+    for chunk in segmenter.flush():
+        out.append((end, chunk))
+    return out
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0
+
+
+def histogram(lengths, edges=(5, 10, 20, 40, 80)):
+    counts = []
+    lo = 0
+    for hi in edges:
+        counts.append((f"{lo}-{hi}", sum(1 for n in lengths if lo <= n < hi)))
+        lo = hi
+    counts.append((f"{lo}+", sum(1 for n in lengths if n >= lo)))
+    return counts
+
+
+def throughput(make_segmenter, streams, rounds=200):
+    """每秒处理的token数（纯CPU开销）"""
+    tokens = [[tok for _, tok in s["tokens"]] for s in streams]
+    count = sum(len(t) for t in tokens) * rounds
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for stream in tokens:
+            seg = make_segmenter()
+            for tok in stream:
+                seg.feed(tok)
+            seg.flush()
+    return count / (time.perf_counter() - start)
+
+
+def report(name, make_segmenter, streams, args):
+    first_times = []
+    lengths = []
+    print(f"\n== {name} ==")
+    for stream in streams:
+        chunks = replay(make_segmenter(), stream["tokens"])
+        if not chunks:
+            continue
+        # 首段可合成时间 + 后端合成首段所需时间，近似首个音频的延迟
+        first_at, first_chunk = chunks[0]
+        ttfa = first_at + args.ttfb_ms + len(first_chunk) * args.synth_ms_per_char
+        first_times.append(ttfa)
+        lengths.extend(len(c) for _, c in chunks)
+        print(f"{stream['name']:>10}: 首段 {first_at:7.1f}ms 估计首音频 {ttfa:7.1f}ms "
+              f"片段数 {len(chunks):2d} 首段 {first_chunk!r}")
+    print(f"首音频 p50 {percentile(first_times, 0.5):.1f}ms  p95 {percentile(first_times, 0.95):.1f}ms")
+    print(f"片段长度 min {min(lengths)}  p50 {percentile(lengths, 0.5)}  "
+          f"p95 {percentile(lengths, 0.95)}  max {max(lengths)}  平均 {sum(lengths) / len(lengths):.1f}")
+    print("长度分布: " + "  ".join(f"{label}:{count}" for label, count in histogram(lengths)))
+    print(f"吞吐 {throughput(make_segmenter, streams):,.0f} token/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("streams", nargs="?", default=DEFAULT_STREAMS, help="token流文件（jsonl）")
+    parser.add_argument("--first-min-len", type=int, default=SentenceSegmenter.FIRST_MIN_LEN)
+    parser.add_argument("--min-len", type=int, default=SentenceSegmenter.MIN_LEN)
+    parser.add_argument("--max-len", type=int, default=SentenceSegmenter.MAX_LEN)
+    parser.add_argument("--first-max-len", type=int, default=SentenceSegmenter.FIRST_MAX_LEN)
+    parser.add_argument("--ttfb-ms", type=float, default=0.0, help="TTS后端首字节延迟，用于估计首音频时间")
+    parser.add_argument("--synth-ms-per-char", type=float, default=0.0,
+                        help="非流式后端每字的合成耗时，用于估计首音频时间")
+    args = parser.parse_args()
+
+    streams = load_streams(args.streams)
+    print(f"载入 {len(streams)} 条token流: {args.streams}")
+    report("legacy", LegacySegmenter, streams, args)
+    report("segmenter", lambda: SentenceSegmenter(
+        args.first_min_len, args.min_len, args.max_len, args.first_max_len), streams, args)
+
+
+if __name__ == "__main__":
+    main()
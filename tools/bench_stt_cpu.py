@@ -0,0 +1,103 @@
+"""CPU 语音识别测试：在本机 CPU 上对各个模型大小测量实时率（RTF）和最终识别延迟
+
+使用与 CPU 配置（stt_profiles.CPU_PROFILE）相同的参数直接调用 faster-whisper（RealtimeSTT 的识别后端）。
+每个音频文件（或按 --utterance 切出的片段）视为一句话：说话结束后识别器对整句做一次最终识别，
+所以单句的识别耗时就是说话结束到最终识别结果的延迟。
+RTF = 识别耗时 / 音频时长，小于 1 才能跟上说话速度；实时模型的 RTF 需远小于 1。
+
+用法：
+    python tools/bench_stt_cpu.py sample1.wav sample2.wav [--models tiny base small] [--language zh]
+        [--compute-types int8 float32] [--threads 4] [--utterance 5] [--rounds 2]
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from stt_profiles import CPU_PROFILE, cpu_threads
+
+SAMPLE_RATE = 16000
+
+
+def load_utterances(paths, utterance_s):
+    """读取音频（16kHz 单声道），utterance_s > 0 时把长音频切成该长度的片段"""
+    from faster_whisper import decode_audio
+    utterances = []
+    for path in paths:
+        audio = decode_audio(path, sampling_rate=SAMPLE_RATE)
+        step = int(utterance_s * SAMPLE_RATE) if utterance_s > 0 else len(audio)
+        for start in range(0, len(audio), step):
+            piece = audio[start:start + step]
+            if len(piece) >= SAMPLE_RATE // 2:  # 不足半秒的尾部不计
+                utterances.append((os.path.basename(path), piece))
+    return utterances
+
+
+def transcribe(model, audio, language, beam_size):
+    start = time.perf_counter()
+    segments, _ = model.transcribe(audio, language=language or None, beam_size=beam_size)
+    text = "".join(segment.text for segment in segments)  # segments 是惰性的，取完才算识别完成
+    return time.perf_counter() - start, text
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+
+def bench(model_name, compute_type, utterances, args):
+    from faster_whisper import WhisperModel
+    start = time.perf_counter()
+    model = WhisperModel(model_name, device="cpu", compute_type=compute_type, cpu_threads=args.threads)
+    load_s = time.perf_counter() - start
+    transcribe(model, utterances[0][1], args.language, args.beam_size)  # 预热，不计入结果
+
+    latencies, audio_s = [], 0.0
+    for r in range(args.rounds):
+        for name, audio in utterances:
+            elapsed, text = transcribe(model, audio, args.language, args.beam_size)
+            latencies.append(elapsed)
+            audio_s += len(audio) / SAMPLE_RATE
+            if r == 0 and args.verbose:
+                print(f"    {name:<20} {len(audio) / SAMPLE_RATE:5.1f}s -> {elapsed * 1000:6.0f}ms {text.strip()[:40]!r}")
+    return {"load_s": load_s, "rtf": sum(latencies) / audio_s,
+            "p50": percentile(latencies, 0.5) * 1000, "p95": percentile(latencies, 0.95) * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("audio", nargs="+", help="音频文件（wav/mp3 等）")
+    parser.add_argument("--models", nargs="+", default=["tiny", "base", "small"])
+    parser.add_argument("--compute-types", nargs="+", default=[CPU_PROFILE["compute_type"]])
+    parser.add_argument("--threads", type=int, default=cpu_threads())
+    parser.add_argument("--beam-size", type=int, default=CPU_PROFILE["beam_size"])
+    parser.add_argument("--language", default="zh")
+    parser.add_argument("--utterance", type=float, default=0, help="把长音频切成该秒数的片段，0 表示整段")
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument("--verbose", action="store_true", help="输出每句的识别结果")
+    args = parser.parse_args()
+
+    try:
+        utterances = load_utterances(args.audio, args.utterance)
+    except ImportError:
+        sys.exit("需要安装 faster-whisper（RealtimeSTT 的依赖）")
+    if not utterances:
+        sys.exit("没有可用的音频")
+    total = sum(len(audio) for _, audio in utterances) / SAMPLE_RATE
+    print(f"{len(utterances)} 句, 共 {total:.1f}s 音频, {args.threads} 线程, beam_size {args.beam_size}")
+
+    rows = []
+    for model_name in args.models:
+        for compute_type in args.compute_types:
+            print(f"测试 {model_name} ({compute_type}) ...")
+            rows.append((model_name, compute_type, bench(model_name, compute_type, utterances, args)))
+
+    print(f"\n{'模型':<16}{'精度':<10}{'加载s':>8}{'RTF':>8}{'最终识别p50 ms':>16}{'p95 ms':>10}")
+    for model_name, compute_type, row in rows:
+        print(f"{model_name:<16}{compute_type:<10}{row['load_s']:>8.1f}{row['rtf']:>8.2f}"
+              f"{row['p50']:>16.0f}{row['p95']:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
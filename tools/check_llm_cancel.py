@@ -0,0 +1,165 @@
+"""打断检查：用本地的慢速替身服务器验证打断后连接立即断开、服务端停止生成
+
+替身服务器每隔 --interval 秒输出一个token（Ollama /api/chat 或 OpenAI /v1 流式格式），
+在等待期间检测客户端是否断开。分两种情况在另一个线程中调用 close()：
+    输出中    客户端收到 --cancel-after 个token后打断
+    响应头前  服务端推迟 --header-delay 秒才返回响应头（模拟加载模型和预填充），期间打断
+检查：读取线程在 --max-exit 秒内退出；服务端检测到断开并停止输出。
+
+用法：
+    python tools/check_llm_cancel.py [--interval 2.0] [--cancel-after 3] [--header-delay 3.0] [--max-exit 0.5]
+"""
+import os
+import sys
+import json
+import time
+import select
+import socket
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from llm_backends import LLMBackend
+
+
+class SlowChatHandler(BaseHTTPRequestHandler):
+    """慢速生成的替身服务器；生成结果记录在 server.results 中"""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        native = self.path.startswith("/api/")
+        result = {"sent": 0, "disconnected_at": None, "finished": False}
+        self.server.results.append(result)
+        # 推迟返回响应头，期间检测断开
+        if self.server.header_delay and self._client_closed(self.server.header_delay):
+            result["disconnected_at"] = time.perf_counter()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson" if native else "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i in range(self.server.tokens):
+            if native:
+                line = json.dumps({"model": payload.get("model"), "message": {"role": "assistant",
+                                   "content": f"t{i} "}, "done": False}) + "\n"
+            else:
+                line = "data: " + json.dumps({"id": "x", "object": "chat.completion.chunk", "created": 0,
+                                              "model": payload.get("model"), "choices": [
+                                                  {"index": 0, "delta": {"content": f"t{i} "},
+                                                   "finish_reason": None}]}) + "\n\n"
+            try:
+                self._write_chunk(line.encode())
+            except OSError:
+                result["disconnected_at"] = time.perf_counter()
+                return
+            result["sent"] += 1
+            # 等待下一个token期间检测断开（客户端不会再发送数据，可读即表示连接已关闭）
+            if self._client_closed(self.server.interval):
+                result["disconnected_at"] = time.perf_counter()
+                return
+        result["finished"] = True
+        end = {"done": True, "eval_count": self.server.tokens} if native else None
+        try:
+            self._write_chunk((json.dumps(end) + "\n").encode() if end else b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+        except OSError:
+            pass
+
+    def _write_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _client_closed(self, timeout):
+        readable, _, _ = select.select([self.connection], [], [], timeout)
+        if not readable:
+            return False
+        try:
+            return self.connection.recv(1, socket.MSG_PEEK) == b""
+        except OSError:
+            return True
+
+
+def check(api, server, args, before_headers=False):
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1/"
+    backend = LLMBackend("stand-in", base_url, api_key="none", api=api)
+    stream = backend.chat_stream("slow-model", [{"role": "user", "content": "hi"}])
+    received = []
+    exited = threading.Event()
+    errors = []
+
+    def reader():
+        try:
+            for content in stream:
+                received.append(content)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            exited.set()
+
+    server.results.clear()
+    server.header_delay = args.header_delay if before_headers else 0
+    cancel_after = 0 if before_headers else args.cancel_after
+    thread = threading.Thread(target=reader, daemon=True)
+    thread.start()
+    if before_headers:
+        # 服务端收到请求后，读取线程正阻塞在等待响应头上
+        while not server.results and not exited.is_set():
+            time.sleep(0.01)
+        time.sleep(0.2)
+    while len(received) < cancel_after and not exited.is_set():
+        time.sleep(0.01)
+    # 刚收到一个token，读取线程正阻塞在等待下一个token上
+    time.sleep(0.05)
+    cancel_at = time.perf_counter()
+    stream.close()
+    exited.wait(args.max_exit + 5)
+    exit_s = time.perf_counter() - cancel_at
+    time.sleep(0.2)
+    backend.close()
+
+    result = server.results[-1] if server.results else {}
+    disconnected_at = result.get("disconnected_at")
+    detect_s = disconnected_at - cancel_at if disconnected_at else None
+    ok = (exited.is_set() and exit_s <= args.max_exit and not errors
+          and disconnected_at is not None and not result.get("finished")
+          and result.get("sent", 0) <= cancel_after + 1)
+    case = "响应头前" if before_headers else "输出中"
+    print(f"[{api:>6} {case}] {'通过' if ok else '失败'}: 收到 {len(received)} 个token, 读取线程退出 {exit_s * 1000:.0f}ms, "
+          f"服务端共输出 {result.get('sent')}/{server.tokens} 个token, "
+          f"检测到断开 {'未检测到' if detect_s is None else f'{detect_s * 1000:.0f}ms'}"
+          + (f", 错误: {errors[0]!r}" if errors else ""))
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--interval", type=float, default=2.0, help="替身服务器输出token的间隔（秒）")
+    parser.add_argument("--tokens", type=int, default=50, help="替身服务器完整回复的token数")
+    parser.add_argument("--cancel-after", type=int, default=3, help="收到多少个token后打断")
+    parser.add_argument("--header-delay", type=float, default=3.0, help="响应头前打断时服务端推迟返回响应头的时间（秒）")
+    parser.add_argument("--max-exit", type=float, default=0.5, help="打断后读取线程必须退出的时间（秒）")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowChatHandler)
+    server.daemon_threads = True
+    server.results = []
+    server.interval = args.interval
+    server.tokens = args.tokens
+    server.header_delay = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        ok = all([check(api, server, args, before_headers)
+                  for before_headers in (False, True) for api in ("ollama", "openai")])
+    finally:
+        server.shutdown()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""离线回放测试：把录好的 WAV 文件经 STTThread 和识别器（与麦克风输入相同的流程）识别，统计延迟和错误率
+
+每个 WAV 文件为一句话。参考文本取同名的 .txt 文件，或 --refs 指定的文件（每行 "文件名<TAB>文本"）。
+输出每句的：
+    VAD      说话结束 -> 识别器判断说话结束（on_recording_stop）
+    中间     说话结束 -> 最后一次中间结果（负数表示说话结束前已给出）
+    最终     说话结束 -> 最终识别结果
+    CER/WER  与参考文本的字错率/词错率（中文看 CER）
+"说话结束"为文件中最后一段语音送入识别器的时间。
+
+用法：
+    python tools/stt_replay.py recordings/ [--model base] [--language zh] [--device auto]
+        [--speed 2] [--refs refs.tsv] [--output replay.jsonl]
+"""
+import os
+import re
+import sys
+import glob
+import json
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PyQt6.QtCore import QCoreApplication, Qt
+from STT import STTThread
+from audio_replay import WavReplaySource
+from speculation import normalize_transcript
+from stt_profiles import stt_profile, RECORDER_SETTINGS, DEVICES
+
+
+def list_wavs(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "*.wav"))))
+        else:
+            files.append(path)
+    return files
+
+
+def load_refs(files, refs_path):
+    refs = {}
+    if refs_path:
+        with open(refs_path, encoding="utf-8") as f:
+            for line in f:
+                name, _, text = line.rstrip("\n").partition("\t")
+                if text:
+                    refs[os.path.basename(name)] = text
+    for path in files:
+        sidecar = os.path.splitext(path)[0] + ".txt"
+        if os.path.basename(path) not in refs and os.path.exists(sidecar):
+            with open(sidecar, encoding="utf-8") as f:
+                refs[os.path.basename(path)] = f.read().strip()
+    return refs
+
+
+def edit_distance(ref, hyp):
+    prev = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        cur = [i]
+        for j, h in enumerate(hyp, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (r != h)))
+        prev = cur
+    return prev[-1]
+
+
+def words(text):
+    return re.findall(r"\w+", text.lower())
+
+
+def ms(start, end):
+    return round((end - start) * 1000, 1) if start is not None and end is not None else None
+
+
+def utterance_row(record, ref):
+    text = " ".join(record["texts"])
+    speech_end = record["speech_end"]
+    partials = [at for at, _ in record["partials"] if record["final_at"] is None or at <= record["final_at"]]
+    row = {
+        "file": os.path.basename(record["path"]),
+        "duration_s": round(record["duration"], 2),
+        "vad_ms": ms(speech_end, record["vad_end"]),
+        "partial_ms": ms(speech_end, partials[-1] if partials else None),
+        "final_ms": ms(speech_end, record["final_at"]),
+        "text": text,
+    }
+    if ref is not None:
+        ref_chars, ref_words = normalize_transcript(ref), words(ref)
+        row.update(ref=ref, char_errors=edit_distance(ref_chars, normalize_transcript(text)),
+                   ref_chars=len(ref_chars), word_errors=edit_distance(ref_words, words(text)),
+                   ref_words=len(ref_words))
+    return row
+
+
+def percentile(values, q):
+    values = sorted(v for v in values if v is not None)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else None
+
+
+def report(rows):
+    def fmt(value, spec):
+        return format(value, spec) if value is not None else f"{'-':>{spec.split('.')[0]}}"
+
+    print(f"\n{'文件':<24}{'时长s':>7}{'VAD ms':>9}{'中间 ms':>9}{'最终 ms':>9}{'CER':>7}  识别结果")
+    for row in rows:
+        cer = row["char_errors"] / row["ref_chars"] * 100 if row.get("ref_chars") else None
+        print(f"{row['file'][:24]:<24}{row['duration_s']:>7.1f}{fmt(row['vad_ms'], '9.0f')}"
+              f"{fmt(row['partial_ms'], '9.0f')}{fmt(row['final_ms'], '9.0f')}{fmt(cer, '6.1f')}%  {row['text'][:40]}")
+
+    print(f"\n{'':<12}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, key in (("VAD", "vad_ms"), ("中间结果", "partial_ms"), ("最终结果", "final_ms")):
+        values = [row[key] for row in rows]
+        print(f"{name:<12}{fmt(percentile(values, 0.5), '10.0f')}{fmt(percentile(values, 0.95), '10.0f')}")
+    scored = [row for row in rows if "ref" in row]
+    if scored:
+        chars = sum(row["ref_chars"] for row in scored)
+        tokens = sum(row["ref_words"] for row in scored)
+        cer = sum(row["char_errors"] for row in scored) / chars * 100 if chars else 0.0
+        wer = sum(row["word_errors"] for row in scored) / tokens * 100 if tokens else 0.0
+        print(f"CER {cer:.1f}%  WER {wer:.1f}%（{len(scored)} 句有参考文本）")
+    missing = sum(1 for row in rows if row["final_ms"] is None)
+    if missing:
+        print(f"{missing} 句没有得到识别结果")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help="WAV 文件或目录（16位PCM）")
+    parser.add_argument("--model", default="base")
+    parser.add_argument("--language", default="zh")
+    parser.add_argument("--device", default="auto", choices=DEVICES)
+    parser.add_argument("--speed", type=float, default=1.0, help="语音送入速度倍数，1 为实时")
+    parser.add_argument("--refs", help="参考文本文件，每行 \"文件名<TAB>文本\"")
+    parser.add_argument("--output", help="把每句的结果写入 jsonl 文件")
+    parser.add_argument("--timeout", type=float, default=600, help="等待模型加载的秒数")
+    args = parser.parse_args()
+
+    files = list_wavs(args.paths)
+    if not files:
+        sys.exit("没有找到 WAV 文件")
+    refs = load_refs(files, args.refs)
+
+    app = QCoreApplication(sys.argv)
+    config = {"language": args.language, "model": args.model, **RECORDER_SETTINGS}
+    config.update(stt_profile(args.device, args.language, args.model))
+    source = WavReplaySource(files, speed=args.speed)
+    thread = STTThread(config, audio_source=source)
+    # 没有事件循环，信号直接在识别线程中处理
+    ready = threading.Event()
+    thread.STTmodel_ready_signal.connect(ready.set, Qt.ConnectionType.DirectConnection)
+    thread.text_signal.connect(source.on_partial, Qt.ConnectionType.DirectConnection)
+    thread.resume()
+    thread.start()
+    try:
+        if not ready.wait(args.timeout):
+            sys.exit("识别模型加载超时")
+        print(f"模型已加载，回放 {len(files)} 个文件（{args.speed:g} 倍速）...")
+        source.finished.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if thread.recorder:
+            thread.recorder.shutdown()
+        thread.stop()
+
+    rows = [utterance_row(record, refs.get(os.path.basename(record["path"]))) for record in source.results]
+    report(rows)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    del app
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""每轮耗时统计：读取 logs/turn_traces.jsonl，计算首token、首音频、说完话到发声延迟的 p50/p95
+
+用法：
+    python tools/trace_summary.py [turn_traces.jsonl] [--last 100] [--include-interrupted]
+
+按输入来源（voice/text）和模式（single 单模型 / draft 开场模型）分组输出，
+开场模式下的首token和首句按开场模型计算，可直接与单模型对比。
+"推测提前"为推测启动命中的轮次中，首token比最终识别结果后才请求时提前到达的时间。
+
+各阶段的分解：
+    识别      speech_end -> stt_final          说话结束到最终识别结果
+    排队      stt_final/turn_start -> llm_request
+    首token   llm_request -> llm_first_token   LLM 预填充和首token
+    首句      llm_first_token -> 第一个 segment 断句等待
+    TTS首字节 第一个 segment -> 第一句的 tts_first_byte
+    开始播放  第一句的 tts_first_byte -> audio_first 预缓冲和声卡延迟
+"""
+import os
+import sys
+import math
+import json
+import argparse
+
+DEFAULT_PATH = os.path.join("logs", "turn_traces.jsonl")
+
+
+def load_traces(path):
+    traces = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                traces.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue  # 写入中断的行
+    return traces
+
+
+def first(trace, event, index=None):
+    """某事件第一次发生的时间（ms），可按句子序号过滤"""
+    for e in trace["events"]:
+        if e["event"] == event and (index is None or e.get("index") == index):
+            return e["ms"]
+    return None
+
+
+def span(trace, start, end):
+    """两个时间点之间的间隔；start/end 为事件名或 (事件名, 句子序号)，缺失时返回 None"""
+    start = first(trace, *start) if isinstance(start, tuple) else first(trace, start)
+    end = first(trace, *end) if isinstance(end, tuple) else first(trace, end)
+    return end - start if start is not None and end is not None else None
+
+
+def percentile(values, q):
+    """最近秩法百分位数"""
+    values = sorted(values)
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, math.ceil(q * len(values)) - 1))]
+
+
+def stages(trace):
+    origin = "stt_final" if first(trace, "stt_final") is not None else "turn_start"
+    # 开场模式下首句来自开场模型
+    request, first_token = ("draft_request", "draft_first_token") if trace.get("mode") == "draft" else \
+        ("llm_request", "llm_first_token")
+    return {
+        "识别": span(trace, "speech_end", "stt_final"),
+        "排队": span(trace, origin, request),
+        "首token": span(trace, request, first_token),
+        "首句": span(trace, first_token, ("segment", 0)),
+        "TTS首字节": span(trace, ("segment", 0), ("tts_first_byte", 0)),
+        "开始播放": span(trace, ("tts_first_byte", 0), "audio_first"),
+    }
+
+
+def format_row(name, values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return f"{name:<12}{'-':>10}{'-':>10}{'-':>10}{0:>6}"
+    return (f"{name:<12}{percentile(values, 0.5):>10.1f}{percentile(values, 0.95):>10.1f}"
+            f"{max(values):>10.1f}{len(values):>6}")
+
+
+def report(title, traces):
+    print(f"\n== {title}（{len(traces)} 轮）==")
+    print(f"{'':<12}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'轮数':>6}")
+    print(format_row("首token", [t.get("ttft_ms") for t in traces]))
+    print(format_row("首音频", [t.get("ttfa_ms") for t in traces]))
+    print(format_row("说完到发声", [t.get("eos_ms") for t in traces]))
+    print(format_row("推测提前", [t.get("speculation_saved_ms") for t in traces]))
+    print("-- 分解 --")
+    rows = [stages(t) for t in traces]
+    for name in rows[0] if rows else []:
+        print(format_row(name, [row[name] for row in rows]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", nargs="?", default=DEFAULT_PATH, help="耗时记录文件（jsonl）")
+    parser.add_argument("--last", type=int, default=0, help="只统计最近N轮")
+    parser.add_argument("--include-interrupted", action="store_true", help="包含被打断的轮次")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        sys.exit(f"找不到耗时记录: {args.path}")
+    traces = load_traces(args.path)
+    if not args.include_interrupted:
+        traces = [t for t in traces if t.get("status") == "done"]
+    if args.last:
+        traces = traces[-args.last:]
+    if not traces:
+        sys.exit("没有可统计的轮次")
+    report("全部", traces)
+    for key in ("source", "mode"):
+        for value in sorted({t.get(key, "single") for t in traces}):
+            group = [t for t in traces if t.get(key, "single") == value]
+            if len(group) < len(traces):
+                report(value, group)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+import os
+import json
+import wave
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+
+# 不影响合成结果的参数，不参与缓存键计算
+NON_SYNTHESIS_KEYS = {
+    "text",
+    "streaming_mode",
+    "batch_size",
+    "batch_threshold",
+    "split_bucket",
+    "return_fragment",
+    "parallel_infer",
+    "media_type",
+}
+
+
+def normalize_text(text):
+    """规范化文本：全半角统一、去除首尾空白、合并连续空白"""
+    text = unicodedata.normalize("NFKC", text)
+    return " ".join(text.split())
+
+
+class TTSAudioCache:
+    """合成音频缓存：内存LRU + 磁盘LRU，按文本和合成参数的哈希寻址"""
+    MEMORY_BYTES = 32 * 1024 * 1024
+    DISK_BYTES = 256 * 1024 * 1024
+    CACHE_DIR = os.path.join("cache", "tts")
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, **kwargs):
+        """获取进程内共享的缓存实例，首次调用时按参数创建"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(**kwargs)
+            return cls._shared
+
+    def __init__(self, cache_dir=CACHE_DIR, memory_bytes=MEMORY_BYTES, disk_bytes=DISK_BYTES, enabled=True):
+        self.cache_dir = cache_dir
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (pcm, sample_rate)
+        self._memory_size = 0
+        self._disk = OrderedDict()  # key -> 文件大小
+        self._disk_size = 0
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_disk_index()
+
+    def configure(self, enabled=None, memory_bytes=None, disk_bytes=None):
+        """更新缓存配置，容量缩小时立即淘汰"""
+        with self._lock:
+            if enabled is not None:
+                self.enabled = enabled
+            if memory_bytes is not None:
+                self.memory_bytes = memory_bytes
+            if disk_bytes is not None:
+                self.disk_bytes = disk_bytes
+            self._evict()
+
+    def _load_disk_index(self):
+        """按修改时间从旧到新加载磁盘上的缓存文件"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".wav"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_size += size
+        with self._lock:
+            self._evict()
+
+    def make_key(self, text, tts_settings, tts_mode):
+        """根据规范化文本和所有影响合成结果的参数计算缓存键"""
+        if tts_mode == "realtime":
+            # RealtimeTTS 只由引擎和声音决定
+            params = {"engine": tts_settings.get("engine"), "voice": tts_settings.get("voice")}
+        else:
+            params = {k: v for k, v in tts_settings.items() if k not in NON_SYNTHESIS_KEYS}
+        payload = json.dumps(
+            {"mode": tts_mode, "text": normalize_text(text), "params": params},
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.wav")
+
+    def get(self, key):
+        """查询缓存，命中返回 (pcm, sample_rate)，否则返回 None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                if key in self._disk:
+                    self._disk.move_to_end(key)
+                self.hits_memory += 1
+                return entry
+            on_disk = key in self._disk
+        if on_disk:
+            entry = self._read_file(key)
+            if entry is not None:
+                with self._lock:
+                    self.hits_disk += 1
+                    if key in self._disk:
+                        self._disk.move_to_end(key)
+                    self._remember(key, entry)
+                return entry
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, pcm, sample_rate):
+        """写入缓存（内存和磁盘）"""
+        if not self.enabled or not pcm:
+            return
+        pcm = bytes(pcm)
+        path = self._path(key)
+        try:
+            tmp_path = f"{path}.tmp"
+            with wave.open(tmp_path, "wb") as wf:
+                wf.setnchannels(1)
+                wf.setsampwidth(2)
+                wf.setframerate(sample_rate)
+                wf.writeframes(pcm)
+            os.replace(tmp_path, path)
+            size = os.path.getsize(path)
+        except Exception as e:
+            print(f"写入TTS缓存失败: {e}")
+            size = None
+        with self._lock:
+            self.stores += 1
+            if size is not None:
+                self._disk_size += size - self._disk.pop(key, 0)
+                self._disk[key] = size
+            self._remember(key, (pcm, sample_rate))
+
+    def _read_file(self, key):
+        path = self._path(key)
+        try:
+            with wave.open(path, "rb") as wf:
+                pcm = wf.readframes(wf.getnframes())
+                sample_rate = wf.getframerate()
+            os.utime(path)  # 更新修改时间，重启后仍保持LRU顺序
+            return pcm, sample_rate
+        except Exception as e:
+            print(f"读取TTS缓存失败: {e}")
+            with self._lock:
+                self._disk_size -= self._disk.pop(key, 0)
+            return None
+
+    def _remember(self, key, entry):
+        """放入内存LRU，调用时需持有锁"""
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_size -= len(old[0])
+        self._memory[key] = entry
+        self._memory_size += len(entry[0])
+        self._evict()
+
+    def _evict(self):
+        """按LRU淘汰超出容量的条目，调用时需持有锁"""
+        while self._memory and self._memory_size > self.memory_bytes:
+            _, (pcm, _) = self._memory.popitem(last=False)
+            self._memory_size -= len(pcm)
+        while self._disk and self._disk_size > self.disk_bytes:
+            key, size = self._disk.popitem(last=False)
+            self._disk_size -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def contains(self, key):
+        with self._lock:
+            return key in self._memory or key in self._disk
+
+    def clear(self):
+        """清空内存和磁盘缓存"""
+        with self._lock:
+            keys = list(self._disk)
+            self._memory.clear()
+            self._memory_size = 0
+            self._disk.clear()
+            self._disk_size = 0
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def stats(self):
+        """命中率和容量统计"""
+        with self._lock:
+            hits = self.hits_memory + self.hits_disk
+            total = hits + self.misses
+            return {
+                "hits_memory": self.hits_memory,
+                "hits_disk": self.hits_disk,
+                "misses": self.misses,
+                "hit_rate": hits / total if total else 0.0,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_size,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_size,
+            }
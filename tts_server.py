@@ -86,6 +86,9 @@ engines = {}
 voices = {}
 stt_thread = None
 current_engine = None
+current_engine_name = None
+current_voice = None
+state_version = 0  # 引擎或声音每变化一次加一，客户端据此判断缓存是否有效
 stream = None
 current_speaking = {}
 speaking_lock = threading.Lock()
@@ -127,21 +130,39 @@ async def favicon():
 
 
 def _set_engine(engine_name):
-    global current_engine, stream
+    global current_engine, current_engine_name, current_voice, state_version, stream
     if current_engine is None:
         current_engine = engines[engine_name]
         stream = TextToAudioStream(current_engine, muted=True)
     else:
         current_engine = engines[engine_name]
         stream.load_engine(current_engine)
+    current_engine_name = engine_name
+    current_voice = None
 
     if voices[engine_name]:
         if isinstance(voices[engine_name][0], str):
             # 如果是字符串列表（kokoro 引擎的情况）
-            engines[engine_name].set_voice(voices[engine_name][0])
+            current_voice = voices[engine_name][0]
         else:
             # 如果是对象列表（其他引擎的情况）
-            engines[engine_name].set_voice(voices[engine_name][0].name)
+            current_voice = voices[engine_name][0].name
+        engines[engine_name].set_voice(current_voice)
+    state_version += 1
+
+
+def _state():
+    return {
+        "engine": current_engine_name,
+        "voice": current_voice,
+        "version": state_version,
+    }
+
+
+@app.get("/state")
+def get_state():
+    """返回当前引擎、声音和状态版本号，供客户端判断是否需要切换"""
+    return _state()
 
 
 @app.get("/set_engine")
@@ -149,9 +170,13 @@ def set_engine(request: Request, engine_name: str = Query(...)):
     if engine_name not in engines:
         return {"error": "Engine not supported"}
 
+    if engine_name == current_engine_name:
+        # 引擎未变化时不重新加载
+        return {"message": f"Already using {engine_name} engine", **_state()}
+
     try:
         _set_engine(engine_name)
-        return {"message": f"Switched to {engine_name} engine"}
+        return {"message": f"Switched to {engine_name} engine", **_state()}
     except Exception as e:
         logging.error(f"Error switching engine: {str(e)}")
         return {"error": "Failed to switch engine"}
@@ -282,6 +307,7 @@ def tts(request: Request, text: str = Query(...)):
         media_type="audio/wav"
         if current_engine.engine_name != "elevenlabs"
         else "audio/mpeg",
+        headers={"X-TTS-State-Version": str(state_version)},
     )
 
 
@@ -338,18 +364,24 @@ def get_voices(engine: str = Query(...)):
 
 @app.get("/setvoice")
 def set_voice(request: Request, voice_name: str = Query(...)):
+    global current_voice, state_version
     print(f"Getting request: {voice_name}")
     if not current_engine:
         print("No engine is currently selected")
         return {"error": "No engine is currently selected"}
 
+    if voice_name == current_voice:
+        return {"message": f"Voice already set to {voice_name}", **_state()}
+
     try:
         print(f"Setting voice to {voice_name}")
         if current_engine.engine_name == "edge":
             current_engine.set_voice(voice_name)
         else:
             current_engine.set_voice(voice_name)
-        return {"message": f"Voice set to {voice_name} successfully"}
+        current_voice = voice_name
+        state_version += 1
+        return {"message": f"Voice set to {voice_name} successfully", **_state()}
     except Exception as e:
         print(f"Error setting voice: {str(e)}")
         logging.error(f"Error setting voice: {str(e)}")